@@ -0,0 +1,117 @@
+import os
+import json
+import threading
+import http.client
+from urllib.parse import urlsplit
+from metrics import MetricsSnapshot
+from reports import IncomeReport
+from api_server import TOKEN_ENV
+from repositories import (InUseError, ClientRepository, CatalogRepository, InvoiceRepository,
+                          IncomeRepository, DashboardRepository)
+
+# Seconds to wait for the server before a call fails.
+TIMEOUT = 30
+
+# Dataclasses the server sends back, by the type name it tags them with.
+RESULT_TYPES = {cls.__name__: cls for cls in (MetricsSnapshot, IncomeReport)}
+ERROR_TYPES = {"InUseError": InUseError, "ValueError": ValueError, "LookupError": LookupError,
+               "PermissionError": PermissionError}
+# Repository class behind each remote name, for which of its methods are reads.
+REPOSITORY_TYPES = {
+    "clients": ClientRepository,
+    "products": CatalogRepository,
+    "services": CatalogRepository,
+    "invoices": InvoiceRepository,
+    "income": IncomeRepository,
+    "dashboard": DashboardRepository,
+}
+
+
+def decode(value):
+    """object_hook rebuilding tagged dataclasses; their list fields become tuples again."""
+    cls = RESULT_TYPES.get(value.pop("__type__", None))
+    if cls is None:
+        return value
+    return cls(**{name: tuple(map(tuple, field)) if name == "rows" else field for name, field in value.items()})
+
+
+class ApiClient:
+    """Calls the API server over one keep-alive connection per thread.
+
+    A call whose connection turns out to be dead is retried once on a new
+    one if it is a read, or if the request never got out. A write that did
+    get out is not resent, as the server may already have applied it.
+    """
+
+    def __init__(self, url, timeout=TIMEOUT, token=None):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json"}
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        self._local = threading.local()
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def call(self, repository, method, *args, retry=True, **kwargs):
+        body = json.dumps({"args": args, "kwargs": kwargs})
+        for attempt in range(2):
+            conn = self.connection()
+            sent = False
+            try:
+                conn.request("POST", f"/api/{repository}/{method}", body=body, headers=self.headers)
+                sent = True
+                response = conn.getresponse()
+                payload = json.loads(response.read(), object_hook=decode)
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # The server dropped an idle keep-alive connection; reconnect once.
+                conn.close()
+                self._local.conn = None
+                if attempt or (sent and not retry):
+                    raise
+        if "error" in payload:
+            raise ERROR_TYPES.get(payload.get("type"), RuntimeError)(payload["error"])
+        return payload["result"]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class RemoteRepository:
+    """Stand-in for a repository whose methods run on the server."""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.reads = REPOSITORY_TYPES[name].READS
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+        retry = method in self.reads
+        return lambda *args, **kwargs: self.client.call(self.name, method, *args, retry=retry, **kwargs)
+
+
+class RemoteRepositories:
+    """Same interface as repositories.Repositories, served by an API server.
+
+    `db` is None: features that need the database file itself are only
+    available on the desk that hosts it.
+    """
+
+    db = None
+
+    def __init__(self, url, timeout=TIMEOUT, token=None):
+        self.client = ApiClient(url, timeout, token or os.environ.get(TOKEN_ENV))
+        for name in REPOSITORY_TYPES:
+            setattr(self, name, RemoteRepository(self.client, name))
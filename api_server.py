@@ -0,0 +1,212 @@
+"""Local JSON API over the repositories, so several desks can share one database.
+
+    python api_server.py [DATABASE] [--host HOST] [--port PORT] [--readers N] [--token TOKEN]
+
+Every call is POST /api/<repository>/<method> with a JSON body
+{"args": [...], "kwargs": {...}}, answered with {"result": ...} or
+{"error": ..., "type": ...}. GET /api/health answers {"ok": true}.
+
+With a token, every call must carry "Authorization: Bearer <token>". The
+token defaults to $ANIMALIUM_API_TOKEN and is required to listen on
+anything but the loopback interface.
+"""
+import os
+import hmac
+import json
+import asyncio
+import ipaddress
+import logging
+import argparse
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor
+from repositories import Repositories, InUseError
+
+HOST = "127.0.0.1"
+PORT = 8765
+# Reader threads, each with its own connection; WAL lets them run alongside the writer.
+READ_WORKERS = 8
+# Largest request body accepted, in bytes.
+MAX_BODY = 1024 * 1024
+# Environment variable holding the shared token, for the server and the desks.
+TOKEN_ENV = "ANIMALIUM_API_TOKEN"
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed",
+               409: "Conflict", 500: "Internal Server Error"}
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def encode(value):
+    """JSON default for results: dataclasses travel as their fields plus a type name."""
+    if dataclasses.is_dataclass(value):
+        return {"__type__": type(value).__name__, **dataclasses.asdict(value)}
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+class ApiServer:
+    """asyncio HTTP/1.1 server dispatching calls to the repositories of one database.
+
+    Connections are kept alive and served concurrently on the event loop.
+    Reads run on a pool of reader threads. Writes are queued for the
+    database's writer thread, which applies them in arrival order and
+    commits whatever has queued up together, so desks never race each
+    other for the write lock.
+    """
+
+    def __init__(self, db, host=HOST, port=PORT, read_workers=READ_WORKERS, token=None):
+        if not token and not is_loopback(host):
+            # Other desks would reach client records and every write without any check
+            raise ValueError(f"A token is required to serve on {host}; set --token or {TOKEN_ENV}")
+        self.token = token
+        self.db = db
+        self.repositories = Repositories(db).repositories()
+        self.host = host
+        self.port = port
+        self.readers = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="api-read")
+        self.server = None
+        self.connections = set()  # Writers of the open client connections
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]  # The real port when 0 was asked for
+        logging.info(f"API server listening on http://{self.host}:{self.port}")
+
+    async def serve_forever(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            # Idle keep-alive connections would otherwise outlive the server
+            for writer in list(self.connections):
+                writer.close()
+            while self.connections:
+                await asyncio.sleep(0.01)
+            await self.server.wait_closed()
+        self.readers.shutdown()
+
+    async def handle_connection(self, reader, writer):
+        self.connections.add(writer)
+        try:
+            while True:
+                request = await self.read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                if self.authorized(path, headers):
+                    status, payload = await self.dispatch(method, path, body)
+                else:
+                    status, payload = 401, {"error": "Missing or wrong API token", "type": "PermissionError"}
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self.write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError as e:
+            # Malformed request line or headers
+            self.write_response(writer, 400, {"error": str(e), "type": "ValueError"}, False)
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    def authorized(self, path, headers):
+        if not self.token or path.strip("/") == "api/health":
+            return True
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(token.strip(), self.token)
+
+    async def read_request(self, reader):
+        """(method, path, headers, body) of the next request, or None once the client hung up."""
+        line = await reader.readline()
+        if not line:
+            return None
+        method, path, _ = line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY:
+            raise ValueError("Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method, path, headers, body
+
+    async def dispatch(self, method, path, body):
+        parts = path.strip("/").split("/")
+        if parts == ["api", "health"]:
+            return 200, {"ok": True}
+        if len(parts) != 3 or parts[0] != "api":
+            return 404, {"error": f"No such endpoint: {path}", "type": "LookupError"}
+        if method != "POST":
+            return 405, {"error": "Calls must be POSTed", "type": "LookupError"}
+        repository = self.repositories.get(parts[1])
+        name = parts[2]
+        if repository is None or name not in repository.READS + repository.WRITES:
+            return 404, {"error": f"No such operation: {parts[1]}.{name}", "type": "LookupError"}
+        try:
+            call = json.loads(body or b"{}")
+            args, kwargs = call.get("args", []), call.get("kwargs", {})
+        except (ValueError, AttributeError):
+            return 400, {"error": "Body must be a JSON object", "type": "ValueError"}
+
+        method = getattr(repository, name)
+        try:
+            if name in repository.WRITES:
+                result = await asyncio.wrap_future(self.db.submit_write(method, *args, **kwargs))
+            else:
+                result = await asyncio.get_running_loop().run_in_executor(self.readers, lambda: method(*args, **kwargs))
+        except InUseError as e:
+            return 409, {"error": str(e), "type": "InUseError"}
+        except (ValueError, TypeError, KeyError) as e:
+            return 400, {"error": str(e), "type": "ValueError"}
+        except Exception as e:
+            logging.exception(f"API call {parts[1]}.{name} failed")
+            return 500, {"error": str(e), "type": type(e).__name__}
+        return 200, {"result": result}
+
+    def write_response(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload, default=encode, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+
+
+if __name__ == "__main__":
+    from db import Database, DB_PATH
+
+    parser = argparse.ArgumentParser(description="Serve the clinic database to other desks.")
+    parser.add_argument("database", nargs="?", default=DB_PATH)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--readers", type=int, default=READ_WORKERS)
+    parser.add_argument("--token", default=os.environ.get(TOKEN_ENV), help=f"shared token, default ${TOKEN_ENV}")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    db = Database(args.database)
+    try:
+        server = ApiServer(db, args.host, args.port, args.readers, args.token)
+    except ValueError as e:
+        db.close()
+        parser.error(str(e))
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db.close()
@@ -0,0 +1,68 @@
+import os
+import glob
+import logging
+import tkinter as tk
+
+IMG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'img')
+# Pre-scaled variants, one PNG per (source, mtime, size).
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'img')
+
+
+class AssetCache:
+    """Images scaled once, kept on disk, and shared as PhotoImages.
+
+    The first request for an image at a size decodes and resizes the source
+    with Pillow and stores the result as a PNG named after the source's mtime
+    and the target size. Later runs load that file straight into a Tk
+    PhotoImage, so Pillow is not even imported. Within a run every widget
+    asking for the same image and size gets the same PhotoImage.
+    """
+
+    def __init__(self, source_dir=IMG_DIR, cache_dir=CACHE_DIR):
+        self.source_dir = source_dir
+        self.cache_dir = cache_dir
+        self.photos = {}  # (name, size) -> PhotoImage, or None if the source is missing
+
+    def variant_path(self, name, size):
+        """Return the cached PNG for `name` at `size`, creating it if needed; None if the source is missing."""
+        source = os.path.join(self.source_dir, name)
+        try:
+            mtime = os.stat(source).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        width, height = size
+        prefix = os.path.join(self.cache_dir, f"{os.path.splitext(name)[0]}-{width}x{height}-")
+        path = f"{prefix}{mtime}.png"
+        if not os.path.exists(path):
+            self.scale(source, size, path)
+            # Variants of an older version of the source are never read again.
+            for stale in glob.glob(f"{glob.escape(prefix)}*.png"):
+                if stale != path:
+                    os.remove(stale)
+        return path
+
+    def scale(self, source, size, path):
+        from PIL import Image
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with Image.open(source) as image:
+            scaled = image.convert("RGBA").resize(size, Image.LANCZOS)
+        # Write under a temporary name so a crash never leaves a truncated variant.
+        temporary = f"{path}.tmp"
+        scaled.save(temporary, format="PNG")
+        os.replace(temporary, path)
+        logging.info(f"Cached {os.path.basename(source)} at {size[0]}x{size[1]}")
+
+    def photo(self, name, size):
+        """Return the shared PhotoImage of img/<name> scaled to size, or None if the file is missing."""
+        key = (name, tuple(size))
+        if key not in self.photos:
+            path = self.variant_path(name, key[1])
+            if path is None:
+                logging.warning(f"Image not found: {os.path.join(self.source_dir, name)}")
+            self.photos[key] = tk.PhotoImage(file=path) if path is not None else None
+        return self.photos[key]
+
+
+# Shared by every tab of the application.
+assets = AssetCache()
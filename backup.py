@@ -0,0 +1,295 @@
+"""Online backups of the clinic database through the SQLite backup API.
+
+    python backup.py backup [--database PATH] [--dir DIR] [--keep N] [--compress]
+    python backup.py list [--dir DIR]
+    python backup.py verify SNAPSHOT
+    python backup.py restore SNAPSHOT [--database PATH]
+
+Snapshots are copied a few pages at a time from a read transaction, so the
+app keeps reading and writing while a backup runs, and every snapshot is
+integrity checked before it counts. Restore with the app closed.
+"""
+import os
+import sys
+import gzip
+import time
+import shutil
+import logging
+import sqlite3
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+
+# Pages copied per backup step (1 MB at the default 4 KB page size).
+PAGES_PER_STEP = 256
+# Seconds to rest between steps, leaving the disk to the app.
+STEP_PAUSE = 0.002
+# Snapshots kept by rotation, newest first.
+KEEP = 7
+# Hours between scheduled backups.
+INTERVAL_HOURS = 24
+PREFIX = "animalium-"
+# Bytes read at a time when compressing or decompressing.
+CHUNK = 1024 * 1024
+# SQLite instructions between checks for a cancel while verifying.
+CANCEL_CHECK_STEPS = 10000
+
+
+class BackupCancelled(Exception):
+    """The backup was stopped before it finished; nothing was kept."""
+
+
+def backup_dir(db_path):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), "backups")
+
+
+def snapshots(directory):
+    """Paths of the snapshots in directory, newest first."""
+    if not os.path.isdir(directory):
+        return []
+    names = [name for name in os.listdir(directory)
+             if name.startswith(PREFIX) and name.endswith((".db", ".db.gz"))]
+    # The timestamp in the name sorts in date order
+    return [os.path.join(directory, name) for name in sorted(names, reverse=True)]
+
+
+def rotate(directory, keep=KEEP):
+    """Delete all but the newest `keep` snapshots; returns the deleted paths."""
+    expired = snapshots(directory)[keep:]
+    for path in expired:
+        os.remove(path)
+    return expired
+
+
+def verify(path, cancel=None):
+    """Raise ValueError unless PRAGMA integrity_check finds the database sound.
+
+    cancel, an Event, interrupts the check part way through with BackupCancelled.
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        if cancel is not None:
+            # A true return value makes SQLite interrupt the running statement
+            conn.set_progress_handler(cancel.is_set, CANCEL_CHECK_STEPS)
+        problems = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    except sqlite3.OperationalError:
+        if cancel is not None and cancel.is_set():
+            raise BackupCancelled("Backup cancelled")
+        raise
+    finally:
+        conn.close()
+    if problems != ["ok"]:
+        raise ValueError(f"{os.path.basename(path)} failed the integrity check: {'; '.join(problems[:5])}")
+
+
+@contextmanager
+def open_snapshot(path):
+    """Yield the path of the plain database file of a snapshot, decompressing .gz to a temporary file."""
+    if not path.endswith(".gz"):
+        yield path
+        return
+    fd, plain = tempfile.mkstemp(suffix=".db", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as target, gzip.open(path, "rb") as source:
+            shutil.copyfileobj(source, target, CHUNK)
+        yield plain
+    finally:
+        os.remove(plain)
+
+
+def copy_database(source, target, pages=PAGES_PER_STEP, pause=STEP_PAUSE, progress=None, cancel=None):
+    """Copy the database of connection `source` into connection `target` in steps.
+
+    The copy runs inside one read transaction on the source. Under WAL that
+    pins the snapshot being copied: writers carry on, and their commits
+    neither show up half way through nor restart the copy, which without
+    the transaction happens on every write and never finishes on a busy
+    database. progress(copied, total) is called after every step;
+    cancel, an Event, stops the copy between steps.
+    """
+    source.execute("BEGIN")
+    try:
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()  # Starts the read transaction
+
+        def step(status, remaining, total):
+            if cancel is not None and cancel.is_set():
+                raise BackupCancelled("Backup cancelled")
+            if progress is not None:
+                progress(total - remaining, total)
+            if pause:
+                time.sleep(pause)
+
+        source.backup(target, pages=pages, progress=step)
+    finally:
+        source.execute("COMMIT")
+
+
+def backup(db_path, directory=None, keep=KEEP, compress=False, pages=PAGES_PER_STEP, pause=STEP_PAUSE,
+           progress=None, cancel=None):
+    """Take a verified snapshot of db_path into directory, rotate old ones out and return its path."""
+    directory = directory or backup_dir(db_path)
+    os.makedirs(directory, exist_ok=True)
+    name = f"{PREFIX}{datetime.now():%Y%m%d-%H%M%S}.db"
+    partial = os.path.join(directory, name + ".partial")
+    path = os.path.join(directory, name + (".gz" if compress else ""))
+    started = time.perf_counter()
+
+    source = sqlite3.connect(db_path, isolation_level=None, timeout=5)
+    target = sqlite3.connect(partial)
+    try:
+        copy_database(source, target, pages, pause, progress, cancel)
+        # The copy comes over in WAL mode; a snapshot should be one self-contained file
+        target.execute("PRAGMA journal_mode = DELETE")
+        target.close()
+        verify(partial, cancel)
+        if compress:
+            with open(partial, "rb") as plain, gzip.open(path + ".partial", "wb", compresslevel=6) as packed:
+                while chunk := plain.read(CHUNK):
+                    if cancel is not None and cancel.is_set():
+                        raise BackupCancelled("Backup cancelled")
+                    packed.write(chunk)
+            os.replace(path + ".partial", path)
+            os.remove(partial)
+        else:
+            os.replace(partial, path)
+    except BaseException:
+        target.close()
+        for leftover in (partial, partial + "-wal", partial + "-shm", path + ".partial"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+    finally:
+        source.close()
+
+    expired = rotate(directory, keep)
+    logging.info(f"Backed up to {path} in {time.perf_counter() - started:.1f} s"
+                 f"{f', removed {len(expired)} old snapshots' if expired else ''}")
+    return path
+
+
+def restore(snapshot, db_path, pages=PAGES_PER_STEP):
+    """Replace the contents of db_path with a verified snapshot."""
+    with open_snapshot(snapshot) as plain:
+        verify(plain)
+        source = sqlite3.connect(f"file:{plain}?mode=ro", uri=True)
+        target = sqlite3.connect(db_path, timeout=5)
+        try:
+            # Through the backup API, so the WAL and any open connection stay consistent
+            source.backup(target, pages=pages)
+        finally:
+            source.close()
+            target.close()
+    logging.info(f"Restored {db_path} from {snapshot}")
+
+
+class BackupScheduler:
+    """Backs a database up on a background thread every `interval` seconds.
+
+    The first backup is due once the newest snapshot is older than
+    `interval`. on_done(path, error) is called on the backup thread after
+    each attempt.
+    """
+
+    def __init__(self, db_path, directory=None, interval=INTERVAL_HOURS * 3600, keep=KEEP, compress=True,
+                 on_done=None):
+        self.db_path = db_path
+        self.directory = directory or backup_dir(db_path)
+        self.interval = interval
+        self.keep = keep
+        self.compress = compress
+        self.on_done = on_done
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.running = False
+        self.thread = threading.Thread(target=self.run, name="db-backup", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def backup_now(self):
+        self.wake.set()
+
+    def due_in(self):
+        """Seconds until the next scheduled backup."""
+        latest = snapshots(self.directory)
+        if not latest:
+            return 0
+        return max(0, os.path.getmtime(latest[0]) + self.interval - time.time())
+
+    def run(self):
+        while not self.stopping.is_set():
+            self.wake.wait(self.due_in())
+            self.wake.clear()
+            if self.stopping.is_set():
+                break
+            self.running = True
+            path, error = None, None
+            try:
+                path = backup(self.db_path, self.directory, self.keep, self.compress, cancel=self.stopping)
+            except BackupCancelled:
+                break
+            except Exception as e:
+                logging.error(f"Backup of {self.db_path} failed: {e}")
+                error = e
+            finally:
+                self.running = False
+            if self.on_done is not None:
+                self.on_done(path, error)
+            if error is not None:
+                # Try again after a while instead of straight away
+                self.wake.wait(min(self.interval, 3600))
+
+    def stop(self):
+        """Stop the schedule, abandoning a backup in progress."""
+        self.stopping.set()
+        self.wake.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+
+def main(argv=None):
+    from db import DB_PATH
+
+    parser = argparse.ArgumentParser(description="Back up, check and restore the clinic database.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    take = commands.add_parser("backup", help="take a snapshot now")
+    take.add_argument("--database", default=DB_PATH)
+    take.add_argument("--dir")
+    take.add_argument("--keep", type=int, default=KEEP)
+    take.add_argument("--compress", action="store_true")
+    listing = commands.add_parser("list", help="list the snapshots, newest first")
+    listing.add_argument("--dir", default=backup_dir(DB_PATH))
+    check = commands.add_parser("verify", help="integrity check a snapshot")
+    check.add_argument("snapshot")
+    back = commands.add_parser("restore", help="replace the database with a snapshot")
+    back.add_argument("snapshot")
+    back.add_argument("--database", default=DB_PATH)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    try:
+        if args.command == "backup":
+            def report(copied, total):
+                print(f"\rCopied {copied}/{total} pages", end="", flush=True)
+            path = backup(args.database, args.dir, args.keep, args.compress, progress=report)
+            print()
+            print(path)
+        elif args.command == "list":
+            for path in snapshots(args.dir):
+                print(f"{path}  {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+        elif args.command == "verify":
+            with open_snapshot(args.snapshot) as plain:
+                verify(plain)
+            print(f"{args.snapshot}: ok")
+        elif args.command == "restore":
+            restore(args.snapshot, args.database)
+    except (ValueError, OSError, sqlite3.Error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
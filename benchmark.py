@@ -0,0 +1,288 @@
+"""Headless benchmarks of the queries behind each tab, on synthetic clinic data.
+
+    python benchmark.py [--size small|medium|large] [--clients N] [--invoices N]
+                        [--runs N] [--save BASELINE.json] [--compare BASELINE.json]
+
+The dataset is generated once per (size, seed) and kept under .cache/bench.
+Each case calls the same tab method the UI runs on its reader thread, with
+a stand-in for the tab so no window is needed.
+"""
+import os
+import sys
+import json
+import time
+import random
+import resource
+import argparse
+import datetime
+import platform
+import statistics
+import multiprocessing
+from types import SimpleNamespace
+from db import Database
+from migrations import MIGRATIONS
+from repositories import Repositories
+from clients import ClientsTab
+from dashboard import DashboardTab
+from reports import IncomeEngine
+
+# Preset sizes as (clients, invoices).
+SIZES = {
+    "small": (10_000, 100_000),
+    "medium": (100_000, 1_000_000),
+    "large": (1_000_000, 10_000_000),
+}
+SEED = 42
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "bench")
+# Rows written per transaction while generating.
+BATCH_SIZE = 50_000
+# Invoices are spread over the five years before this day, so every run sees the same dates.
+LAST_DAY = datetime.date(2025, 12, 31)
+DAYS = 5 * 365
+RUNS = 50
+WARMUP_RUNS = 3
+# Page keys looked up before timing, for the Next page cases to seek from.
+ANCHORS = 100
+# A case regresses when its p95 grows by more than this fraction over the baseline.
+TOLERANCE = 0.25
+# ...and by more than this many milliseconds, so timer noise on sub-millisecond cases is ignored.
+MIN_REGRESSION_MS = 0.5
+# Peak RSS regresses when it grows by more than this fraction and more than MIN_RSS_REGRESSION_MB.
+RSS_TOLERANCE = 0.10
+MIN_RSS_REGRESSION_MB = 5
+
+FIRST_NAMES = ["Ana", "Luis", "Maria", "Jose", "Carmen", "Pedro", "Lucia", "Javier", "Elena", "Pablo",
+               "Sofia", "Diego", "Laura", "Miguel", "Isabel", "Andres", "Paula", "Jorge", "Marta", "Raul"]
+LAST_NAMES = ["Garcia", "Martinez", "Lopez", "Sanchez", "Perez", "Gomez", "Fernandez", "Ruiz", "Diaz",
+              "Moreno", "Alvarez", "Romero", "Navarro", "Torres", "Dominguez", "Vazquez", "Ramos", "Gil"]
+STREETS = ["Mayor", "Real", "Sol", "Luna", "Olivo", "Rio", "Mar", "Prado", "Alameda", "Castillo"]
+
+
+def dataset_path(clients, invoices, seed=SEED):
+    # The schema version is part of the name, so a migration means a fresh dataset.
+    return os.path.join(DATA_DIR, f"clinic-{clients}c-{invoices}i-s{seed}-v{MIGRATIONS[-1][0]}.db")
+
+
+def generate(path, clients, invoices, seed=SEED):
+    """Write a synthetic clinic to `path`; the same arguments always give the same data."""
+    rng = random.Random(seed)
+    first_day = LAST_DAY - datetime.timedelta(days=DAYS - 1)
+    temporary = f"{path}.tmp"
+    for leftover in (temporary, f"{temporary}-wal", f"{temporary}-shm"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    db = Database(temporary)
+    started = time.perf_counter()
+
+    def client_rows(count):
+        for _ in range(count):
+            yield (f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}",
+                   f"555-{rng.randrange(10 ** 7):07d}",
+                   f"Calle {rng.choice(STREETS)} {rng.randrange(1, 200)}",
+                   (first_day + datetime.timedelta(days=rng.randrange(DAYS))).isoformat())
+
+    def invoice_rows(count):
+        for _ in range(count):
+            yield (rng.randrange(1, clients + 1),
+                   (first_day + datetime.timedelta(days=rng.randrange(DAYS))).isoformat(),
+                   round(rng.uniform(10, 500), 2))
+
+    # Inserted through the normal triggers, so metrics, rollups and the search index are filled too.
+    for done in range(0, clients, BATCH_SIZE):
+        db.execute_many("INSERT INTO clients (name, phone, address, created_at) VALUES (?, ?, ?, ?)",
+                        client_rows(min(BATCH_SIZE, clients - done)))
+    for done in range(0, invoices, BATCH_SIZE):
+        db.execute_many("INSERT INTO invoices (client_id, date, total_amount) VALUES (?, ?, ?)",
+                        invoice_rows(min(BATCH_SIZE, invoices - done)))
+        print(f"  {done + min(BATCH_SIZE, invoices - done)}/{invoices} invoices", end="\r", flush=True)
+    print()
+    db.connection().execute("PRAGMA optimize")
+    db.connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    db.close()
+    os.replace(temporary, path)
+    print(f"Generated {clients} clients and {invoices} invoices in {time.perf_counter() - started:.0f} s")
+
+
+def ensure_dataset(clients, invoices, seed=SEED):
+    """Path of the dataset, generated in a child process so its memory does not count towards peak RSS."""
+    path = dataset_path(clients, invoices, seed)
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        process = multiprocessing.get_context("spawn").Process(target=generate, args=(path, clients, invoices, seed))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            sys.exit(f"Generating {path} failed")
+    return path
+
+
+def tab(repos, **state):
+    """Stand-in for a tab: the query methods only use the repositories and a few attributes."""
+    return SimpleNamespace(repos=repos, db=repos.db, **state)
+
+
+def cases(db, clients, invoices, rng):
+    """{name: callable} of the query paths to time; each call picks new arguments from `rng`."""
+    repos = Repositories(db)
+    by_id = tab(repos, sort_column="id", records_per_page=5)
+    by_name = tab(repos, sort_column="name", records_per_page=5)
+    first_day = LAST_DAY - datetime.timedelta(days=DAYS - 1)
+    last_page = max(clients // 5 - 1, 1)
+    # Keys of the last row of random pages, so the timed calls only seek as the Next button does
+    id_anchors = [ClientsTab.fetch_page_anchor(by_id, rng.randrange(1, last_page)) for _ in range(ANCHORS)]
+    name_anchors = [ClientsTab.fetch_page_anchor(by_name, rng.randrange(1, last_page)) for _ in range(ANCHORS)]
+
+    def fetch_clients_page():
+        ClientsTab.count_clients(by_id)
+        return ClientsTab.fetch_clients(by_id, after=rng.choice(id_anchors), limit=5)
+
+    def fetch_clients_by_name():
+        return ClientsTab.fetch_clients(by_name, after=rng.choice(name_anchors), limit=5)
+
+    def jump_to_page():
+        # Typing a page number: an OFFSET walk of the name index to find the anchor, then the seek
+        anchor = ClientsTab.fetch_page_anchor(by_name, rng.randrange(1, last_page))
+        return ClientsTab.fetch_clients(by_name, after=anchor, limit=5)
+
+    def search_client_prefix():
+        # Under three characters the search is a LIKE prefix on the name index
+        return ClientsTab.query_clients(by_id, rng.choice(FIRST_NAMES)[:2])
+
+    def search_client_text():
+        return ClientsTab.query_clients(by_id, rng.choice(LAST_NAMES)[1:6].lower())
+
+    def load_invoices():
+        # What the invoice list's VirtualTreeview reads on a scroll: the next block, seeking from the last id shown
+        repos.invoices.count()
+        return repos.invoices.page(None, 100, after=rng.randrange(100, invoices + 1))
+
+    def jump_invoices():
+        # A scrollbar jump, which finds its block by OFFSET
+        return repos.invoices.page(rng.randrange(max(invoices - 100, 1)), 100)
+
+    def calculate_income():
+        # A new engine every call, so the report is built rather than served from its cache
+        start = first_day + datetime.timedelta(days=rng.randrange(DAYS - 365))
+        end = start + datetime.timedelta(days=364)
+        return IncomeEngine(db).report(start.isoformat(), end.isoformat(), "client_month")
+
+    def load_dashboard_metrics():
+        return DashboardTab.fetch_dashboard_data(tab(repos))
+
+    return {
+        "ClientsTab.fetch_clients": fetch_clients_page,
+        "ClientsTab.fetch_clients (by name)": fetch_clients_by_name,
+        "ClientsTab.fetch_page_anchor (jump)": jump_to_page,
+        "ClientsTab.search_client (prefix)": search_client_prefix,
+        "ClientsTab.search_client (text)": search_client_text,
+        "InvoicesTab.load_invoices": load_invoices,
+        "InvoicesTab.load_invoices (jump)": jump_invoices,
+        "IncomeTab.calculate_income": calculate_income,
+        "DashboardTab.load_dashboard_metrics": load_dashboard_metrics,
+    }
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run(clients, invoices, runs=RUNS, seed=SEED):
+    path = ensure_dataset(clients, invoices, seed)
+    db = Database(path)
+    rng = random.Random(seed)
+    results = {}
+    for name, case in cases(db, clients, invoices, rng).items():
+        for _ in range(WARMUP_RUNS):
+            case()
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            case()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        results[name] = {
+            "runs": runs,
+            "p50_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(percentile(timings, 0.95), 3),
+            "max_ms": round(timings[-1], 3),
+        }
+    db.close()
+    return {
+        "clients": clients,
+        "invoices": invoices,
+        "seed": seed,
+        "schema_version": MIGRATIONS[-1][0],
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "cases": results,
+    }
+
+
+def report(results, baseline=None, tolerance=TOLERANCE, rss_tolerance=RSS_TOLERANCE):
+    """Lines of a results table, compared with the baseline if given; also returns the regressed cases."""
+    lines = [f"{results['clients']} clients, {results['invoices']} invoices, "
+             f"peak RSS {results['peak_rss_mb']:.1f} MB"]
+    lines.append(f"{'case':<40} {'p50 ms':>9} {'p95 ms':>9}" + (f" {'base p95':>9} {'change':>8}" if baseline else ""))
+    regressions = []
+    for name, stats in results["cases"].items():
+        line = f"{name:<40} {stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f}"
+        before = baseline["cases"].get(name) if baseline else None
+        if before:
+            change = stats["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+            line += f" {before['p95_ms']:9.2f} {change:+8.0%}"
+            if change > tolerance and stats["p95_ms"] - before["p95_ms"] > MIN_REGRESSION_MS:
+                regressions.append(name)
+                line += "  REGRESSION"
+        lines.append(line)
+    if baseline:
+        rss, before = results["peak_rss_mb"], baseline["peak_rss_mb"]
+        change = rss / before - 1 if before else 0.0
+        line = f"Baseline peak RSS {before:.1f} MB ({change:+.0%})"
+        if change > rss_tolerance and rss - before > MIN_RSS_REGRESSION_MB:
+            regressions.append("peak RSS")
+            line += "  REGRESSION"
+        lines.append(line)
+        if (baseline["clients"], baseline["invoices"]) != (results["clients"], results["invoices"]):
+            lines.append("Warning: the baseline was measured on a different dataset size")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the tab queries on synthetic data.")
+    parser.add_argument("--size", choices=SIZES, default="small")
+    parser.add_argument("--clients", type=int, help="overrides the preset's client count")
+    parser.add_argument("--invoices", type=int, help="overrides the preset's invoice count")
+    parser.add_argument("--runs", type=int, default=RUNS)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--save", metavar="BASELINE", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare with a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--rss-tolerance", type=float, default=RSS_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    clients, invoices = SIZES[args.size]
+    clients, invoices = args.clients or clients, args.invoices or invoices
+    results = run(clients, invoices, args.runs, args.seed)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+    lines, regressions = report(results, baseline, args.tolerance, args.rss_tolerance)
+    print("\n".join(lines))
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=1)
+        print(f"Saved baseline to {args.save}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
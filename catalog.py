@@ -0,0 +1,134 @@
+import time
+import bisect
+import threading
+import weakref
+from dataclasses import dataclass
+
+# Catalog kind -> (table, metrics key of its version stamp)
+CATALOG_TABLES = {
+    "product": ("products", "products_version"),
+    "service": ("services", "services_version"),
+}
+# Seconds a cached table is trusted before its version stamp is read again,
+# for writes made by other processes.
+CHECK_INTERVAL = 1.0
+
+
+@dataclass(frozen=True)
+class CatalogItem:
+    kind: str
+    id: int
+    name: str
+    price: float
+
+
+class CatalogTable:
+    """One version of a catalog table, indexed by id, by name and by sorted name."""
+
+    def __init__(self, version, items):
+        self.version = version
+        self.items = sorted(items, key=lambda item: (item.name.lower(), item.id))
+        self.by_id = {item.id: item for item in self.items}
+        self.by_name = {}
+        for item in self.items:
+            self.by_name.setdefault(item.name.lower(), item)
+        self.keys = [item.name.lower() for item in self.items]
+
+
+class Catalog:
+    """Read-through cache of products and services shared by every tab.
+
+    A cached table carries the version stamp in metrics that the products
+    and services triggers bump on every write. A lookup returns it without
+    a query or a lock until the database's writer commits another batch, or
+    CHECK_INTERVAL passes for writes from other processes. Then the stamp
+    is read once and the table re-read only if the stamp has changed.
+
+    Inside a transaction, as when invoices are priced on the writer thread,
+    the stamp is read every time, and a table that does not match is read
+    for that call alone. Rows that are not committed yet never reach the
+    shared cache.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.tables = {}  # Kind -> CatalogTable
+        self.checked = {}  # Kind -> (writer batches, time) when its version was last read
+        self.lock = threading.Lock()  # Taken only to re-check and reload
+
+    def table(self, kind):
+        if self.db.connection().in_transaction:
+            return self.table_in_transaction(kind)
+        table = self.tables.get(kind)
+        if table is not None and self.is_fresh(kind):
+            return table
+        with self.lock:
+            table = self.tables.get(kind)
+            if table is not None and self.is_fresh(kind):
+                return table
+            # Counted before reading, so a batch committed meanwhile is checked again
+            checked = (self.db.writes.batches, time.monotonic())
+            version = self.version(kind)
+            if table is None or table.version != version:
+                table = self.tables[kind] = self.load(kind, version)
+            self.checked[kind] = checked
+            return table
+
+    def is_fresh(self, kind):
+        batches, at = self.checked.get(kind, (None, 0.0))
+        return batches == self.db.writes.batches and time.monotonic() - at < CHECK_INTERVAL
+
+    def table_in_transaction(self, kind):
+        version = self.version(kind)
+        table = self.tables.get(kind)
+        if table is not None and table.version == version:
+            return table
+        return self.load(kind, version)
+
+    def version(self, kind):
+        return self.db.fetch_one("SELECT value FROM metrics WHERE key = ?", (CATALOG_TABLES[kind][1],))[0]
+
+    def load(self, kind, version):
+        rows = self.db.fetch_all(f"SELECT id, name, price FROM {CATALOG_TABLES[kind][0]}")
+        return CatalogTable(version, [CatalogItem(kind, *row) for row in rows])
+
+    def items(self, kind):
+        """All items of a kind, ordered by name."""
+        return self.table(kind).items
+
+    def get(self, kind, item_id):
+        return self.table(kind).by_id.get(int(item_id))
+
+    def find(self, kind, name):
+        """The item with this name, ignoring case; the lowest id wins on duplicates."""
+        return self.table(kind).by_name.get(name.strip().lower())
+
+    def prefix(self, kind, prefix, limit=None):
+        """Items whose name starts with `prefix`, ignoring case, ordered by name."""
+        table = self.table(kind)
+        prefix = prefix.strip().lower()
+        start = bisect.bisect_left(table.keys, prefix)
+        stop = bisect.bisect_left(table.keys, prefix + "\uffff", start)
+        if limit is not None:
+            stop = min(stop, start + limit)
+        return table.items[start:stop]
+
+    def prices(self, kind, ids):
+        """{id: price} for the given ids that exist."""
+        by_id = self.table(kind).by_id
+        return {item_id: by_id[item_id].price for item_id in ids if item_id in by_id}
+
+
+_catalogs = weakref.WeakKeyDictionary()  # Database -> its shared Catalog
+_catalogs_lock = threading.Lock()
+
+
+def catalog_for(db):
+    """Return the Catalog shared by everything using `db`."""
+    catalog = _catalogs.get(db)
+    if catalog is not None:
+        return catalog
+    with _catalogs_lock:
+        if db not in _catalogs:
+            _catalogs[db] = Catalog(db)
+        return _catalogs[db]
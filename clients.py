@@ -1,15 +1,22 @@
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 from ttkbootstrap.toast import ToastNotification
-from ttkbootstrap.tableview import Tableview
 from ttkbootstrap.validation import add_regex_validation
-from tkinter import messagebox
+from validation import TEXT_PATTERN
+from importer import import_file, summary, FILE_TYPES
+from tkinter import messagebox, filedialog
+from widgets import BoundTreeview, LoadingIndicator
 import logging
 
+# Delay after the last keystroke before the search runs.
+SEARCH_DELAY_MS = 250
+
 class ClientsTab(ttk.Frame):
-    def __init__(self, parent, db):
+    def __init__(self, parent, repos, executor):
         super().__init__(parent)
-        self.db = db
+        self.repos = repos
+        self.db = repos.db  # None when the data is served by the API server
+        self.executor = executor
         self.name = ttk.StringVar(value="")
         self.phone = ttk.StringVar(value="")
         self.address = ttk.StringVar(value="")
@@ -17,56 +24,46 @@ class ClientsTab(ttk.Frame):
         self.current_page = 0
         self.records_per_page = 5
         self.total_records = 0
+        self.sort_column = "id"
+        self.page_rows = []  # Rows shown on the current page
+        self.page_anchors = {0: None}  # Page number -> sort key the page starts after
+        self.search_job = None  # Pending debounced search
+        self.last_search = ""
         self.create_clients_tab()
         self.load_data()
 
-    def execute_db_query(self, query, params=()):
-        """Helper method to execute a database query."""
-        try:
-            with self.db.create_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(query, params)
-                conn.commit()
-                return cursor
-        except Exception as e:
-            logging.error(f"Database error: {e}")
-            messagebox.showerror("Error", f"Database operation failed: {e}")
+    def on_db_error(self, error):
+        """Report a failed background database call."""
+        logging.error(f"Database error: {error}")
+        messagebox.showerror("Error", f"Database operation failed: {error}")
 
     def insert_client(self, name, phone, address):
         """Insert a new client into the database."""
-        self.execute_db_query('INSERT INTO clients (name, phone, address) VALUES (?, ?, ?)', (name, phone, address))
+        self.repos.clients.add(name, phone, address)
 
     def update_client(self, client_id, name, phone, address):
         """Update an existing client in the database."""
-        self.execute_db_query('UPDATE clients SET name = ?, phone = ?, address = ? WHERE id = ?', (name, phone, address, client_id))
+        self.repos.clients.update(client_id, name, phone, address)
 
     def delete_client(self, client_id):
         """Delete a client from the database."""
-        self.execute_db_query('DELETE FROM clients WHERE id = ?', (client_id,))
+        self.repos.clients.delete(client_id)
 
-    def fetch_clients(self, offset=0, limit=5):
-        """Fetch clients from the database with pagination."""
-        try:
-            with self.db.create_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT * FROM clients LIMIT ? OFFSET ?', (limit, offset))
-                return cursor.fetchall()
-        except Exception as e:
-            logging.error(f"Failed to fetch clients: {e}")
-            messagebox.showerror("Error", f"Failed to fetch clients: {e}")
-            return []
+    def row_key(self, row):
+        """Return the sort key of a client row for the current ordering."""
+        return (row[1], row[0]) if self.sort_column == "name" else (row[0],)
+
+    def fetch_clients(self, after=None, before=None, inclusive=False, limit=5):
+        """Fetch a page of clients in the current order, seeking from a sort key."""
+        return self.repos.clients.page(self.sort_column, after, before, inclusive, limit)
+
+    def fetch_page_anchor(self, page):
+        """Return the sort key the given page starts after."""
+        return self.repos.clients.page_anchor(self.sort_column, page, self.records_per_page)
 
     def count_clients(self):
-        """Count the total number of clients in the database."""
-        try:
-            with self.db.create_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT COUNT(*) FROM clients')
-                return cursor.fetchone()[0]
-        except Exception as e:
-            logging.error(f"Failed to count clients: {e}")
-            messagebox.showerror("Error", f"Failed to count clients: {e}")
-            return 0
+        """Return the client count kept up to date by the clients triggers."""
+        return self.repos.clients.count()
 
     def create_clients_tab(self):
         """Create the clients tab UI components."""
@@ -91,7 +88,7 @@ class ClientsTab(ttk.Frame):
         form_input = ttk.Entry(master=form_field_container, textvariable=variable)
         form_input.pack(side=LEFT, padx= 5, fill=X, expand=YES)
         
-        add_regex_validation(form_input, r'^[a-zA-Z0-9_ ]*$')  # Allow spaces in names
+        add_regex_validation(form_input, TEXT_PATTERN)  # Allow spaces in names
     
         return form_input
 
@@ -127,21 +124,32 @@ class ClientsTab(ttk.Frame):
         )
         submit_btn.pack(side=RIGHT, padx=5)
 
+        import_btn = ttk.Button(
+            master=button_container,
+            text="Import",
+            command=self.import_clients,
+            bootstyle=SECONDARY,
+            width=8,
+            # Imports read the file on this desk and write to the local database
+            state=NORMAL if self.db is not None else DISABLED,
+        )
+        import_btn.pack(side=LEFT, padx=5)
+
     def create_table(self):
         """Create the table to display clients."""
         ttk.Label(self, text="Search Client:").pack(pady=5)
         self.search_var = ttk.StringVar()
         self.search_entry = ttk.Entry(self, textvariable=self.search_var)
         self.search_entry.pack(pady=5)
-        self.search_entry.bind("<KeyRelease>", self.search_client)
+        self.search_entry.bind("<KeyRelease>", self.schedule_search)
 
         style = ttk.Style()
         style.configure("Treeview.Heading", background="#003366", foreground="white", font=("Arial", 10, "bold"))
         style.configure("Treeview", rowheight=20)
 
-        self.table = ttk.Treeview(self, columns=("ID", "Name", "Phone", "Address"), show='headings', height=10)
-        self.table.heading("ID", text="ID")
-        self.table.heading("Name", text="Name")
+        self.table = BoundTreeview(self, columns=("ID", "Name", "Phone", "Address"), stripes=('oddrow', 'evenrow'), height=10)
+        self.table.heading("ID", text="ID", command=lambda: self.sort_by("id"))
+        self.table.heading("Name", text="Name", command=lambda: self.sort_by("name"))
         self.table.heading("Phone", text="Phone")
         self.table.heading("Address", text="Address")
         self.table.column("ID", width=5)
@@ -166,25 +174,69 @@ class ClientsTab(ttk.Frame):
 
         self.page_info_label = ttk.Label(self.pagination_frame, text="")
         self.page_info_label.pack(side='left', padx=5)
+
+        self.jump_var = ttk.StringVar()
+        self.jump_entry = ttk.Entry(self.pagination_frame, textvariable=self.jump_var, width=6)
+        self.jump_entry.pack(side='left', padx=5)
+        self.jump_entry.bind("<Return>", self.jump_to_page)
+        self.jump_button = ttk.Button(self.pagination_frame, text="Go", command=self.jump_to_page)
+        self.jump_button.pack(side='left', padx=5)
+
+        self.loading = LoadingIndicator(self.pagination_frame)
+        self.loading.pack(side='left', padx=5)
         
         return self.table
 
     def load_data(self):
-        """Load client data into the table."""
-        for row in self.table.get_children():
-            self.table.delete(row)
-        clients = self.fetch_clients(self.current_page * self.records_per_page, self.records_per_page)
-        for index, client in enumerate(clients):
-            tag = 'oddrow' if index % 2 == 0 else 'evenrow'
-            self.table.insert("", "end", values=client, tags=(tag,))
-        self.update_pagination()
-
-    def update_pagination(self):
-        """Update pagination controls based on the total number of records."""
-        self.total_records = self.count_clients()
+        """Reload the current page, e.g. after a client was added, edited or removed."""
+        self.last_search = ""
+        # Writes shift rows between pages, so only the current page's start is kept.
+        self.page_anchors = {0: None}
+        first_key = self.row_key(self.page_rows[0]) if self.page_rows else None
+        self.executor.read(self.read_current_page, first_key, self.current_page,
+                           on_done=self.on_page_reloaded, on_error=self.on_db_error,
+                           key="clients.page", indicator=self.loading)
+
+    def read_current_page(self, first_key, page):
+        """Re-read the page starting at first_key together with the client total."""
+        limit = self.records_per_page + 1
+        rows = self.fetch_clients(after=first_key, inclusive=True, limit=limit)
+        if not rows and page > 0:
+            page, rows = 0, self.fetch_clients(limit=limit)
+        return page, rows, self.count_clients()
+
+    def on_page_reloaded(self, result):
+        self.current_page, rows, self.total_records = result
+        self.show_page(rows)
+
+    def go_to_page(self, page, has_next=None, **seek):
+        """Fetch a page on a reader thread and show it when it arrives."""
+        def show(rows):
+            if rows:
+                self.current_page = page
+                self.show_page(rows, has_next)
+
+        self.executor.read(lambda: self.fetch_clients(**seek), on_done=show, on_error=self.on_db_error,
+                           key="clients.page", indicator=self.loading)
+
+    def show_page(self, rows, has_next=None):
+        """Display a page of rows; one extra row beyond the page size means there is a next page."""
+        if has_next is None:
+            has_next = len(rows) > self.records_per_page
+        rows = rows[:self.records_per_page]
+        self.page_rows = rows
+        if rows:
+            self.page_anchors[self.current_page + 1] = self.row_key(rows[-1])
+        # Keyed by client id, so only rows that changed are redrawn
+        self.table.set_rows([(client[0], *client) for client in rows])
+        self.update_pagination(has_next)
+
+    def update_pagination(self, has_next):
+        """Update pagination controls; the total is only re-read after writes."""
+        total_pages = max(1, (self.total_records + self.records_per_page - 1) // self.records_per_page)
         self.prev_button['state'] = 'normal' if self.current_page > 0 else 'disabled'
-        self.next_button['state'] = 'normal' if (self.current_page + 1) * self.records_per_page < self.total_records else 'disabled'
-        self.page_info_label.config(text=f"Page {self.current_page + 1} of {((self.total_records + self.records_per_page - 1) // self.records_per_page)} - Total Records: {self.total_records}")
+        self.next_button['state'] = 'normal' if has_next else 'disabled'
+        self.page_info_label.config(text=f"Page {self.current_page + 1} of {total_pages} - Total Records: {self.total_records}")
 
     def show_message(self, message):
         """Display a toast notification."""
@@ -195,47 +247,56 @@ class ClientsTab(ttk.Frame):
         )
         toast.show_toast()
 
+    def on_client_saved(self, message):
+        self.load_data()
+        self.clear_entries()
+        self.show_message(message)
+
     def add_client(self):
         """Add a new client."""
         name = self.name.get()
         phone = self.phone.get()
         address = self.address.get()
-        self.insert_client(name, phone, address)
-        self.load_data()
-        self.clear_entries()
-        self.show_message(" Client added successfully!")
+        self.executor.write(self.insert_client, name, phone, address,
+                            on_done=lambda _: self.on_client_saved(" Client added successfully!"),
+                            on_error=self.on_db_error, indicator=self.loading)
+
+    def import_clients(self):
+        """Import clients from a CSV or Excel file, refreshing the table once at the end."""
+        path = filedialog.askopenfilename(title="Import clients", filetypes=FILE_TYPES)
+        if path:
+            # On a reader thread: the file is read there and each chunk is queued as its own write
+            self.executor.read(import_file, self.db, path, "clients",
+                               on_done=lambda result: self.on_client_saved(summary(result)),
+                               on_error=self.on_db_error, indicator=self.loading)
 
     def edit_selected_client(self):
         """Edit the selected client."""
-        selected_item = self.table.selection()
-        if selected_item:
-            client_id = self.table.item(selected_item, 'values')[0]
+        client_id = self.table.selected_key()
+        if client_id is not None:
             name = self.name.get()
             phone = self.phone.get()
             address = self.address.get()
-            self.update_client(client_id, name, phone, address)
-            self.load_data()
-            self.clear_entries()
-            self.show_message("Client updated successfully!")
+            self.executor.write(self.update_client, client_id, name, phone, address,
+                                on_done=lambda _: self.on_client_saved("Client updated successfully!"),
+                                on_error=self.on_db_error, indicator=self.loading)
 
     def delete_selected_client(self):
         """Delete the selected client."""
-        selected_item = self.table.selection()
-        if selected_item:
-            client_id = self.table.item(selected_item, 'values')[0]
-            self.delete_client(client_id)
-            self.load_data()
-            self.clear_entries()
-            self.show_message("Client deleted successfully!")
+        client_id = self.table.selected_key()
+        if client_id is not None:
+            self.executor.write(self.delete_client, client_id,
+                                on_done=lambda _: self.on_client_saved("Client deleted successfully!"),
+                                on_error=self.on_db_error, indicator=self.loading)
 
     def on_item_selected(self, event):
         """Handle the selection of a table item."""
-        selected_item = self.table.selection()
-        if selected_item:
-            client_id, name, phone, address = self.table.item(selected_item, 'values')
+        client = self.table.selected_values()
+        if client:
+            client_id, name, phone, address = client
             self.name.set(name)
-            self.phone.set(phone)
-            self.address.set(address)
+            self.phone.set(phone or "")
+            self.address.set(address or "")
 
     def clear_entries(self):
         """Clear the input fields."""
@@ -245,33 +306,92 @@ class ClientsTab(ttk.Frame):
 
     def next_page(self):
         """Navigate to the next page of clients."""
-        if (self.current_page + 1) * self.records_per_page < self.total_records:
-            self.current_page += 1
-            self.load_data()
+        if self.page_rows and self.next_button['state'] != 'disabled':
+            self.go_to_page(self.current_page + 1, after=self.row_key(self.page_rows[-1]),
+                            limit=self.records_per_page + 1)
 
     def prev_page(self):
         """Navigate to the previous page of clients."""
-        if self.current_page > 0:
-            self.current_page -= 1
-            self.load_data()
+        if self.current_page > 1 and self.page_rows:
+            self.go_to_page(self.current_page - 1, has_next=True, before=self.row_key(self.page_rows[0]),
+                            limit=self.records_per_page)
+        elif self.current_page > 0:
+            self.go_to_page(0, limit=self.records_per_page + 1)
+
+    def read_page_at(self, page, anchor):
+        """Return (anchor, rows) for a page, seeking its anchor first if it is not known."""
+        if page > 0 and anchor is None:
+            anchor = self.fetch_page_anchor(page)
+            if anchor is None:
+                return None, None
+        return anchor, self.fetch_clients(after=anchor, limit=self.records_per_page + 1)
+
+    def jump_to_page(self, event=None):
+        """Navigate to the page number typed in the page entry."""
+        try:
+            page = int(self.jump_var.get()) - 1
+        except ValueError:
+            messagebox.showerror("Error", "Enter a valid page number.")
+            return
+        if page < 0:
+            return
+
+        def show(result):
+            anchor, rows = result
+            if rows is None:
+                messagebox.showerror("Error", f"Page {page + 1} does not exist.")
+                return
+            self.page_anchors[page] = anchor
+            self.current_page = page
+            self.show_page(rows)
+
+        self.executor.read(self.read_page_at, page, self.page_anchors.get(page),
+                           on_done=show, on_error=self.on_db_error,
+                           key="clients.page", indicator=self.loading)
+
+    def sort_by(self, column):
+        """Order the pages by the given column and go back to the first page."""
+        self.sort_column = column
+        self.page_anchors = {0: None}
+        self.page_rows = []
+        self.current_page = 0
+        self.load_data()
+
+    def schedule_search(self, event=None):
+        """Debounce key presses: only the last one within SEARCH_DELAY_MS runs a search."""
+        if self.search_job is not None:
+            self.after_cancel(self.search_job)
+        self.search_job = self.after(SEARCH_DELAY_MS, self.search_client)
 
-    def search_client(self, event=None):
+    def query_clients(self, search_term):
+        """Return the clients matching the term, best matches first."""
+        return self.repos.clients.search(search_term)
+
+    def search_client(self):
         """Search for clients based on the input."""
-        search_term = self.search_var.get()
-        try:
-            with self.db.create_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT * FROM clients WHERE name LIKE ?', ('%' + search_term + '%',))
-                rows = cursor.fetchall()
-                self.table.delete(*self.table.get_children())
-                for index, client in enumerate(rows):
-                    tag = 'oddrow' if index % 2 == 0 else 'evenrow'
-                    self.table.insert("", "end", values=client, tags=(tag,))
-                self.total_records = len(rows)
-                self.current_page = 0
-                self.prev_button['state'] = 'disabled'
-                self.next_button['state'] = 'disabled'
-                self.page_info_label.config(text=f"Page 1 of 1 - Total Records: {self.total_records}")
-        except Exception as e:
-            logging.error(f"Failed to search clients: {e}")
-            messagebox.showerror("Error", f"Failed to search clients: {e}")
\ No newline at end of file
+        self.search_job = None
+        search_term = self.search_var.get().strip()
+        if search_term == self.last_search:
+            return
+        self.last_search = search_term
+        if not search_term:
+            self.load_data()
+            return
+        # Shares its key with paging, so a newer keystroke drops this result.
+        self.executor.read(self.query_clients, search_term,
+                           on_done=self.show_search_results, on_error=self.on_search_error,
+                           key="clients.page", indicator=self.loading)
+
+    def show_search_results(self, rows):
+        self.page_rows = []
+        # Keyed by client id, so only rows that changed are redrawn
+        self.table.set_rows([(client[0], *client) for client in rows])
+        self.total_records = len(rows)
+        self.current_page = 0
+        self.prev_button['state'] = 'disabled'
+        self.next_button['state'] = 'disabled'
+        self.page_info_label.config(text=f"Top {self.total_records} matches")
+
+    def on_search_error(self, error):
+        logging.error(f"Failed to search clients: {error}")
+        messagebox.showerror("Error", f"Failed to search clients: {error}")
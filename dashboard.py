@@ -1,71 +1,98 @@
-import os
 import ttkbootstrap as ttk
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from PIL import Image, ImageTk
+from assets import assets
+from metrics import MetricsSnapshot
+from rollup import empty_monthly_rollup
+
+# Monthly rollup column and legend label of each line in the service line chart
+SERVICE_LINES = [
+    ("new_clients", "Clients", "darkgreen"),
+    ("product_units", "Products", "steelblue"),
+    ("service_units", "Services", "gold"),
+    ("invoices", "Invoices", "crimson"),
+]
+
+# Image sizes on the dashboard, also the pre-scaled variants kept in the asset cache
+LOGO_SIZE = (250, 250)
+BANNER_SIZE = (600, 100)
+RIGHT_IMAGE_SIZE = (350, 250)
+
+# Full scale of the capacity meters
+MAX_CLIENTS = 100
+MAX_PRODUCTS = 200
 
 class DashboardTab(ttk.Frame):
-    def __init__(self, parent, db):
+    def __init__(self, parent, repos, executor):
         super().__init__(parent)
-        self.db = db
+        self.repos = repos
+        self.executor = executor
+        self.metrics = MetricsSnapshot()
+        self.monthly = empty_monthly_rollup()
+        self.chart_data = None  # Metrics and rollup the charts were last drawn with
         # Load logo and banner images from the project folder
         self.load_images()
         self.create_dashboard_tab()
 
-        # Bind the tab selection event to refresh metrics
-        parent.bind("<<NotebookTabChanged>>", self.on_tab_changed)
-        
-    def on_tab_changed(self, event):
-        # Refresh metrics when the tab is changed
-        self.load_dashboard_metrics()
-        self.update_charts()
+    def on_show(self):
+        # Refresh metrics whenever the tab is shown, then redraw the charts
+        self.load_dashboard_metrics(on_loaded=self.update_charts)
         
     def update_charts(self):
-        # Update the existing charts
-        self.create_service_bar_chart(self.bar_frame)
-        self.create_service_line_chart(self.line_frame)
-        self.create_service_gauge_meter(self.gauge_frame)
+        # Update the charts in place, and only when visible and the data changed
+        metrics = self.metrics
+        if not self.winfo_ismapped() or (metrics, self.monthly) == self.chart_data:
+            return
+        self.chart_data = (metrics, self.monthly)
+
+        for bar, value in zip(self.service_bars, self.service_bar_values(metrics)):
+            bar.set_height(value)
+        self.redraw(self.service_bar_canvas)
+
+        for bar in self.product_bars:
+            bar.set_height(metrics.products // 4)  # Example values
+        self.redraw(self.product_bar_canvas)
+
+        month_labels = self.month_labels()
+        for column, line in self.service_lines.items():
+            line.set_ydata(self.monthly[column])
+        self.service_line_canvas.figure.axes[0].set_xticks(range(len(month_labels)), month_labels)
+        self.redraw(self.service_line_canvas)
+
+        self.product_line.set_ydata(self.monthly["product_units"])
+        self.product_line_canvas.figure.axes[0].set_xticks(range(len(month_labels)), month_labels)
+        self.redraw(self.product_line_canvas)
+
+        self.meter.configure(amountused=min(metrics.clients, MAX_CLIENTS))
+        self.product_meter.configure(amountused=min(metrics.products, MAX_PRODUCTS))
+
+    def month_labels(self):
+        # 'YYYY-MM' -> 'MM/YY'
+        return [f"{month[5:]}/{month[2:4]}" for month in self.monthly["months"]]
+
+    def service_bar_values(self, metrics):
+        return [metrics.clients, metrics.products, metrics.services, metrics.invoices]
+
+    def redraw(self, canvas):
+        axes = canvas.figure.axes[0]
+        axes.relim()
+        axes.autoscale_view()
+        canvas.draw_idle()
+
+    def create_canvas(self, fig, parent):
+        canvas = FigureCanvasTkAgg(fig, master=parent)
+        canvas.draw()
+        canvas.get_tk_widget().pack(fill='both', expand=True)
+        return canvas
 
-        # Update the new charts
-        self.create_product_bar_chart(self.product_bar_frame)
-        self.create_product_line_chart(self.product_line_frame)
-        self.create_product_gauge_meter(self.product_gauge_frame)
-        
     def load_images(self):
-        # Get the absolute path to the project directory
-        project_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # Load logo
-        logo_path = os.path.join(project_dir, "img", "logo-slogan.png")
-        if os.path.exists(logo_path):
-            self.logo_image = Image.open(logo_path).resize((250, 250))  # Resize logo
-            self.logo_photo = ImageTk.PhotoImage(self.logo_image)
-        else:
-            print(f"Warning: Logo image not found at {logo_path}")
-            self.logo_photo = None  # Set to None if image is missing
-
-        # Load banner
-        banner_path = os.path.join(project_dir, "img", "banner.png")
-        if os.path.exists(banner_path):
-            self.banner_image = Image.open(banner_path).resize((800, 250))  # Resize banner
-            self.banner_photo = ImageTk.PhotoImage(self.banner_image)
-        else:
-            print(f"Warning: Banner image not found at {banner_path}")
-            self.banner_photo = None  # Set to None if image is missing
-            
-        # Load right-side image
-        right_image_path = os.path.join(project_dir, "img", "female_feethands.png")
-        print(f"Absolute right image path: {right_image_path}")
-        if os.path.exists(right_image_path):
-            self.right_image = Image.open(right_image_path).resize((350, 250))  # Resize right image
-            self.right_photo = ImageTk.PhotoImage(self.right_image)
-        else:
-            print(f"Warning: Right image not found at {right_image_path}")
-            self.right_photo = None  # Set to None if image is missing
+        # Pre-scaled, shared images; None when the file is missing
+        self.logo_photo = assets.photo("logo-slogan.png", LOGO_SIZE)
+        self.banner_photo = assets.photo("banner.png", BANNER_SIZE)
+        self.right_photo = assets.photo("female_feethands.png", RIGHT_IMAGE_SIZE)
 
     def create_dashboard_tab(self):
         # Create a main frame for the dashboard
-        self.load_images()
         dashboard_frame = ttk.Frame(self)
         dashboard_frame.pack(padx=10, pady=10, fill='both', expand=True)
         
@@ -73,21 +100,8 @@ class DashboardTab(ttk.Frame):
         banner_frame = ttk.Frame(dashboard_frame, padding=(10, 5), bootstyle="info")
         banner_frame.pack(fill='x')
 
-        # Load the image for the banner
-        image_path = os.path.join(os.path.dirname(__file__), 'img', 'banner.png')  # Update with your image path
-        banner_image = Image.open(image_path)
-
-        # Resize the image to fit the banner frame
-        banner_frame_width = 600  # Set the width of the banner frame
-        banner_frame_height = 100  # Set the height of the banner frame
-        banner_image = banner_image.resize((banner_frame_width, banner_frame_height), Image.LANCZOS)
-
-        # Create a PhotoImage object
-        banner_photo = ImageTk.PhotoImage(banner_image)
-
         # Add a label to the banner with the image
-        banner_label = ttk.Label(banner_frame, image=banner_photo)
-        banner_label.image = banner_photo  # Keep a reference to avoid garbage collection
+        banner_label = ttk.Label(banner_frame, image=self.banner_photo or "")
         banner_label.pack(fill='both', expand=True)  # Make the label fill the entire banner frame
 
         # Create a frame for metrics
@@ -99,9 +113,7 @@ class DashboardTab(ttk.Frame):
         self.create_metric_card(metrics_frame, "Total Products", "0", "info")
         self.create_metric_card(metrics_frame, "Total Services", "0", "warning")
         self.create_metric_card(metrics_frame, "Total Invoices", "0", "danger")
-
-        # Load metrics
-        self.load_dashboard_metrics()
+        self.create_metric_card(metrics_frame, "Total Revenue", "0.00", "primary")
 
         # Create a frame for charts
         charts_frame = ttk.LabelFrame(dashboard_frame, text="Gráficos de comportamientos", padding=(10, 10))
@@ -134,12 +146,10 @@ class DashboardTab(ttk.Frame):
         charts_frame.grid_columnconfigure(1, weight=1)
         charts_frame.grid_columnconfigure(2, weight=1)
 
-        # Initial creation of charts
+        # Create the charts once; later refreshes update them in place
         self.create_service_gauge_meter(self.gauge_frame)
         self.create_service_bar_chart(self.bar_frame)
         self.create_service_line_chart(self.line_frame)
-
-        # Initial creation of new product charts
         self.create_product_gauge_meter(self.product_gauge_frame)
         self.create_product_bar_chart(self.product_bar_frame)
         self.create_product_line_chart(self.product_line_frame)
@@ -165,52 +175,53 @@ class DashboardTab(ttk.Frame):
             self.total_services_label = value_label
         elif title == "Total Invoices":
             self.total_invoices_label = value_label
+        elif title == "Total Revenue":
+            self.total_revenue_label = value_label
+
+    def fetch_dashboard_data(self):
+        # Runs on a reader thread: two small reads, no scan of the invoices table
+        return self.repos.dashboard.metrics(), self.repos.dashboard.monthly()
+
+    def load_dashboard_metrics(self, on_loaded=None):
+        self.executor.read(self.fetch_dashboard_data,
+                           on_done=lambda data: self.show_dashboard_metrics(data, on_loaded),
+                           key="dashboard.metrics")
+
+    def show_dashboard_metrics(self, data, on_loaded=None):
+        metrics, self.monthly = data
+        self.metrics = metrics
+        self.total_clients_label.config(text=str(metrics.clients))
+        self.total_products_label.config(text=str(metrics.products))
+        self.total_services_label.config(text=str(metrics.services))
+        self.total_invoices_label.config(text=str(metrics.invoices))
+        self.total_revenue_label.config(text=f"{metrics.revenue:.2f}")
+        if on_loaded is not None:
+            on_loaded()
 
-    def load_dashboard_metrics(self):
-        total_clients = self.db.fetch_all("SELECT COUNT(*) FROM clients")[0][0]
-        self.total_clients_label.config(text=str(total_clients))
-
-        total_products = self.db.fetch_all("SELECT COUNT(*) FROM products")[0][0]
-        self.total_products_label.config(text=str(total_products))
-
-        total_services = self.db.fetch_all("SELECT COUNT(*) FROM services")[0][0]
-        self.total_services_label.config(text=str(total_services))
-
-        total_invoices = self.db.fetch_all("SELECT COUNT(*) FROM invoices")[0][0]
-        self.total_invoices_label.config(text=str(total_invoices))
-    
     def create_service_bar_chart(self, parent):
         categories = ['Clients', 'Products', 'Services', 'Invoices']
-        values = [int(self.total_clients_label.cget("text")),
-                  int(self.total_products_label.cget("text")),
-                  int(self.total_services_label.cget("text")),
-                  int(self.total_invoices_label.cget("text"))]
-        fig, ax = plt.subplots(figsize=(5, 4))
-        ax.bar(categories, values, color='teal')
+        values = self.service_bar_values(self.metrics)
+        fig = Figure(figsize=(5, 4))
+        ax = fig.add_subplot()
+        self.service_bars = ax.bar(categories, values, color='teal')
         ax.set_title('Service Income Distribution', fontsize=10, fontweight='bold')
         ax.set_ylabel('Count', fontsize=8)
         ax.set_xlabel('Categories', fontsize=8)
         ax.tick_params(axis='x', labelsize=7)
         ax.tick_params(axis='y', labelsize=7)
-        canvas = FigureCanvasTkAgg(fig, master=parent)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill='both', expand=True)
+        self.service_bar_canvas = self.create_canvas(fig, parent)
 
     def create_service_line_chart(self, parent):
-        # Define the x-axis labels (months)
-        x = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-        
-        # Example monthly data for each category (replace with actual data)
-        total_clients_monthly = [10, 20, 30, 40, 50, 60, 70, 80, 90, 100, 110, 120]
-        total_products_monthly = [5, 15, 25, 35, 45, 55, 65, 75, 85, 95, 105, 115]
-        total_services_monthly = [2, 12, 22, 32, 42, 52, 62, 72, 82, 92, 102, 112]
-        total_invoices_monthly = [1, 11, 21, 31, 41, 51, 61, 71, 81, 91, 101, 111]
-
-        fig, ax = plt.subplots(figsize=(5, 4))
-        ax.plot(x, total_clients_monthly, marker='o', color='darkgreen', linewidth=2, label='Clients')
-        ax.plot(x, total_products_monthly, marker='o', color='steelblue', linewidth=2, label='Products')
-        ax.plot(x, total_services_monthly, marker='o', color='gold', linewidth=2, label=' Services')
-        ax.plot(x, total_invoices_monthly, marker='o', color='crimson', linewidth=2, label='Invoices')
+        # Last twelve months from the rollup table
+        month_labels = self.month_labels()
+        x = range(len(month_labels))
+
+        fig = Figure(figsize=(5, 4))
+        ax = fig.add_subplot()
+        self.service_lines = {}
+        for column, label, color in SERVICE_LINES:
+            self.service_lines[column], = ax.plot(x, self.monthly[column], marker='o', color=color, linewidth=2, label=label)
+        ax.set_xticks(x, month_labels)
 
         ax.set_title('Income Over Time', fontsize=10, fontweight='bold')
         ax.set_ylabel('Count', fontsize=8)
@@ -218,14 +229,12 @@ class DashboardTab(ttk.Frame):
         ax.tick_params(axis='x', labelsize=7)
         ax.tick_params(axis='y', labelsize=7)
         ax.legend()  # Add a legend to differentiate the lines
-        canvas = FigureCanvasTkAgg(fig, master=parent)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill='both', expand=True)
+        self.service_line_canvas = self.create_canvas(fig, parent)
 
     def create_service_gauge_meter(self, parent):
         # Get the total number of clients
-        total_clients = int(self.total_clients_label.cget("text"))
-        max_clients = 100  # Define the maximum capacity for the meter
+        total_clients = self.metrics.clients
+        max_clients = MAX_CLIENTS  # Define the maximum capacity for the meter
 
         # Create the Meter widget and store it as an instance variable
         self.meter = ttk.Meter(
@@ -233,7 +242,7 @@ class DashboardTab(ttk.Frame):
             metersize=150,
             metertype='full',
             amounttotal=max_clients,
-            amountused=80, #total_clients,  # Use the total clients as the amount used
+            amountused=min(total_clients, max_clients),  # Use the total clients as the amount used
             subtext="Client Capacity",  # Subtext for the meter
             textright='%',
             bootstyle="info", 
@@ -244,37 +253,36 @@ class DashboardTab(ttk.Frame):
 
     def create_product_bar_chart(self, parent):
         categories = ['Product A', 'Product B', 'Product C', 'Product D']
-        values = [int(self.total_products_label.cget("text")) // 4] * 4  # Example values
-        fig, ax = plt.subplots(figsize=(5, 4))
-        ax.bar(categories, values, color='forestgreen')
+        values = [self.metrics.products // 4] * 4  # Example values
+        fig = Figure(figsize=(5, 4))
+        ax = fig.add_subplot()
+        self.product_bars = ax.bar(categories, values, color='forestgreen')
         ax.set_title('Product Distribution', fontsize=10, fontweight='bold')
         ax.set_ylabel('Count', fontsize=8)
         ax.set_xlabel('Products', fontsize=8)
         ax.tick_params(axis='x', labelsize=7)
         ax.tick_params(axis='y', labelsize=7)
-        canvas = FigureCanvasTkAgg(fig, master=parent)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill='both', expand=True)
+        self.product_bar_canvas = self.create_canvas(fig, parent)
 
     def create_product_line_chart(self, parent):
-        # Sample data for the product line chart
-        x = ['Q1', 'Q2', 'Q3', 'Q4']
-        y = [int(self.total_products_label.cget("text")) // 4] * 4  # Example values
-        fig, ax = plt.subplots(figsize=(5, 4))
-        ax.plot(x, y, marker='o', color='purple', linewidth=2)
-        ax.set_title('Product Sales Over Quarters', fontsize=10, fontweight='bold')
-        ax.set_ylabel('Count', fontsize=8)
-        ax.set_xlabel('Quarters', fontsize=8)
+        # Product units sold per month over the last twelve months
+        month_labels = self.month_labels()
+        x = range(len(month_labels))
+        fig = Figure(figsize=(5, 4))
+        ax = fig.add_subplot()
+        self.product_line, = ax.plot(x, self.monthly["product_units"], marker='o', color='purple', linewidth=2)
+        ax.set_xticks(x, month_labels)
+        ax.set_title('Product Sales Over Time', fontsize=10, fontweight='bold')
+        ax.set_ylabel('Units', fontsize=8)
+        ax.set_xlabel('Months', fontsize=8)
         ax.tick_params(axis='x', labelsize=7)
         ax.tick_params(axis='y', labelsize=7)
-        canvas = FigureCanvasTkAgg(fig, master=parent)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill='both', expand=True)
+        self.product_line_canvas = self.create_canvas(fig, parent)
 
     def create_product_gauge_meter(self, parent):
         # Get the total number of products
-        total_products = int(self.total_products_label.cget("text"))
-        max_products = 200  # Define the maximum capacity for the meter
+        total_products = self.metrics.products
+        max_products = MAX_PRODUCTS  # Define the maximum capacity for the meter
 
         # Create the Meter widget for products
         self.product_meter = ttk.Meter(
@@ -282,7 +290,7 @@ class DashboardTab(ttk.Frame):
             metersize=150,
             metertype='full',
             amounttotal=max_products,
-            amountused=60, #total_products,  # Use the total products as the amount used
+            amountused=min(total_products, max_products),  # Use the total products as the amount used
             subtext="Product Capacity",  # Subtext for the meter
             textright='%',
             bootstyle="success", 
@@ -0,0 +1,337 @@
+import os
+import time
+import queue
+import random
+import sqlite3
+import threading
+import logging
+from concurrent.futures import Future
+from contextlib import contextmanager
+from migrations import migrate
+from profiler import current_caller, calling_from
+
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "animalium.db")
+
+# Connection tuning applied to every connection the Database opens.
+PRAGMAS = {
+    "journal_mode": "WAL",      # readers never block the writer
+    "synchronous": "NORMAL",    # safe with WAL, avoids an fsync per commit
+    "cache_size": -32000,       # ~32 MB page cache per connection
+    "mmap_size": 268435456,     # 256 MB of memory-mapped reads
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",
+    "busy_timeout": 5000,       # ms to wait for another process's write lock
+}
+
+# Size of the per-connection compiled statement cache.
+STATEMENT_CACHE_SIZE = 256
+
+# Attempts at taking or committing the write lock once busy_timeout has run
+# out, waiting RETRY_BACKOFF seconds before the second, doubling after that.
+RETRY_ATTEMPTS = 6
+RETRY_BACKOFF = 0.05
+# Most queued writes applied in one transaction.
+WRITE_BATCH = 64
+
+
+def is_busy(error):
+    """True for the "database is locked" errors another writer causes."""
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return "locked" in str(error) or "busy" in str(error)
+
+
+# Statement execution without the profiling wrapper, for statements timed elsewhere.
+unprofiled_execute = sqlite3.Connection.execute
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor timing every statement while its Database has a profiler."""
+
+    def execute(self, query, params=()):
+        profiler = self.connection.profiler()
+        if profiler is None:
+            return super().execute(query, params)
+        started = time.perf_counter()
+        super().execute(query, params)
+        # A SELECT is timed up to its first row and read afterwards, so its row count is unknown
+        rows = None if self.description is not None else max(self.rowcount, 0)
+        profiler.record(self.connection, query, params, time.perf_counter() - started, rows)
+        return self
+
+    def executemany(self, query, seq_of_params):
+        profiler = self.connection.profiler()
+        if profiler is None:
+            return super().executemany(query, seq_of_params)
+        started = time.perf_counter()
+        super().executemany(query, seq_of_params)
+        # The plan only needs one set of parameters
+        sample = seq_of_params[0] if isinstance(seq_of_params, (list, tuple)) and seq_of_params else ()
+        profiler.record(self.connection, query, sample, time.perf_counter() - started, max(self.rowcount, 0))
+        return self
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection of a Database whose statements go through ProfiledCursor.
+
+    That covers every statement: fetch_*/execute_*, transaction() blocks,
+    and code that executes on db.connection() directly, pandas included.
+    """
+    database = None
+
+    def profiler(self):
+        return self.database.profiler if self.database is not None else None
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, query, params=()):
+        return self.cursor().execute(query, params)
+
+    def executemany(self, query, seq_of_params):
+        return self.cursor().executemany(query, seq_of_params)
+
+
+class WriteQueue:
+    """The single writer thread of a Database.
+
+    Writes are queued as callables and applied in order. Whatever is queued
+    when the writer gets to it, up to `max_batch` writes, runs in one
+    transaction, each write under its own savepoint: a write that raises is
+    rolled back on its own and only its caller sees the error.
+    """
+
+    def __init__(self, db, max_batch=WRITE_BATCH):
+        self.db = db
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.writes = 0
+
+    def submit(self, fn, args, kwargs, caller=None):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="db-writer", daemon=True)
+                self.thread.start()
+        future = Future()
+        self.queue.put((fn, args, kwargs, caller, future))
+        return future
+
+    def on_writer_thread(self):
+        return threading.current_thread() is self.thread
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while batch[-1] is not None and len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            self.apply([write for write in batch if write is not None])
+            if stop:
+                break
+
+    def apply(self, batch):
+        batch = [write for write in batch if write[4].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        outcomes = []
+        try:
+            with calling_from("db.WriteQueue.apply"), self.db.transaction() as conn:
+                for fn, args, kwargs, caller, future in batch:
+                    unprofiled_execute(conn, "SAVEPOINT queued_write")
+                    try:
+                        # Profiled statements are credited to whoever queued the write
+                        with calling_from(caller):
+                            result = fn(*args, **kwargs)
+                    except Exception as e:
+                        unprofiled_execute(conn, "ROLLBACK TO queued_write")
+                        outcomes.append((future, None, e))
+                    else:
+                        outcomes.append((future, result, None))
+                    unprofiled_execute(conn, "RELEASE queued_write")
+        except Exception as e:
+            # The lock could not be taken or the commit failed: none of the batch was written.
+            logging.error(f"Write batch of {len(batch)} failed: {e}")
+            for *_, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.writes += len(batch)
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def close(self):
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.queue.put(None)
+            thread.join()
+
+
+class Database:
+    """Long-lived SQLite access shared by every tab.
+
+    Each thread gets its own connection, opened on first use and kept until
+    close(). Writes go through transaction(), which also nests: an inner
+    transaction() joins the one already open on the same thread.
+
+    execute_query(), execute_many() and write() hand their work to a single
+    writer thread (see WriteQueue), so writers from any thread are applied
+    one after the other in batched transactions while readers carry on under
+    WAL. Other processes are waited for through busy_timeout, then retried
+    with exponential backoff.
+
+    Setting `profiler` to a profiler.QueryProfiler times every statement run
+    on the Database's connections (see ProfiledConnection); with None, the
+    default, nothing is measured.
+    """
+
+    def __init__(self, db_path=DB_PATH, pragmas=None, cached_statements=STATEMENT_CACHE_SIZE, profiler=None):
+        self.db_path = db_path
+        self.profiler = profiler
+        self.pragmas = dict(PRAGMAS, **(pragmas or {}))
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self.writes = WriteQueue(self)
+        self.schema_version = migrate(self)
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            isolation_level=None,  # transactions are managed by transaction()
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            timeout=int(self.pragmas["busy_timeout"]) / 1000,
+            factory=ProfiledConnection,
+        )
+        for pragma, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        conn.database = self  # Profiled from here on
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def connection(self):
+        """Return the calling thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Run the enclosed statements in a single write transaction."""
+        conn = self.connection()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        self._retry_busy(conn, "BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield conn
+            self._retry_busy(conn, "COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._local.depth = 0
+
+    def _retry_busy(self, conn, statement):
+        for attempt in range(RETRY_ATTEMPTS):
+            try:
+                conn.execute(statement)
+                return
+            except sqlite3.OperationalError as e:
+                if not is_busy(e) or attempt == RETRY_ATTEMPTS - 1:
+                    raise
+                delay = RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5)
+                logging.warning(f"{statement} found the database locked, retrying in {delay * 1000:.0f} ms")
+                time.sleep(delay)
+
+    def submit_write(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) for the writer thread and return its Future.
+
+        fn runs inside the writer's transaction, so its own transaction()
+        blocks and execute_query() calls join that transaction.
+        """
+        if self.writes.on_writer_thread() or getattr(self._local, "depth", 0):
+            # Already writing on this thread: run in place rather than wait on ourselves
+            future = Future()
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        caller = current_caller() if self.profiler is not None else None
+        return self.writes.submit(fn, args, kwargs, caller)
+
+    def write(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the writer thread and return its result."""
+        return self.submit_write(fn, *args, **kwargs).result()
+
+    def fetch_all(self, query, params=()):
+        conn = self.connection()
+        profiler = self.profiler
+        if profiler is None:
+            return unprofiled_execute(conn, query, params).fetchall()
+        # Timed here together with the fetch, so the cursor does not time it again
+        started = time.perf_counter()
+        rows = unprofiled_execute(conn, query, params).fetchall()
+        profiler.record(conn, query, params, time.perf_counter() - started, len(rows))
+        return rows
+
+    def fetch_one(self, query, params=()):
+        conn = self.connection()
+        profiler = self.profiler
+        if profiler is None:
+            return unprofiled_execute(conn, query, params).fetchone()
+        started = time.perf_counter()
+        row = unprofiled_execute(conn, query, params).fetchone()
+        profiler.record(conn, query, params, time.perf_counter() - started, int(row is not None))
+        return row
+
+    def execute_query(self, query, params=()):
+        return self.write(self._execute_query, query, params)
+
+    def execute_many(self, query, seq_of_params):
+        return self.write(self._execute_many, query, seq_of_params)
+
+    def _execute_query(self, query, params):
+        with self.transaction() as conn:
+            return conn.execute(query, params)
+
+    def _execute_many(self, query, seq_of_params):
+        with self.transaction() as conn:
+            return conn.executemany(query, seq_of_params)
+
+    def close(self):
+        """Finish the queued writes, then close every connection opened by this Database."""
+        self.writes.close()
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logging.error(f"Failed to close database connection: {e}")
+        self._local = threading.local()
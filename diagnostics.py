@@ -0,0 +1,106 @@
+import logging
+import ttkbootstrap as ttk
+from tkinter import messagebox, filedialog
+from widgets import BoundTreeview
+from profiler import QueryProfiler, format_rows
+
+# Statements listed in the top queries table.
+TOP_QUERIES = 50
+# How often the open window re-reads the stats, in milliseconds.
+REFRESH_MS = 2000
+
+
+class DiagnosticsWindow(ttk.Toplevel):
+    """Hidden query profiler panel, opened with Ctrl+Shift+D.
+
+    Lists the statements that took the most total time, with the tab method
+    that ran them, and the slow queries of this run with their plans.
+    Profiling can be switched on here if the app was not started with it.
+    """
+
+    def __init__(self, parent, db):
+        super().__init__(parent)
+        self.title("Diagnostics")
+        self.db = db
+        self.refresh_job = None
+
+        toolbar = ttk.Frame(self)
+        toolbar.pack(fill="x", padx=10, pady=5)
+        self.toggle_button = ttk.Button(toolbar, command=self.toggle_profiling)
+        self.toggle_button.pack(side="left", padx=2)
+        ttk.Button(toolbar, text="Reset", command=self.reset).pack(side="left", padx=2)
+        ttk.Button(toolbar, text="Export JSON", command=self.export).pack(side="left", padx=2)
+        self.status_label = ttk.Label(toolbar, text="")
+        self.status_label.pack(side="left", padx=10)
+
+        columns = ("Caller", "Calls", "Total ms", "Mean ms", "p95 ms", "Max ms", "Rows", "Query")
+        self.queries_tree = BoundTreeview(self, columns=columns, height=15)
+        for column in columns:
+            self.queries_tree.heading(column, text=column)
+            self.queries_tree.column(column, width=70, anchor="e")
+        self.queries_tree.column("Caller", width=220, anchor="w")
+        self.queries_tree.column("Query", width=500, anchor="w")
+        self.queries_tree.pack(fill="both", expand=True, padx=10, pady=5)
+
+        ttk.Label(self, text="Slow queries").pack(anchor="w", padx=10)
+        slow_columns = ("At", "Caller", "ms", "Plan", "Query")
+        self.slow_tree = BoundTreeview(self, columns=slow_columns, height=8)
+        for column in slow_columns:
+            self.slow_tree.heading(column, text=column)
+            self.slow_tree.column(column, width=120, anchor="w")
+        self.slow_tree.column("ms", width=70, anchor="e")
+        self.slow_tree.column("Plan", width=300)
+        self.slow_tree.column("Query", width=400)
+        self.slow_tree.pack(fill="both", expand=True, padx=10, pady=5)
+
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.refresh()
+
+    def refresh(self):
+        profiler = self.db.profiler
+        self.toggle_button.configure(text="Stop Profiling" if profiler else "Start Profiling")
+        if profiler is None:
+            self.status_label.configure(text="Profiling is off")
+            self.queries_tree.set_rows([])
+            self.slow_tree.set_rows([])
+        else:
+            stats = profiler.to_dict()
+            self.status_label.configure(
+                text=f"{len(stats['queries'])} statements over {stats['seconds']:.0f} s, "
+                     f"slow above {stats['slow_ms']} ms")
+            self.queries_tree.set_rows([
+                (hash((row["caller"], row["query"])), row["caller"], row["calls"], f"{row['total_ms']:.1f}",
+                 f"{row['mean_ms']:.2f}", row["p95_ms"], f"{row['max_ms']:.1f}", format_rows(row["rows"]), row["query"])
+                for row in stats["queries"][:TOP_QUERIES]])
+            self.slow_tree.set_rows([
+                (index, entry["at"], entry["caller"], f"{entry['ms']:.1f}", "; ".join(entry["plan"]), entry["query"])
+                for index, entry in reversed(list(enumerate(stats["slow"])))])
+        self.refresh_job = self.after(REFRESH_MS, self.refresh)
+
+    def toggle_profiling(self):
+        self.db.profiler = None if self.db.profiler else QueryProfiler()
+        logging.info(f"Query profiling {'enabled' if self.db.profiler else 'disabled'}")
+        self.after_cancel(self.refresh_job)
+        self.refresh()
+
+    def reset(self):
+        if self.db.profiler:
+            self.db.profiler.reset()
+
+    def export(self):
+        if self.db.profiler is None:
+            messagebox.showerror("Error", "Profiling is off.", parent=self)
+            return
+        path = filedialog.asksaveasfilename(parent=self, defaultextension=".json",
+                                            filetypes=[("JSON", "*.json")])
+        if not path:
+            return
+        try:
+            self.db.profiler.export_json(path)
+        except OSError as e:
+            logging.error(f"Failed to export query stats: {e}")
+            messagebox.showerror("Error", f"Failed to export query stats: {e}", parent=self)
+
+    def on_close(self):
+        self.after_cancel(self.refresh_job)
+        self.destroy()
@@ -0,0 +1,114 @@
+import queue
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from profiler import caller_tag, calling_from
+
+# Worker threads for read queries; WAL lets them run alongside the writer.
+READ_WORKERS = 4
+# How often the Tk thread picks up finished work, in milliseconds.
+POLL_INTERVAL_MS = 15
+
+
+def run_as(caller, fn, args):
+    with calling_from(caller):
+        return fn(*args)
+
+
+class QueryExecutor:
+    """Runs database work off the Tk thread.
+
+    Reads go to a small thread pool. Writes are queued straight on the
+    writer thread of `db` (see db.WriteQueue), which applies them in order;
+    without a local database, as with an API server, they run on the reader
+    pool instead. Finished work is queued and handed back to its callbacks on the Tk thread
+    by an after() loop, so callbacks can touch widgets freely. Requests that
+    share a `key` supersede each other: only the newest one reports back.
+    Work is credited to the tab method that submitted it in the query
+    profiler.
+    """
+
+    def __init__(self, root, db=None, read_workers=READ_WORKERS, poll_interval=POLL_INTERVAL_MS):
+        self.root = root
+        self.db = db
+        self.poll_interval = poll_interval
+        self.readers = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="db-read")
+        self.results = queue.Queue()
+        self.generations = {}  # Key -> generation of its newest request
+        self.pending = {}  # Key -> future of its newest request
+        self.poll_job = self.root.after(self.poll_interval, self.poll)
+
+    def read(self, fn, *args, on_done=None, on_error=None, key=None, indicator=None):
+        """Run fn(*args) on a reader thread."""
+        # The worker's own stack would only show the repository it calls
+        return self.submit(lambda: self.readers.submit(run_as, caller_tag(), fn, args),
+                           on_done, on_error, key, indicator)
+
+    def write(self, fn, *args, on_done=None, on_error=None, key=None, indicator=None):
+        """Run fn(*args) as one write on the database's writer thread; writes run one at a time, in order."""
+        if self.db is None:
+            return self.read(fn, *args, on_done=on_done, on_error=on_error, key=key, indicator=indicator)
+        # submit_write takes the caller tag on this thread itself
+        return self.submit(lambda: self.db.submit_write(fn, *args), on_done, on_error, key, indicator)
+
+    def submit(self, start, on_done, on_error, key, indicator):
+        generation = None
+        if key is not None:
+            generation = self.generations.get(key, 0) + 1
+            self.generations[key] = generation
+            previous = self.pending.pop(key, None)
+            if previous is not None:
+                previous.cancel()  # Only succeeds if it has not started yet
+        if indicator is not None:
+            indicator.start()
+        future = start()
+        if key is not None:
+            self.pending[key] = future
+        future.add_done_callback(
+            lambda done: self.results.put((done, key, generation, on_done, on_error, indicator)))
+        return future
+
+    def cancel(self, key):
+        """Drop the pending request for `key` so its callbacks never run."""
+        self.generations[key] = self.generations.get(key, 0) + 1
+        future = self.pending.pop(key, None)
+        if future is not None:
+            future.cancel()
+
+    def post(self, callback, *args):
+        """Run callback(*args) on the Tk thread; safe to call from any thread."""
+        self.results.put((None, None, None, lambda _: callback(*args), None, None))
+
+    def poll(self):
+        while True:
+            try:
+                future, key, generation, on_done, on_error, indicator = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if indicator is not None:
+                indicator.stop()
+            if key is not None:
+                if self.generations.get(key) != generation:
+                    continue  # Superseded by a newer request
+                self.pending.pop(key, None)
+            if future is None:
+                on_done(None)
+                continue
+            if future.cancelled():
+                continue
+            error = future.exception()
+            try:
+                if error is not None:
+                    if on_error is None:
+                        logging.error(f"Background database task failed: {error}")
+                    else:
+                        on_error(error)
+                elif on_done is not None:
+                    on_done(future.result())
+            except Exception as e:
+                logging.exception(f"Background task callback failed: {e}")
+        self.poll_job = self.root.after(self.poll_interval, self.poll)
+
+    def shutdown(self):
+        self.root.after_cancel(self.poll_job)
+        # Queued writes are finished by Database.close()
+        self.readers.shutdown(wait=False, cancel_futures=True)
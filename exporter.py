@@ -0,0 +1,111 @@
+import csv
+import gzip
+import json
+import time
+import logging
+from reports import report_query, parse_day
+
+# Rows pulled from the cursor at a time; the only rows held in memory.
+FETCH_SIZE = 2000
+
+INVOICE_HEADER = ("invoice_id", "date", "client_id", "client_name", "total_amount")
+INCOME_HEADER = ("period", "client_id", "client_name", "invoices", "revenue")
+
+# File dialog filter for the export buttons.
+FILE_TYPES = [("CSV", "*.csv"), ("JSON Lines", "*.jsonl"),
+              ("Compressed CSV", "*.csv.gz"), ("Compressed JSON Lines", "*.jsonl.gz")]
+
+
+def stream_rows(db, query, params=(), size=FETCH_SIZE):
+    """Yield the rows of a query, fetching `size` rows at a time from one cursor."""
+    cursor = db.connection().execute(query, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+
+
+def open_output(path, compress=None):
+    """Open `path` for text writing, gzipped if asked or if it ends in .gz."""
+    if compress is None:
+        compress = path.lower().endswith(".gz")
+    if compress:
+        return gzip.open(path, "wt", newline="", encoding="utf-8")
+    return open(path, "w", newline="", encoding="utf-8")
+
+
+def output_format(path):
+    name = path.lower().removesuffix(".gz")
+    return "jsonl" if name.endswith((".jsonl", ".json")) else "csv"
+
+
+def write_rows(rows, header, path, compress=None):
+    """Write rows to a CSV or JSON Lines file as they arrive; returns how many were written."""
+    count = 0
+    with open_output(path, compress) as handle:
+        if output_format(path) == "jsonl":
+            for row in rows:
+                handle.write(json.dumps(dict(zip(header, row)), ensure_ascii=False))
+                handle.write("\n")
+                count += 1
+        else:
+            writer = csv.writer(handle)
+            writer.writerow(header)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+    return count
+
+
+def export_invoices(db, path, start=None, end=None, compress=None):
+    """Export invoices with their client names, oldest first, optionally limited to a date range."""
+    conditions, params = [], []
+    if start:
+        conditions.append("invoices.date >= ?")
+        params.append(parse_day(start))
+    if end:
+        conditions.append("invoices.date <= ?")
+        params.append(parse_day(end))
+    query = f'''
+        SELECT invoices.id, invoices.date, invoices.client_id, clients.name, invoices.total_amount
+        FROM invoices LEFT JOIN clients ON clients.id = invoices.client_id
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        ORDER BY invoices.id
+    '''
+    return timed_export("invoices", path, stream_rows(db, query, params), INVOICE_HEADER, compress)
+
+
+def export_income(db, path, start, end, grouping="client_month", compress=None):
+    """Export an income report, as shown on the Ingresos tab, for a date range."""
+    rows = stream_rows(db, report_query(grouping), (parse_day(start), parse_day(end)))
+    return timed_export(f"income by {grouping}", path, rows, INCOME_HEADER, compress)
+
+
+def timed_export(label, path, rows, header, compress):
+    started = time.perf_counter()
+    count = write_rows(rows, header, path, compress)
+    logging.info(f"Exported {count} {label} rows to {path} in {time.perf_counter() - started:.2f} s")
+    return count
+
+
+if __name__ == "__main__":
+    import sys
+    from db import Database, DB_PATH
+
+    usage = "usage: python exporter.py invoices FILE [START END] | income FILE START END [GROUPING]"
+    if len(sys.argv) < 3 or sys.argv[1] not in ("invoices", "income"):
+        sys.exit(usage)
+    kind, path, extra = sys.argv[1], sys.argv[2], sys.argv[3:]
+    db = Database(DB_PATH)
+    if kind == "invoices":
+        count = export_invoices(db, path, *extra[:2])
+    elif len(extra) < 2:
+        sys.exit(usage)
+    else:
+        count = export_income(db, path, *extra[:3])
+    print(f"{count} rows written to {path}")
+    db.close()
@@ -0,0 +1,238 @@
+import time
+import datetime
+import logging
+from dataclasses import dataclass
+import numpy as np
+
+# (column, label, unit) of each analyte of a complete blood count, in display order.
+ANALYTES = (
+    ("rbc", "RBC", "x10^12/L"),
+    ("hgb", "HGB", "g/dL"),
+    ("hct", "HCT", "%"),
+    ("mcv", "MCV", "fL"),
+    ("mch", "MCH", "pg"),
+    ("mchc", "MCHC", "g/dL"),
+    ("wbc", "WBC", "x10^9/L"),
+    ("neutrophils", "NEU", "x10^9/L"),
+    ("lymphocytes", "LYM", "x10^9/L"),
+    ("monocytes", "MONO", "x10^9/L"),
+    ("eosinophils", "EOS", "x10^9/L"),
+    ("basophils", "BASO", "x10^9/L"),
+    ("plt", "PLT", "x10^9/L"),
+)
+ANALYTE_COLUMNS = tuple(column for column, _, _ in ANALYTES)
+
+# How sample times are stored, so they sort and compare as text.
+SAMPLED_AT_FORMAT = "%Y-%m-%d %H:%M"
+
+# Results averaged by the rolling statistics of a trend.
+ROLLING_WINDOW = 5
+
+# Panels sampled in a [start, end) time range with their patient.
+PANELS_QUERY = f'''
+    SELECT p.id, p.sampled_at, patients.name, patients.species, {", ".join("p." + c for c in ANALYTE_COLUMNS)}
+    FROM hematology_panels AS p JOIN patients ON patients.id = p.patient_id
+    WHERE p.sampled_at >= ? AND p.sampled_at < ?
+    ORDER BY p.sampled_at, p.id
+'''
+# One analyte of a patient between two times.
+SERIES_QUERY = '''
+    SELECT sampled_at, value FROM lab_results
+    WHERE patient_id = ? AND analyte = ? AND sampled_at BETWEEN ? AND ?
+    ORDER BY sampled_at
+'''
+# Every analyte of a patient, grouped by analyte.
+PATIENT_SERIES_QUERY = '''
+    SELECT analyte, sampled_at, value FROM lab_results
+    WHERE patient_id = ? ORDER BY analyte, sampled_at
+'''
+
+# Flag codes, ordered by severity.
+NOT_MEASURED, NORMAL, LOW, HIGH, CRITICAL_LOW, CRITICAL_HIGH = -1, 0, 1, 2, 3, 4
+FLAG_LABELS = {NOT_MEASURED: "", NORMAL: "", LOW: "L", HIGH: "H", CRITICAL_LOW: "LL", CRITICAL_HIGH: "HH"}
+
+
+class ReferenceRanges:
+    """Species reference ranges as (species, analyte) arrays, NaN where there is no limit."""
+
+    def __init__(self, rows):
+        self.species = sorted({row[0] for row in rows})
+        self.index = {species: i for i, species in enumerate(self.species)}
+        # One extra all-NaN row for species without ranges, so nothing gets flagged.
+        shape = (len(self.species) + 1, len(ANALYTES))
+        self.low, self.high, self.critical_low, self.critical_high = (np.full(shape, np.nan) for _ in range(4))
+        position = {column: i for i, column in enumerate(ANALYTE_COLUMNS)}
+        for species, analyte, low, high, critical_low, critical_high in rows:
+            if analyte in position:
+                at = self.index[species], position[analyte]
+                for array, value in ((self.low, low), (self.high, high),
+                                     (self.critical_low, critical_low), (self.critical_high, critical_high)):
+                    array[at] = np.nan if value is None else value
+
+    @classmethod
+    def load(cls, db):
+        return cls(db.fetch_all(
+            "SELECT species, analyte, low, high, critical_low, critical_high FROM reference_ranges"))
+
+    def codes(self, species):
+        """Row index into the range arrays for each species name."""
+        unknown = len(self.species)
+        return np.array([self.index.get(name, unknown) for name in species], dtype=np.intp)
+
+    def flag(self, values, species):
+        """Flag an (n panels, n analytes) array of results for the given species, one per panel."""
+        codes = self.codes(species)
+        return flag_values(values, self.low[codes], self.high[codes],
+                           self.critical_low[codes], self.critical_high[codes])
+
+
+def flag_values(values, low, high, critical_low, critical_high):
+    """Classify every result at once against bounds of the same shape.
+
+    Comparisons against a NaN bound are false, so a missing limit never
+    flags. Critical limits take precedence over the normal range.
+    """
+    flags = np.select(
+        [values < critical_low, values > critical_high, values < low, values > high],
+        [CRITICAL_LOW, CRITICAL_HIGH, LOW, HIGH],
+        NORMAL,
+    ).astype(np.int8)
+    flags[np.isnan(values)] = NOT_MEASURED
+    return flags
+
+
+@dataclass
+class PanelBatch:
+    """Panels as parallel arrays: values and flags are (panels, analytes)."""
+    ids: list
+    sampled_at: list
+    patients: list
+    species: list
+    values: np.ndarray
+    flags: np.ndarray
+
+    def worst_flags(self):
+        """The most severe flag of each panel."""
+        return self.flags.max(axis=1, initial=NOT_MEASURED)
+
+
+def load_panels(db, day, ranges=None):
+    """Load and flag every panel sampled on `day` ('YYYY-MM-DD')."""
+    start = datetime.date.fromisoformat(day)
+    rows = db.fetch_all(PANELS_QUERY, (start.isoformat(), (start + datetime.timedelta(days=1)).isoformat()))
+    return classify(rows, ranges or ReferenceRanges.load(db))
+
+
+def classify(rows, ranges):
+    """Build a flagged PanelBatch from (id, sampled_at, patient, species, *analytes) rows."""
+    values = np.array([row[4:] for row in rows], dtype=float).reshape(len(rows), len(ANALYTES))
+    species = [row[3] for row in rows]
+    started = time.perf_counter()
+    flags = ranges.flag(values, species)
+    logging.info(f"Flagged {len(rows)} panels in {(time.perf_counter() - started) * 1000:.2f} ms")
+    return PanelBatch(
+        ids=[row[0] for row in rows],
+        sampled_at=[row[1] for row in rows],
+        patients=[row[2] for row in rows],
+        species=species,
+        values=values,
+        flags=flags,
+    )
+
+
+def add_patient(db, client_id, name, species):
+    """Register a patient and return its id."""
+    return db.execute_query(
+        "INSERT INTO patients (client_id, name, species) VALUES (?, ?, ?)",
+        (client_id or None, name, species.strip().lower())).lastrowid
+
+
+def parse_sampled_at(value):
+    """Normalize a typed sample time to SAMPLED_AT_FORMAT, raising ValueError if it is not one."""
+    try:
+        return datetime.datetime.strptime(value.strip(), SAMPLED_AT_FORMAT).strftime(SAMPLED_AT_FORMAT)
+    except ValueError:
+        raise ValueError(f"Sample time must be YYYY-MM-DD HH:MM, got {value!r}")
+
+
+def add_panel(db, patient_id, sampled_at, results):
+    """Store a panel from {analyte column: value}; analytes left out are not measured."""
+    unknown = set(results) - set(ANALYTE_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown analytes: {', '.join(sorted(unknown))}")
+    sampled_at = parse_sampled_at(sampled_at)
+    columns = ("patient_id", "sampled_at") + tuple(results)
+    return db.execute_query(
+        f"INSERT INTO hematology_panels ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        (patient_id, sampled_at, *results.values())).lastrowid
+
+
+@dataclass
+class AnalyteSeries:
+    """One patient's results for one analyte, oldest first."""
+    analyte: str
+    sampled_at: np.ndarray  # datetime64[m]
+    values: np.ndarray
+
+    def rolling(self, window=ROLLING_WINDOW):
+        """(mean, std) of the last `window` results at each point; NaN until the window fills."""
+        return rolling_stats(self.values, window)
+
+    def delta_from_baseline(self, baseline=None):
+        """Change of every result from the baseline, by default the first result."""
+        if not len(self.values):
+            return self.values.copy()
+        return self.values - (self.values[0] if baseline is None else baseline)
+
+
+def rolling_stats(values, window=ROLLING_WINDOW):
+    mean = np.full(len(values), np.nan)
+    std = np.full(len(values), np.nan)
+    if len(values) >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(values, window)
+        mean[window - 1:] = windows.mean(axis=1)
+        std[window - 1:] = windows.std(axis=1)
+    return mean, std
+
+
+def series_from_columns(analyte, sampled_at, values):
+    return AnalyteSeries(
+        analyte=analyte,
+        sampled_at=np.array(sampled_at, dtype="datetime64[m]"),
+        values=np.array(values, dtype=float),
+    )
+
+
+def load_series(db, patient_id, analyte, start="", end="9999"):
+    """One analyte of a patient between two times, read as one primary key range."""
+    rows = db.fetch_all(SERIES_QUERY, (patient_id, analyte, start, end))
+    sampled_at, values = zip(*rows) if rows else ((), ())
+    return series_from_columns(analyte, sampled_at, values)
+
+
+def load_patient_series(db, patient_id):
+    """Every analyte of a patient as {analyte: AnalyteSeries}, read in a single range scan."""
+    rows = db.fetch_all(PATIENT_SERIES_QUERY, (patient_id,))
+    if not rows:
+        return {}
+    analytes, sampled_at, values = zip(*rows)
+    # Parse every time in one call; per-analyte series are views into these arrays.
+    sampled_at = np.array(sampled_at, dtype="datetime64[m]")
+    values = np.array(values, dtype=float)
+    # Rows come grouped by analyte; split the arrays where the analyte changes.
+    starts = [0] + [i for i in range(1, len(analytes)) if analytes[i] != analytes[i - 1]] + [len(analytes)]
+    return {analytes[start]: AnalyteSeries(analytes[start], sampled_at[start:stop], values[start:stop])
+            for start, stop in zip(starts, starts[1:])}
+
+
+def load_patient(db, patient_id):
+    """(name, species) of a patient, or None."""
+    return db.fetch_one("SELECT name, species FROM patients WHERE id = ?", (patient_id,))
+
+
+def load_trend(db, patient_id, analyte):
+    """((name, species), AnalyteSeries) for a patient's trend chart; raises ValueError for unknown patients."""
+    patient = load_patient(db, patient_id)
+    if patient is None:
+        raise ValueError(f"Patient {patient_id} not found")
+    return patient, load_series(db, patient_id, analyte)
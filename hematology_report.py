@@ -1,81 +1,250 @@
 import ttkbootstrap as ttk
 from tkinter import messagebox
+import logging
+import datetime
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.dates import date2num
+from widgets import BoundTreeview, LoadingIndicator
+from hematology import (ANALYTES, ANALYTE_COLUMNS, FLAG_LABELS, CRITICAL_LOW, LOW, ReferenceRanges,
+                        SAMPLED_AT_FORMAT, load_panels, add_patient, add_panel, load_trend, parse_sampled_at)
+
+# Analyte entries per row of the panel form
+FORM_COLUMNS = 3
 
 class HematReportTab(ttk.Frame):
-    def __init__(self, parent, db):
+    def __init__(self, parent, repos, executor):
         super().__init__(parent)
-        self.db = db
-        self.create_invoices_tab()
-
-    def create_invoices_tab(self):
-        invoice_form_frame = ttk.LabelFrame(self, text="Invoice Information")
-        invoice_form_frame.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
-
-        ttk.Label(invoice_form_frame, text="Client ID:").grid(row=0, column=0)
-        self.invoice_client_id_entry = ttk.Entry(invoice_form_frame)
-        self.invoice_client_id_entry.grid(row=0, column=1)
-
-        ttk.Label(invoice_form_frame, text="Total Amount:").grid(row=1, column=0)
-        self.invoice_total_entry = ttk.Entry(invoice_form_frame)
-        self.invoice_total_entry.grid(row=1, column=1)
-
-        self.add_invoice_button = ttk.Button(invoice_form_frame, text="Create Invoice", command=self.add_invoice)
-        self.add_invoice_button.grid(row=2, column=0, columnspan=2)
-
-        invoice_table_frame = ttk.LabelFrame(self, text="Invoice List")
-        invoice_table_frame.grid(row=0, column=1, padx=10, pady=10, sticky="nsew")
-
-        self.invoice_listbox = ttk.Treeview(invoice_table_frame, columns=("Client", "Total Amount", "Date"), show="headings")
-        self.invoice_listbox.grid(row=0, column=0)
-        self.invoice_listbox.heading("Client", text="Client")
-        self.invoice_listbox.heading("Total Amount", text="Total Amount")
-        self.invoice_listbox.heading("Date", text="Date")
-        self.load_invoices()
-
-        self.edit_invoice_button = ttk.Button(invoice_table_frame, text="Edit Invoice", command=self.edit_invoice)
-        self.edit_invoice_button.grid(row=1, column=0, sticky="ew")
-
-        self.delete_invoice_button = ttk.Button(invoice_table_frame, text="Delete Invoice", command=self.delete_invoice)
-        self.delete_invoice_button.grid(row=2, column=0, sticky="ew")
-
-    def load_invoices(self):
-        for row in self.invoice_listbox.get_children():
-            self.invoice_listbox.delete(row)
-        invoices = self.db.fetch_all("SELECT invoices.id, clients.name, invoices.total_amount, invoices.date FROM invoices JOIN clients ON invoices.client_id = clients.id")
-        for invoice in invoices:
-            self.invoice_listbox.insert("", "end", values=(invoice[1], invoice[2], invoice[3]))
-
-    def add_invoice(self):
-        client_id = self.invoice_client_id_entry.get()
-        total_amount = self.invoice_total_entry.get()
-        if not client_id or not total_amount:
-            messagebox.showerror("Error", "Client ID and total amount are required.")
+        # Works on the local database only; the tab is not offered when using the API server
+        self.db = repos.db
+        self.executor = executor
+        self.ranges = None  # ReferenceRanges, loaded once
+        self.analyte_entries = {}
+        self.create_hematology_tab()
+        self.executor.read(ReferenceRanges.load, self.db, on_done=self.set_ranges, on_error=self.on_db_error)
+
+    def create_hematology_tab(self):
+        patient_frame = ttk.LabelFrame(self, text="Patient")
+        patient_frame.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
+
+        ttk.Label(patient_frame, text="Client ID:").grid(row=0, column=0)
+        self.patient_client_entry = ttk.Entry(patient_frame)
+        self.patient_client_entry.grid(row=0, column=1)
+
+        ttk.Label(patient_frame, text="Name:").grid(row=1, column=0)
+        self.patient_name_entry = ttk.Entry(patient_frame)
+        self.patient_name_entry.grid(row=1, column=1)
+
+        ttk.Label(patient_frame, text="Species:").grid(row=2, column=0)
+        self.species_combobox = ttk.Combobox(patient_frame)
+        self.species_combobox.grid(row=2, column=1)
+
+        self.add_patient_button = ttk.Button(patient_frame, text="Add Patient", command=self.add_patient)
+        self.add_patient_button.grid(row=3, column=0, columnspan=2, pady=5)
+
+        panel_frame = ttk.LabelFrame(self, text="Hematology Panel")
+        panel_frame.grid(row=1, column=0, padx=10, pady=10, sticky="nsew")
+
+        ttk.Label(panel_frame, text="Patient ID:").grid(row=0, column=0)
+        self.panel_patient_entry = ttk.Entry(panel_frame, width=10)
+        self.panel_patient_entry.grid(row=0, column=1)
+
+        ttk.Label(panel_frame, text="Sampled at:").grid(row=0, column=2)
+        self.sampled_at_entry = ttk.Entry(panel_frame, width=16)
+        self.sampled_at_entry.grid(row=0, column=3)
+
+        for index, (column, label, unit) in enumerate(ANALYTES):
+            row, col = 1 + index // FORM_COLUMNS, (index % FORM_COLUMNS) * 2
+            ttk.Label(panel_frame, text=f"{label} ({unit}):").grid(row=row, column=col, sticky="e")
+            entry = ttk.Entry(panel_frame, width=10)
+            entry.grid(row=row, column=col + 1, padx=2, pady=2)
+            self.analyte_entries[column] = entry
+
+        self.add_panel_button = ttk.Button(panel_frame, text="Save Panel", command=self.add_panel)
+        self.add_panel_button.grid(row=2 + len(ANALYTES) // FORM_COLUMNS, column=0, columnspan=FORM_COLUMNS * 2, pady=5)
+
+        results_frame = ttk.LabelFrame(self, text="Daily Run")
+        results_frame.grid(row=0, column=1, rowspan=2, padx=10, pady=10, sticky="nsew")
+
+        ttk.Label(results_frame, text="Date:").grid(row=0, column=0)
+        self.run_date_entry = ttk.Entry(results_frame)
+        self.run_date_entry.insert(0, datetime.date.today().isoformat())
+        self.run_date_entry.grid(row=0, column=1)
+
+        self.load_run_button = ttk.Button(results_frame, text="Load Results", command=self.load_run)
+        self.load_run_button.grid(row=0, column=2, padx=5)
+
+        self.loading = LoadingIndicator(results_frame)
+        self.loading.grid(row=0, column=3, padx=5)
+
+        columns = ("Time", "Patient", "Species") + tuple(label for _, label, _ in ANALYTES)
+        self.results_tree = BoundTreeview(results_frame, columns=columns, height=20)
+        for column in columns:
+            self.results_tree.heading(column, text=column)
+            self.results_tree.column(column, width=60, anchor="e")
+        self.results_tree.column("Patient", width=100, anchor="w")
+        self.results_tree.grid(row=1, column=0, columnspan=4, pady=5)
+        self.results_tree.tag_configure('critical', background='#f8d7da')
+        self.results_tree.tag_configure('abnormal', background='#fff3cd')
+
+        trend_frame = ttk.LabelFrame(self, text="Patient Trend")
+        trend_frame.grid(row=2, column=0, columnspan=2, padx=10, pady=10, sticky="nsew")
+
+        ttk.Label(trend_frame, text="Patient ID:").grid(row=0, column=0)
+        self.trend_patient_entry = ttk.Entry(trend_frame, width=10)
+        self.trend_patient_entry.grid(row=0, column=1)
+
+        ttk.Label(trend_frame, text="Analyte:").grid(row=0, column=2)
+        self.trend_analyte_combobox = ttk.Combobox(trend_frame, values=[label for _, label, _ in ANALYTES],
+                                                   state="readonly", width=8)
+        self.trend_analyte_combobox.current(ANALYTE_COLUMNS.index("hct"))
+        self.trend_analyte_combobox.grid(row=0, column=3)
+        self.trend_analyte_combobox.bind("<<ComboboxSelected>>", lambda _: self.load_trend())
+
+        self.load_trend_button = ttk.Button(trend_frame, text="Show Trend", command=self.load_trend)
+        self.load_trend_button.grid(row=0, column=4, padx=5)
+
+        self.trend_loading = LoadingIndicator(trend_frame)
+        self.trend_loading.grid(row=0, column=5, padx=5)
+
+        self.trend_status = ttk.Label(trend_frame, text="")
+        self.trend_status.grid(row=0, column=6, padx=5, sticky="w")
+
+        self.create_trend_chart(trend_frame)
+
+    def create_trend_chart(self, parent):
+        # The lines are created once and updated in place for every patient and analyte
+        fig = Figure(figsize=(9, 2.5), dpi=100)
+        axes = fig.add_subplot(111)
+        axes.xaxis_date()
+        self.trend_line, = axes.plot([], [], marker=".", linewidth=1, label="Result")
+        self.trend_mean_line, = axes.plot([], [], linewidth=2, label="Rolling mean")
+        self.trend_low_line = axes.axhline(np.nan, color="gray", linestyle="--", linewidth=1)
+        self.trend_high_line = axes.axhline(np.nan, color="gray", linestyle="--", linewidth=1)
+        axes.legend(loc="upper left")
+        fig.tight_layout()
+        self.trend_canvas = FigureCanvasTkAgg(fig, master=parent)
+        self.trend_canvas.draw()
+        self.trend_canvas.get_tk_widget().grid(row=1, column=0, columnspan=7, pady=5)
+
+    def on_show(self):
+        # Pick up results entered since the tab was last shown
+        self.load_run()
+
+    def set_ranges(self, ranges):
+        self.ranges = ranges
+        self.species_combobox.configure(values=ranges.species)
+
+    def on_db_error(self, error):
+        logging.error(f"Database error: {error}")
+        messagebox.showerror("Error", f"Database operation failed: {error}")
+
+    def add_patient(self):
+        name = self.patient_name_entry.get().strip()
+        species = self.species_combobox.get().strip()
+        if not name or not species:
+            messagebox.showerror("Error", "Patient name and species are required.")
             return
-        self.db.execute_query('''
-            INSERT INTO invoices (client_id, date, total_amount) 
-            VALUES (?, date('now'), ?)
-        ''', (client_id, float(total_amount)))
-        self.invoice_client_id_entry.delete(0, "end")
-        self.invoice_total_entry.delete(0, "end")
-        self.load_invoices()
-
-    def edit_invoice(self):
-        selected_item = self.invoice_listbox.selection()
-        if not selected_item:
-            messagebox.showerror("Error", "Select an invoice to edit.")
+        self.executor.write(add_patient, self.db, self.patient_client_entry.get().strip(), name, species,
+                            on_done=self.on_patient_added, on_error=self.on_db_error)
+
+    def on_patient_added(self, patient_id):
+        for entry in (self.patient_client_entry, self.patient_name_entry):
+            entry.delete(0, "end")
+        self.panel_patient_entry.delete(0, "end")
+        self.panel_patient_entry.insert(0, patient_id)
+
+    def add_panel(self):
+        patient_id = self.panel_patient_entry.get().strip()
+        sampled_at = self.sampled_at_entry.get().strip() or datetime.datetime.now().strftime(SAMPLED_AT_FORMAT)
+        if not patient_id:
+            messagebox.showerror("Error", "Patient ID is required.")
             return
-        invoice_data = self.invoice_listbox.item(selected_item)['values']
-        self.invoice_client_id_entry.delete(0, "end")
-        self.invoice_client_id_entry.insert(0, invoice_data[0])  # Assuming client ID is stored
-        self.invoice_total_entry.delete(0, "end")
-        self.invoice_total_entry.insert(0, invoice_data[1])
-        self.delete_invoice()  # Remove the old entry after editing
-
-    def delete_invoice(self):
-        selected_item = self.invoice_listbox.selection()
-        if not selected_item:
-            messagebox.showerror("Error", "Select an invoice to delete.")
+        try:
+            sampled_at = parse_sampled_at(sampled_at)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
             return
-        invoice_data = self.invoice_listbox.item(selected_item)['values']
-        self.db.execute_query("DELETE FROM invoices WHERE client_id=? AND total_amount=?", (invoice_data[0], invoice_data[1]))
-        self.load_invoices()
\ No newline at end of file
+        results = {}
+        for column, entry in self.analyte_entries.items():
+            value = entry.get().strip()
+            if value:
+                try:
+                    results[column] = float(value)
+                except ValueError:
+                    messagebox.showerror("Error", f"{column.upper()} must be a number.")
+                    return
+        if not results:
+            messagebox.showerror("Error", "Enter at least one result.")
+            return
+        self.executor.write(add_panel, self.db, patient_id, sampled_at, results,
+                            on_done=lambda _: self.on_panel_added(sampled_at), on_error=self.on_db_error)
+
+    def on_panel_added(self, sampled_at):
+        for entry in self.analyte_entries.values():
+            entry.delete(0, "end")
+        self.run_date_entry.delete(0, "end")
+        self.run_date_entry.insert(0, sampled_at[:10])
+        self.load_run()
+
+    def load_run(self):
+        day = self.run_date_entry.get().strip()
+        try:
+            datetime.date.fromisoformat(day)
+        except ValueError:
+            messagebox.showerror("Error", "Date must be in YYYY-MM-DD format.")
+            return
+        self.executor.read(load_panels, self.db, day, self.ranges,
+                           on_done=self.show_run, on_error=self.on_db_error,
+                           key="hematology.run", indicator=self.loading)
+
+    def show_run(self, batch):
+        rows, tags = [], []
+        for index, worst in enumerate(batch.worst_flags()):
+            cells = [f"{value:g} {FLAG_LABELS[flag]}".strip() if flag >= 0 else ""
+                     for value, flag in zip(batch.values[index], batch.flags[index])]
+            rows.append((batch.ids[index], batch.sampled_at[index][11:16], batch.patients[index],
+                         batch.species[index], *cells))
+            # Highlight panels by their most severe result
+            tags.append(('critical',) if worst >= CRITICAL_LOW else ('abnormal',) if worst >= LOW else ())
+        self.results_tree.set_rows(rows, tags)
+
+    def selected_analyte(self):
+        return ANALYTE_COLUMNS[self.trend_analyte_combobox.current()]
+
+    def load_trend(self):
+        patient_id = self.trend_patient_entry.get().strip()
+        if not patient_id.isdigit():
+            messagebox.showerror("Error", "Patient ID must be a number.")
+            return
+        self.executor.read(load_trend, self.db, int(patient_id), self.selected_analyte(),
+                           on_done=self.show_trend, on_error=self.on_db_error,
+                           key="hematology.trend", indicator=self.trend_loading)
+
+    def show_trend(self, trend):
+        (name, species), series = trend
+        times = date2num(series.sampled_at)
+        mean, _ = series.rolling()
+        self.trend_line.set_data(times, series.values)
+        self.trend_mean_line.set_data(times, mean)
+
+        # Reference limits of the patient's species, if any
+        low = high = np.nan
+        if self.ranges is not None:
+            code = self.ranges.codes([species])[0]
+            position = ANALYTE_COLUMNS.index(series.analyte)
+            low, high = self.ranges.low[code, position], self.ranges.high[code, position]
+        self.trend_low_line.set_ydata([low, low])
+        self.trend_high_line.set_ydata([high, high])
+
+        axes = self.trend_canvas.figure.axes[0]
+        label = ANALYTES[ANALYTE_COLUMNS.index(series.analyte)]
+        axes.set_title(f"{name} ({species}) - {label[1]} ({label[2]})")
+        axes.relim()
+        axes.autoscale_view()
+        self.trend_canvas.draw_idle()
+
+        delta = series.delta_from_baseline()
+        self.trend_status.configure(
+            text=f"{len(series.values)} results, change from first: {delta[-1]:+g}" if len(delta) else "No results")
@@ -0,0 +1,157 @@
+import os
+import csv
+import time
+import logging
+from dataclasses import dataclass
+from validation import TEXT_PATTERN
+
+# Rows read, validated and inserted per transaction.
+CHUNK_SIZE = 5000
+
+# Importable tables: (text columns, price column or None, required columns).
+IMPORT_TABLES = {
+    "clients": (("name", "phone", "address"), None, ("name",)),
+    "products": (("name",), "price", ("name", "price")),
+    "services": (("name",), "price", ("name", "price")),
+}
+
+
+# File dialog filter for the import buttons.
+FILE_TYPES = [("CSV or Excel", "*.csv *.xlsx *.xlsm"), ("All files", "*.*")]
+
+
+@dataclass(frozen=True)
+class ImportResult:
+    table: str
+    imported: int
+    rejected: int
+    rejects_path: str  # None when every row was imported
+    seconds: float
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """Yield the rows of a CSV or XLSX file as DataFrames of at most chunk_size rows, all text."""
+    import pandas as pd
+
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        # pandas reads a whole sheet at once; openpyxl's read-only mode streams it.
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(value) if value is not None else "" for value in next(rows, ())]
+            chunk = []
+            for row in rows:
+                chunk.append(["" if value is None else str(value) for value in row])
+                if len(chunk) == chunk_size:
+                    yield pd.DataFrame(chunk, columns=header)
+                    chunk = []
+            if chunk:
+                yield pd.DataFrame(chunk, columns=header)
+        finally:
+            workbook.close()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False,
+                               skipinitialspace=True)
+
+
+def validate_chunk(chunk, table):
+    """Split a chunk into (rows to insert, rejected DataFrame with a `reason` column)."""
+    import pandas as pd
+
+    text_columns, price_column, required = IMPORT_TABLES[table]
+    columns = text_columns + ((price_column,) if price_column else ())
+    original = chunk
+    chunk = chunk.rename(columns=lambda name: str(name).strip().lower())
+    missing = [column for column in required if column not in chunk]
+    if missing:
+        raise ValueError(f"Missing column(s) for {table}: {', '.join(missing)}")
+    for column in columns:
+        if column not in chunk:
+            chunk[column] = ""
+        chunk[column] = chunk[column].fillna("").astype(str).str.strip()
+
+    reason = pd.Series("", index=chunk.index)
+    for column in required:
+        reason = reason.mask((reason == "") & (chunk[column] == ""), f"{column} is required")
+    for column in text_columns:
+        invalid = ~chunk[column].str.fullmatch(TEXT_PATTERN)
+        reason = reason.mask((reason == "") & invalid, f"{column} has invalid characters")
+    if price_column:
+        prices = pd.to_numeric(chunk[price_column], errors="coerce")
+        # Same rule as validation.parse_price: finite and not negative
+        valid_price = (prices >= 0) & (prices < float("inf"))
+        reason = reason.mask((reason == "") & ~valid_price, f"{price_column} is not a valid price")
+        chunk[price_column] = prices
+
+    valid = reason == ""
+    rows = list(chunk.loc[valid, list(columns)].itertuples(index=False, name=None))
+    rejected = original.loc[~valid].assign(reason=reason[~valid])
+    return columns, rows, rejected
+
+
+def insert_rows(db, table, columns, rows):
+    """Insert one chunk of rows in one transaction; runs on the writer thread."""
+    with db.transaction() as conn:
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            rows)
+
+
+def import_file(db, path, table, chunk_size=CHUNK_SIZE, rejects_path=None, progress=None):
+    """Stream a CSV/XLSX file into `table`, one write and one executemany per chunk.
+
+    Only one chunk is held in memory at a time. Rows breaking the form rules
+    are appended to `rejects_path` (default <file>.rejects.csv) with their
+    source line and the reason. `progress(imported, rejected)` is called after
+    each chunk from the importing thread.
+    """
+    if table not in IMPORT_TABLES:
+        raise ValueError(f"Unknown import table: {table}")
+    rejects_path = rejects_path or os.path.splitext(path)[0] + ".rejects.csv"
+    started = time.perf_counter()
+    imported = rejected = 0
+    rejects_file = writer = None
+    try:
+        for chunk in read_chunks(path, chunk_size):
+            # Line numbers as a spreadsheet shows them, header being line 1.
+            chunk.index = range(imported + rejected + 2, imported + rejected + 2 + len(chunk))
+            columns, rows, bad = validate_chunk(chunk, table)
+            if rows:
+                db.write(insert_rows, db, table, columns, rows)
+            if len(bad):
+                if writer is None:
+                    rejects_file = open(rejects_path, "w", newline="", encoding="utf-8")
+                    writer = csv.writer(rejects_file)
+                    writer.writerow(["line", *bad.columns])
+                writer.writerows(bad.itertuples(name=None))
+            imported += len(rows)
+            rejected += len(bad)
+            if progress is not None:
+                progress(imported, rejected)
+    finally:
+        if rejects_file is not None:
+            rejects_file.close()
+    elapsed = time.perf_counter() - started
+    logging.info(f"Imported {imported} {table} rows ({rejected} rejected) from {path} in {elapsed:.2f} s")
+    return ImportResult(table, imported, rejected, rejects_path if rejected else None, elapsed)
+
+
+def summary(result):
+    """One-line description of an import for the UI."""
+    text = f"{result.imported} rows imported, {result.rejected} rejected."
+    if result.rejects_path:
+        text += f" Rejected rows were written to {result.rejects_path}"
+    return text
+
+
+if __name__ == "__main__":
+    import sys
+    from db import Database, DB_PATH
+
+    if len(sys.argv) < 3:
+        sys.exit("usage: python importer.py TABLE FILE [DATABASE]")
+    db = Database(sys.argv[3] if len(sys.argv) > 3 else DB_PATH)
+    result = import_file(db, sys.argv[2], sys.argv[1])
+    print(f"{summary(result)} ({result.seconds:.2f} s)")
+    db.close()
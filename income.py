@@ -1,10 +1,25 @@
 import ttkbootstrap as ttk
-from tkinter import messagebox
+from tkinter import messagebox, filedialog
+import logging
+from widgets import LoadingIndicator
+from reports import parse_day
+from exporter import export_income, FILE_TYPES
+
+# Combobox label -> IncomeEngine grouping
+GROUPING_CHOICES = {
+    "By client": "client",
+    "By week": "week",
+    "By month": "month",
+    "By client and week": "client_week",
+    "By client and month": "client_month",
+}
 
 class IncomeTab(ttk.Frame):
-    def __init__(self, parent, db):
+    def __init__(self, parent, repos, executor):
         super().__init__(parent)
-        self.db = db
+        self.repos = repos
+        self.db = repos.db  # None when the data is served by the API server
+        self.executor = executor
         self.create_income_tab()
 
     def create_income_tab(self):
@@ -20,32 +35,73 @@ class IncomeTab(ttk.Frame):
         self.end_date_entry = ttk.Entry(income_frame)
         self.end_date_entry.grid(row=1, column=1, padx=10, pady=10)
 
+        ttk.Label(income_frame, text="Group:").grid(row=0, column=2, padx=10, pady=10)
+        self.grouping_combo = ttk.Combobox(income_frame, values=list(GROUPING_CHOICES), state="readonly")
+        self.grouping_combo.current(0)
+        self.grouping_combo.grid(row=0, column=3, padx=10, pady=10)
+
         self.calculate_income_button = ttk.Button(income_frame, text="Calculate Income", command=self.calculate_income)
         self.calculate_income_button.grid(row=2, column=0, columnspan=2, pady=10)
 
+        # Exports read the database file, so only the desk that hosts it has them
+        self.export_income_button = ttk.Button(income_frame, text="Export", command=self.export_income,
+                                               state="normal" if self.db is not None else "disabled")
+        self.export_income_button.grid(row=2, column=3, pady=10)
+
+        self.loading = LoadingIndicator(income_frame)
+        self.loading.grid(row=2, column=2, padx=10)
+
         # Income List
-        self.income_listbox = ttk.Treeview(income_frame, columns=("Client", "Total Amount", "Date"), show="headings")
-        self.income_listbox.grid(row=3, column=0, columnspan=2, pady=10)
+        self.income_listbox = ttk.Treeview(income_frame, columns=("Period", "Client", "Invoices", "Total Amount"), show="headings")
+        self.income_listbox.grid(row=3, column=0, columnspan=4, pady=10)
+        self.income_listbox.heading("Period", text="Period")
         self.income_listbox.heading("Client", text="Client")
+        self.income_listbox.heading("Invoices", text="Invoices")
         self.income_listbox.heading("Total Amount", text="Total Amount")
-        self.income_listbox.heading("Date", text="Date")
+        self.income_listbox.tag_configure('total', font=("Arial", 10, "bold"))
 
-    def calculate_income(self):
+    def read_range(self):
+        """Return the validated (start, end, grouping) from the form, or None after reporting the problem."""
         start_date = self.start_date_entry.get()
         end_date = self.end_date_entry.get()
 
         if not start_date or not end_date:
             messagebox.showerror("Error", "Please enter both start and end dates.")
-            return 
+            return None
+        try:
+            start_date, end_date = parse_day(start_date), parse_day(end_date)
+        except ValueError:
+            messagebox.showerror("Error", "Dates must be in YYYY-MM-DD format.")
+            return None
+        return start_date, end_date, GROUPING_CHOICES[self.grouping_combo.get()]
+
+    def calculate_income(self):
+        selection = self.read_range()
+        if selection is None:
+            return
+        self.executor.read(self.repos.income.report, *selection,
+                           on_done=self.show_income, on_error=self.on_db_error,
+                           key="income.report", indicator=self.loading)
+
+    def export_income(self):
+        selection = self.read_range()
+        if selection is None:
+            return
+        path = filedialog.asksaveasfilename(title="Export income", defaultextension=".csv", filetypes=FILE_TYPES)
+        if path:
+            self.executor.read(export_income, self.db, path, *selection,
+                               on_done=lambda count: messagebox.showinfo("Export", f"{count} rows exported to {path}"),
+                               on_error=self.on_db_error, indicator=self.loading)
+
+    def show_income(self, report):
         for row in self.income_listbox.get_children():
             self.income_listbox.delete(row)
+        for period, client_id, client_name, invoices, revenue in report.rows:
+            # The id keeps clients that share a name apart
+            client = f"{client_name} (#{client_id})" if client_id is not None else ""
+            self.income_listbox.insert("", "end", values=(period or "", client, invoices, f"{revenue:.2f}"))
+        self.income_listbox.insert("", "end", values=("Total", "", report.total_invoices, f"{report.total_revenue:.2f}"), tags=('total',))
 
-        income_data = self.db.fetch_all('''
-            SELECT clients.name, SUM(invoices.total_amount), invoices.date
-            FROM invoices
-            JOIN clients ON invoices.client_id = clients.id
-            WHERE invoices.date BETWEEN ? AND ?
-            GROUP BY clients.name
-        ''', (start_date, end_date))
-        for income in income_data:
-            self.income_listbox.insert("", "end", values=(income[0], income[1], income[2]))
\ No newline at end of file
+    def on_db_error(self, error):
+        logging.error(f"Failed to calculate income: {error}")
+        messagebox.showerror("Error", f"Failed to calculate income: {error}")
@@ -0,0 +1,182 @@
+import os
+import io
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+IMG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'img')
+# Logos tried in order; invoices are printed without one if none exists.
+LOGO_PATHS = (os.path.join(IMG_DIR, 'logo-slogan.png'), os.path.join(IMG_DIR, 'logo.ico'))
+# Invoices per task sent to a worker, so process overhead is paid per chunk.
+CHUNK_SIZE = 25
+
+# Page layout, in millimetres on A4.
+LAYOUT = {
+    "margin": 15,
+    "logo_width": 50,
+    "header_height": 30,
+    "line_height": 7,
+    "columns": (("Concepto", 95), ("Cantidad", 25), ("Precio", 30), ("Importe", 30)),
+}
+
+# Per-process state set up once by init_worker.
+_template = None
+
+
+class InvoiceTemplate:
+    """Everything a worker reuses across invoices: the logo, already decoded, and the layout."""
+
+    def __init__(self, layout=LAYOUT, logo_paths=LOGO_PATHS):
+        self.layout = layout
+        self.logo = None
+        for path in logo_paths:
+            if os.path.exists(path):
+                self.logo = load_logo(path)
+                break
+
+    def render(self, invoice):
+        from fpdf import FPDF
+
+        layout = self.layout
+        margin, line_height = layout["margin"], layout["line_height"]
+        pdf = FPDF(format="A4")
+        pdf.set_margins(margin, margin)
+        pdf.set_auto_page_break(True, margin)
+        pdf.add_page()
+
+        if self.logo is not None:
+            pdf.image(io.BytesIO(self.logo), x=margin, y=margin, w=layout["logo_width"])
+        pdf.set_font("Helvetica", "B", 16)
+        pdf.set_xy(margin, margin)
+        pdf.cell(0, 10, f"Factura N.º {invoice['id']}", align="R")
+        pdf.set_font("Helvetica", "", 10)
+        pdf.set_xy(margin, margin + 10)
+        pdf.cell(0, 6, f"Fecha: {invoice['date']}", align="R")
+
+        pdf.set_y(margin + layout["header_height"])
+        pdf.set_font("Helvetica", "B", 11)
+        pdf.cell(0, line_height, "Cliente", new_x="LMARGIN", new_y="NEXT")
+        pdf.set_font("Helvetica", "", 10)
+        for value in (invoice["client_name"], invoice["client_address"], invoice["client_phone"]):
+            if value:
+                pdf.cell(0, 6, str(value), new_x="LMARGIN", new_y="NEXT")
+        pdf.ln(line_height)
+
+        pdf.set_font("Helvetica", "B", 10)
+        for title, width in layout["columns"]:
+            pdf.cell(width, line_height, title, border="B")
+        pdf.ln()
+        pdf.set_font("Helvetica", "", 10)
+        widths = [width for _, width in layout["columns"]]
+        for name, quantity, price in invoice["lines"]:
+            cells = (str(name), str(quantity), f"{price:.2f}", f"{price * quantity:.2f}")
+            for width, text, align in zip(widths, cells, ("L", "R", "R", "R")):
+                pdf.cell(width, line_height, text, align=align)
+            pdf.ln()
+
+        pdf.set_font("Helvetica", "B", 11)
+        pdf.cell(sum(widths[:-1]), line_height + 2, "Total", border="T", align="R")
+        pdf.cell(widths[-1], line_height + 2, f"{invoice['total_amount']:.2f}", border="T", align="R")
+        return pdf
+
+
+def load_logo(path):
+    """Return the logo as PNG bytes; fpdf2 cannot read .ico files, so those go through Pillow."""
+    if path.lower().endswith(".png"):
+        with open(path, "rb") as handle:
+            return handle.read()
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.open(path).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def init_worker(layout=LAYOUT, logo_paths=LOGO_PATHS):
+    global _template
+    _template = InvoiceTemplate(layout, logo_paths)
+
+
+def render_chunk(invoices, out_dir):
+    """Render each invoice to <out_dir>/factura-<id>.pdf; returns [(path, pages)]."""
+    if _template is None:
+        init_worker()
+    rendered = []
+    for invoice in invoices:
+        pdf = _template.render(invoice)
+        path = os.path.join(out_dir, f"factura-{invoice['id']}.pdf")
+        pdf.output(path)
+        rendered.append((path, pdf.pages_count))
+    return rendered
+
+
+def load_month(db, month):
+    """Return the invoices dated in `month` ('YYYY-MM') with their client and lines."""
+    start, end = f"{month}-01", f"{month}-31"
+    invoices = {}
+    for row in db.fetch_all('''
+        SELECT invoices.id, invoices.date, invoices.total_amount, clients.name, clients.phone, clients.address
+        FROM invoices JOIN clients ON clients.id = invoices.client_id
+        WHERE invoices.date BETWEEN ? AND ?
+        ORDER BY invoices.id
+    ''', (start, end)):
+        invoice_id, date, total_amount, name, phone, address = row
+        invoices[invoice_id] = {
+            "id": invoice_id, "date": date, "total_amount": total_amount,
+            "client_name": name, "client_phone": phone, "client_address": address, "lines": [],
+        }
+    for invoice_id, name, quantity, price in db.fetch_all('''
+        SELECT items.invoice_id, COALESCE(products.name, services.name), items.quantity, items.unit_price
+        FROM invoices
+        JOIN invoice_items AS items ON items.invoice_id = invoices.id
+        LEFT JOIN products ON products.id = items.product_id
+        LEFT JOIN services ON services.id = items.service_id
+        WHERE invoices.date BETWEEN ? AND ?
+        ORDER BY items.id
+    ''', (start, end)):
+        invoices[invoice_id]["lines"].append((name, quantity, price))
+    return list(invoices.values())
+
+
+def render_month(db, month, out_dir, workers=None, progress=None):
+    """Render every invoice of `month` as a PDF in `out_dir` using a process pool.
+
+    `progress(done, total)` is called from the calling thread after each chunk.
+    Returns (paths, pages, seconds).
+    """
+    invoices = load_month(db, month)
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.perf_counter()
+    paths, pages = [], 0
+    if invoices:
+        chunks = [invoices[i:i + CHUNK_SIZE] for i in range(0, len(invoices), CHUNK_SIZE)]
+        # Spawned workers start clean instead of forking the Tk process and its threads.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker) as pool:
+            futures = [pool.submit(render_chunk, chunk, out_dir) for chunk in chunks]
+            for future in as_completed(futures):
+                for path, count in future.result():
+                    paths.append(path)
+                    pages += count
+                if progress is not None:
+                    progress(len(paths), len(invoices))
+    elapsed = time.perf_counter() - started
+    logging.info(f"Rendered {len(paths)} invoices ({pages} pages) in {elapsed:.2f} s, "
+                 f"{pages / elapsed if elapsed else 0:.1f} pages/s")
+    return sorted(paths), pages, elapsed
+
+
+if __name__ == "__main__":
+    import sys
+    from db import Database, DB_PATH
+
+    if len(sys.argv) < 2:
+        sys.exit("usage: python invoice_pdf.py YYYY-MM [OUT_DIR] [DATABASE] [WORKERS]")
+    month = sys.argv[1]
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else f"facturas-{month}"
+    db = Database(sys.argv[3] if len(sys.argv) > 3 else DB_PATH)
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    paths, pages, elapsed = render_month(db, month, out_dir, workers)
+    print(f"{len(paths)} invoices, {pages} pages in {elapsed:.2f} s "
+          f"({pages / elapsed if elapsed else 0:.1f} pages/s) -> {out_dir}")
+    db.close()
@@ -1,10 +1,21 @@
 import ttkbootstrap as ttk
-from tkinter import messagebox
+from tkinter import messagebox, filedialog
+import logging
+import datetime
+from widgets import VirtualTreeview, LoadingIndicator
+from invoice_pdf import render_month
+from exporter import export_invoices, FILE_TYPES as EXPORT_FILE_TYPES
+
+KIND_LABELS = {"product": "Producto", "service": "Servicio"}
 
 class InvoicesTab(ttk.Frame):
-    def __init__(self, parent, db):
+    def __init__(self, parent, repos, executor):
         super().__init__(parent)
-        self.db = db
+        self.repos = repos
+        self.db = repos.db  # None when the data is served by the API server
+        self.executor = executor
+        self.catalog = {}  # Picker label -> (kind, id, name, price)
+        self.lines = []  # (kind, id, quantity) lines of the invoice being written
         self.create_invoices_tab()
 
     def create_invoices_tab(self):
@@ -15,21 +26,44 @@ class InvoicesTab(ttk.Frame):
         self.invoice_client_id_entry = ttk.Entry(invoice_form_frame)
         self.invoice_client_id_entry.grid(row=0, column=1)
 
-        ttk.Label(invoice_form_frame, text="Total Amount:").grid(row=1, column=0)
-        self.invoice_total_entry = ttk.Entry(invoice_form_frame)
-        self.invoice_total_entry.grid(row=1, column=1)
+        ttk.Label(invoice_form_frame, text="Item:").grid(row=1, column=0)
+        self.item_combobox = ttk.Combobox(invoice_form_frame, state="readonly")
+        self.item_combobox.grid(row=1, column=1)
+
+        ttk.Label(invoice_form_frame, text="Quantity:").grid(row=2, column=0)
+        self.quantity_entry = ttk.Entry(invoice_form_frame)
+        self.quantity_entry.insert(0, "1")
+        self.quantity_entry.grid(row=2, column=1)
+
+        self.add_line_button = ttk.Button(invoice_form_frame, text="Add Line", command=self.add_line)
+        self.add_line_button.grid(row=3, column=0)
+        self.remove_line_button = ttk.Button(invoice_form_frame, text="Remove Line", command=self.remove_line)
+        self.remove_line_button.grid(row=3, column=1)
+
+        self.lines_tree = ttk.Treeview(invoice_form_frame, columns=("Item", "Quantity", "Price"), show="headings", height=6)
+        for column in ("Item", "Quantity", "Price"):
+            self.lines_tree.heading(column, text=column)
+            self.lines_tree.column(column, width=100)
+        self.lines_tree.grid(row=4, column=0, columnspan=2, pady=5)
 
         self.add_invoice_button = ttk.Button(invoice_form_frame, text="Create Invoice", command=self.add_invoice)
-        self.add_invoice_button.grid(row=2, column=0, columnspan=2)
+        self.add_invoice_button.grid(row=5, column=0, columnspan=2)
+
+        self.loading = LoadingIndicator(invoice_form_frame)
+        self.loading.grid(row=6, column=0, columnspan=2, pady=5)
 
         invoice_table_frame = ttk.LabelFrame(self, text="Invoice List")
         invoice_table_frame.grid(row=0, column=1, padx=10, pady=10, sticky="nsew")
 
-        self.invoice_listbox = ttk.Treeview(invoice_table_frame, columns=("Client", "Total Amount", "Date"), show="headings")
+        self.invoice_listbox = VirtualTreeview(
+            invoice_table_frame,
+            columns=("Client", "Total Amount", "Date"),
+            fetch_rows=self.repos.invoices.page,
+            count_rows=self.repos.invoices.count,
+            executor=self.executor,
+            indicator=self.loading,
+        )
         self.invoice_listbox.grid(row=0, column=0)
-        self.invoice_listbox.heading("Client", text="Client")
-        self.invoice_listbox.heading("Total Amount", text="Total Amount")
-        self.invoice_listbox.heading("Date", text="Date")
         self.load_invoices()
 
         self.edit_invoice_button = ttk.Button(invoice_table_frame, text="Edit Invoice", command=self.edit_invoice)
@@ -38,44 +72,157 @@ class InvoicesTab(ttk.Frame):
         self.delete_invoice_button = ttk.Button(invoice_table_frame, text="Delete Invoice", command=self.delete_invoice)
         self.delete_invoice_button.grid(row=2, column=0, sticky="ew")
 
+        self.export_invoices_button = ttk.Button(invoice_table_frame, text="Export Invoices", command=self.export_invoices)
+        self.export_invoices_button.grid(row=3, column=0, sticky="ew")
+
+        print_frame = ttk.LabelFrame(self, text="Print Invoices")
+        print_frame.grid(row=1, column=0, columnspan=2, padx=10, pady=10, sticky="ew")
+
+        ttk.Label(print_frame, text="Month (YYYY-MM):").grid(row=0, column=0)
+        self.print_month_entry = ttk.Entry(print_frame)
+        self.print_month_entry.insert(0, datetime.date.today().strftime("%Y-%m"))
+        self.print_month_entry.grid(row=0, column=1)
+
+        self.print_button = ttk.Button(print_frame, text="Print Month", command=self.print_month)
+        self.print_button.grid(row=0, column=2, padx=5)
+
+        self.print_progress = ttk.Progressbar(print_frame, mode="determinate", length=200)
+        self.print_progress.grid(row=0, column=3, padx=5)
+        self.print_status = ttk.Label(print_frame, text="")
+        self.print_status.grid(row=0, column=4, padx=5)
+
+        # Exports and printing read the database file, so only the desk that hosts it has them
+        if self.db is None:
+            self.export_invoices_button.configure(state="disabled")
+            self.print_button.configure(state="disabled")
+
     def load_invoices(self):
-        for row in self.invoice_listbox.get_children():
-            self.invoice_listbox.delete(row)
-        invoices = self.db.fetch_all("SELECT invoices.id, clients.name, invoices.total_amount, invoices.date FROM invoices JOIN clients ON invoices.client_id = clients.id")
-        for invoice in invoices:
-            self.invoice_listbox.insert("", "end", values=(invoice[1], invoice[2], invoice[3]))
+        self.invoice_listbox.refresh()
+
+    def on_show(self):
+        # Products and services may have changed on their own tabs.
+        self.executor.read(self.repos.invoices.catalog, on_done=self.set_catalog, on_error=self.on_db_error,
+                           key="invoices.catalog")
+
+    def set_catalog(self, items):
+        self.catalog = {f"{KIND_LABELS[kind]}: {name}": (kind, item_id, name, price)
+                        for kind, item_id, name, price in items}
+        self.item_combobox.configure(values=list(self.catalog))
+
+    def add_line(self):
+        item = self.catalog.get(self.item_combobox.get())
+        if item is None:
+            messagebox.showerror("Error", "Select a product or service.")
+            return
+        try:
+            quantity = int(self.quantity_entry.get())
+        except ValueError:
+            quantity = 0
+        if quantity <= 0:
+            messagebox.showerror("Error", "Quantity must be a positive whole number.")
+            return
+        kind, item_id, name, price = item
+        self.lines.append((kind, item_id, quantity))
+        # The price shown is indicative; the invoice is priced when it is saved.
+        self.lines_tree.insert("", "end", values=(name, quantity, price))
+
+    def remove_line(self):
+        selected = self.lines_tree.selection()
+        if not selected:
+            return
+        index = self.lines_tree.index(selected[0])
+        del self.lines[index]
+        self.lines_tree.delete(selected[0])
+
+    def clear_lines(self):
+        self.lines = []
+        self.lines_tree.delete(*self.lines_tree.get_children())
+
+    def on_db_error(self, error):
+        logging.error(f"Database error: {error}")
+        messagebox.showerror("Error", f"Database operation failed: {error}")
 
     def add_invoice(self):
         client_id = self.invoice_client_id_entry.get()
-        total_amount = self.invoice_total_entry.get()
-        if not client_id or not total_amount:
-            messagebox.showerror("Error", "Client ID and total amount are required.")
+        if not client_id or not self.lines:
+            messagebox.showerror("Error", "Client ID and at least one line are required.")
             return
-        self.db.execute_query('''
-            INSERT INTO invoices (client_id, date, total_amount) 
-            VALUES (?, date('now'), ?)
-        ''', (client_id, float(total_amount)))
+        self.executor.write(self.repos.invoices.create, client_id, list(self.lines),
+                            on_done=self.on_invoice_added, on_error=self.on_db_error, indicator=self.loading)
+
+    def on_invoice_added(self, _):
         self.invoice_client_id_entry.delete(0, "end")
-        self.invoice_total_entry.delete(0, "end")
+        self.clear_lines()
         self.load_invoices()
 
     def edit_invoice(self):
-        selected_item = self.invoice_listbox.selection()
-        if not selected_item:
+        invoice_id = self.invoice_listbox.selected_key()
+        if invoice_id is None:
             messagebox.showerror("Error", "Select an invoice to edit.")
             return
-        invoice_data = self.invoice_listbox.item(selected_item)['values']
+        self.executor.read(self.repos.invoices.get, invoice_id,
+                           on_done=self.on_invoice_loaded, on_error=self.on_db_error, indicator=self.loading)
+
+    def on_invoice_loaded(self, result):
+        invoice_id, client_id, lines = result
+        if client_id is None:
+            return  # Deleted in the meantime
+        names = {(kind, item_id): name for kind, item_id, name, _ in self.catalog.values()}
         self.invoice_client_id_entry.delete(0, "end")
-        self.invoice_client_id_entry.insert(0, invoice_data[0])  # Assuming client ID is stored
-        self.invoice_total_entry.delete(0, "end")
-        self.invoice_total_entry.insert(0, invoice_data[1])
-        self.delete_invoice()  # Remove the old entry after editing
+        self.invoice_client_id_entry.insert(0, client_id)
+        self.clear_lines()
+        for kind, item_id, quantity, price in lines:
+            self.lines.append((kind, item_id, quantity))
+            self.lines_tree.insert("", "end", values=(names.get((kind, item_id), item_id), quantity, price))
+        self.remove_invoice(invoice_id)  # Remove the old entry after editing
+
+    def export_invoices(self):
+        path = filedialog.asksaveasfilename(title="Export invoices", defaultextension=".csv",
+                                            filetypes=EXPORT_FILE_TYPES)
+        if path:
+            self.executor.read(export_invoices, self.db, path,
+                               on_done=lambda count: messagebox.showinfo("Export", f"{count} invoices exported to {path}"),
+                               on_error=self.on_db_error, indicator=self.loading)
+
+    def print_month(self):
+        month = self.print_month_entry.get().strip()
+        try:
+            datetime.datetime.strptime(month, "%Y-%m")
+        except ValueError:
+            messagebox.showerror("Error", "Month must be written as YYYY-MM.")
+            return
+        out_dir = filedialog.askdirectory(title="Save invoices to")
+        if not out_dir:
+            return
+        self.print_button.configure(state="disabled")
+        self.print_progress.configure(value=0, maximum=1)
+        self.print_status.configure(text="Rendering...")
+        # Rendering runs on worker processes; progress comes back through the Tk thread.
+        progress = lambda done, total: self.executor.post(self.on_print_progress, done, total)
+        self.executor.read(render_month, self.db, month, out_dir, None, progress,
+                           on_done=self.on_month_printed, on_error=self.on_print_error, key="invoices.print")
+
+    def on_print_progress(self, done, total):
+        self.print_progress.configure(value=done, maximum=total)
+        self.print_status.configure(text=f"{done} / {total}")
+
+    def on_month_printed(self, result):
+        paths, pages, elapsed = result
+        self.print_button.configure(state="normal")
+        self.print_status.configure(text=f"{len(paths)} invoices printed in {elapsed:.1f} s")
+
+    def on_print_error(self, error):
+        self.print_button.configure(state="normal")
+        self.print_status.configure(text="")
+        self.on_db_error(error)
 
     def delete_invoice(self):
-        selected_item = self.invoice_listbox.selection()
-        if not selected_item:
+        invoice_id = self.invoice_listbox.selected_key()
+        if invoice_id is None:
             messagebox.showerror("Error", "Select an invoice to delete.")
             return
-        invoice_data = self.invoice_listbox.item(selected_item)['values']
-        self.db.execute_query("DELETE FROM invoices WHERE client_id=? AND total_amount=?", (invoice_data[0], invoice_data[1]))
-        self.load_invoices()
\ No newline at end of file
+        self.remove_invoice(invoice_id)
+
+    def remove_invoice(self, invoice_id):
+        self.executor.write(self.repos.invoices.delete, invoice_id,
+                            on_done=lambda _: self.load_invoices(), on_error=self.on_db_error, indicator=self.loading)
@@ -0,0 +1,131 @@
+import time
+import datetime
+import logging
+from catalog import catalog_for
+
+# Line kinds and the catalog table each one references.
+ITEM_TABLES = {"product": "products", "service": "services"}
+# The lines of one invoice, read through idx_invoice_items_invoice.
+LINES_QUERY = "SELECT product_id, service_id, quantity, unit_price FROM invoice_items WHERE invoice_id = ?"
+
+
+def today():
+    # Same day as SQLite's date('now'), which the rest of the schema uses.
+    return datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+
+
+def next_invoice_id(conn):
+    # Never reuse an id AUTOINCREMENT has already handed out.
+    return conn.execute('''
+        SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'invoices'), 0),
+                   COALESCE((SELECT MAX(id) FROM invoices), 0)) + 1
+    ''').fetchone()[0]
+
+
+def create_invoice(db, client_id, items, date=None):
+    """Create one invoice from (kind, item_id, quantity) lines and return its id."""
+    return create_invoices_bulk(db, [(client_id, items, date)])[0]
+
+
+def create_invoices_bulk(db, invoices):
+    """Create invoices from (client_id, items, date) tuples in a single transaction.
+
+    `items` holds (kind, item_id, quantity) lines, kind being "product" or
+    "service". Prices come from the shared catalog cache and totals are
+    computed here, so callers never pass amounts. Invoices and lines are each
+    written with one executemany; nothing is written if any invoice is
+    invalid. Returns the new invoice ids in order.
+    """
+    invoices = list(invoices)
+    if not invoices:
+        return []
+    started = time.perf_counter()
+    ids_by_kind = {kind: set() for kind in ITEM_TABLES}
+    for _, items, _ in invoices:
+        if not items:
+            raise ValueError("An invoice needs at least one product or service.")
+        for kind, item_id, quantity in items:
+            if kind not in ITEM_TABLES:
+                raise ValueError(f"Unknown line kind: {kind}")
+            if int(quantity) <= 0:
+                raise ValueError("Quantities must be positive.")
+            ids_by_kind[kind].add(int(item_id))
+
+    invoice_rows, item_rows = db.write(write_invoices, db, invoices, ids_by_kind)
+
+    elapsed = time.perf_counter() - started
+    logging.info(f"Created {len(invoice_rows)} invoices ({len(item_rows)} lines) in {elapsed * 1000:.1f} ms, "
+                 f"{len(invoice_rows) / elapsed:.0f} invoices/s")
+    return [row[0] for row in invoice_rows]
+
+
+def write_invoices(db, invoices, ids_by_kind):
+    """Price and insert validated invoices; runs on the writer thread.
+
+    Returns the (invoice rows, item rows) written.
+    """
+    with db.transaction() as conn:
+        # Read inside the transaction, so prices cannot change before the invoices are written.
+        catalog = catalog_for(db)
+        prices = {kind: catalog.prices(kind, ids) for kind, ids in ids_by_kind.items()}
+        first_id = next_invoice_id(conn)
+        invoice_rows, item_rows = [], []
+        for invoice_id, (client_id, items, date) in enumerate(invoices, start=first_id):
+            total = 0.0
+            for kind, item_id, quantity in items:
+                price = prices[kind].get(int(item_id))
+                if price is None:
+                    raise ValueError(f"There is no {kind} with ID {item_id}.")
+                total += price * int(quantity)
+                item_rows.append((
+                    invoice_id,
+                    int(item_id) if kind == "product" else None,
+                    int(item_id) if kind == "service" else None,
+                    int(quantity),
+                    price,
+                ))
+            invoice_rows.append((invoice_id, client_id, date or today(), round(total, 2)))
+        conn.executemany('''
+            INSERT INTO invoices (id, client_id, date, total_amount) VALUES (?, ?, ?, ?)
+        ''', invoice_rows)
+        conn.executemany('''
+            INSERT INTO invoice_items (invoice_id, product_id, service_id, quantity, unit_price)
+            VALUES (?, ?, ?, ?, ?)
+        ''', item_rows)
+    return invoice_rows, item_rows
+
+
+def load_lines(db, invoice_id):
+    """Return the (kind, item_id, quantity, unit_price) lines of an invoice."""
+    rows = db.fetch_all(LINES_QUERY, (invoice_id,))
+    return [("product", product_id, quantity, price) if product_id is not None
+            else ("service", service_id, quantity, price)
+            for product_id, service_id, quantity, price in rows]
+
+
+def load_catalog(db):
+    """Return [(kind, id, name, price)] for every product and service, for pickers."""
+    catalog = catalog_for(db)
+    return [(item.kind, item.id, item.name, item.price)
+            for kind in ITEM_TABLES for item in catalog.items(kind)]
+
+
+if __name__ == "__main__":
+    import sys
+    from db import Database
+
+    # Bill one line to each of `count` invoices, e.g. a vaccination day. This
+    # writes real invoices, so the database has to be named explicitly.
+    if len(sys.argv) < 2:
+        sys.exit("usage: python invoicing.py DATABASE [COUNT]")
+    db = Database(sys.argv[1])
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    client = db.fetch_one("SELECT id FROM clients LIMIT 1")
+    item = db.fetch_one("SELECT id FROM services LIMIT 1")
+    if client is None or item is None:
+        sys.exit("Needs at least one client and one service.")
+    started = time.perf_counter()
+    create_invoices_bulk(db, [(client[0], [("service", item[0], 1)], None)] * count)
+    elapsed = time.perf_counter() - started
+    print(f"{count} invoices in {elapsed * 1000:.1f} ms ({count / elapsed:.0f} invoices/s)")
+    db.close()
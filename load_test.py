@@ -0,0 +1,170 @@
+"""Load test of the API server with many simulated front-desk clients.
+
+    python load_test.py [--desks N] [--operations N] [--seed N] [DATABASE]
+
+Starts a server on a free localhost port over DATABASE, a fresh temporary
+database by default, runs every desk on its own thread through the same
+client the app uses, then checks that every write made it to the database.
+"""
+import os
+import sys
+import time
+import random
+import secrets
+import asyncio
+import argparse
+import tempfile
+import threading
+import statistics
+from db import Database
+from repositories import Repositories
+from api_server import ApiServer
+from api_client import RemoteRepositories
+
+DESKS = 40
+OPERATIONS = 50
+SEED = 7
+# Relative frequency of each desk operation.
+MIX = {
+    "browse clients": 25,
+    "search clients": 20,
+    "add client": 10,
+    "list invoices": 15,
+    "create invoice": 15,
+    "income report": 5,
+    "dashboard": 10,
+}
+
+
+class ServerThread:
+    """An ApiServer running its own event loop on a background thread."""
+
+    def __init__(self, db, token=None):
+        self.server = ApiServer(db, port=0, token=token)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def start(self):
+        self.loop.run_until_complete(self.server.start())
+        self.thread.start()
+        return f"http://{self.server.host}:{self.server.port}"
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.server.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+def seed_catalog(repos, rng):
+    for index in range(20):
+        repos.products.add(f"Product {index}", round(rng.uniform(5, 80), 2))
+        repos.services.add(f"Service {index}", round(rng.uniform(20, 150), 2))
+    for index in range(200):
+        repos.clients.add(f"Client {index}", f"555-{index:04d}", f"Street {index}")
+
+
+class Desk:
+    """One simulated front desk: a client of its own and a deterministic stream of operations."""
+
+    def __init__(self, url, number, seed, token=None):
+        self.repos = RemoteRepositories(url, token=token)
+        self.number = number
+        self.rng = random.Random(seed * 1000 + number)
+        self.timings = {name: [] for name in MIX}
+        self.errors = []
+        self.clients_added = 0
+        self.invoices_created = 0
+
+    def run(self, operations):
+        names, weights = list(MIX), list(MIX.values())
+        catalog = self.repos.invoices.catalog()
+        for _ in range(operations):
+            name = self.rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                self.perform(name, catalog)
+            except Exception as e:
+                self.errors.append(f"desk {self.number} {name}: {type(e).__name__}: {e}")
+                continue
+            self.timings[name].append((time.perf_counter() - started) * 1000)
+        self.repos.client.close()
+
+    def perform(self, name, catalog):
+        repos, rng = self.repos, self.rng
+        if name == "browse clients":
+            anchor = repos.clients.page_anchor("name", rng.randrange(1, 20), 5)
+            repos.clients.page("name", after=anchor, limit=6)
+        elif name == "search clients":
+            repos.clients.search(f"Client {rng.randrange(100)}"[:rng.choice((2, 8))])
+        elif name == "add client":
+            repos.clients.add(f"Desk {self.number} client {self.clients_added}", "555-0000", "Main street")
+            self.clients_added += 1
+        elif name == "list invoices":
+            repos.invoices.count()
+            repos.invoices.page(0, 20)
+        elif name == "create invoice":
+            kind, item_id, _, _ = rng.choice(catalog)
+            repos.invoices.create(rng.randrange(1, 200), [(kind, item_id, rng.randrange(1, 4))])
+            self.invoices_created += 1
+        elif name == "income report":
+            repos.income.report("2000-01-01", "2100-12-31", rng.choice(("client", "month")))
+        elif name == "dashboard":
+            repos.dashboard.metrics()
+            repos.dashboard.monthly()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the API server on localhost.")
+    parser.add_argument("database", nargs="?")
+    parser.add_argument("--desks", type=int, default=DESKS)
+    parser.add_argument("--operations", type=int, default=OPERATIONS, help="per desk")
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args(argv)
+
+    directory = None
+    path = args.database
+    if path is None:
+        directory = tempfile.TemporaryDirectory()
+        path = os.path.join(directory.name, "load_test.db")
+    db = Database(path)
+    local = Repositories(db)
+    if not local.clients.count():
+        seed_catalog(local, random.Random(args.seed))
+    clients_before, invoices_before = local.clients.count(), local.invoices.count()
+
+    token = secrets.token_hex(16)
+    server = ServerThread(db, token)
+    url = server.start()
+    desks = [Desk(url, number, args.seed, token) for number in range(args.desks)]
+    threads = [threading.Thread(target=desk.run, args=(args.operations,)) for desk in desks]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    server.stop()
+
+    total = sum(len(timings) for desk in desks for timings in desk.timings.values())
+    print(f"{args.desks} desks, {total} operations in {elapsed:.1f} s ({total / elapsed:.0f} ops/s)")
+    print(f"{'operation':<16} {'count':>6} {'p50 ms':>8} {'p95 ms':>8}")
+    for name in MIX:
+        timings = sorted(t for desk in desks for t in desk.timings[name])
+        if timings:
+            print(f"{name:<16} {len(timings):6} {statistics.median(timings):8.1f} {timings[int(0.95 * (len(timings) - 1))]:8.1f}")
+
+    errors = [error for desk in desks for error in desk.errors]
+    lost_clients = clients_before + sum(desk.clients_added for desk in desks) - local.clients.count()
+    lost_invoices = invoices_before + sum(desk.invoices_created for desk in desks) - local.invoices.count()
+    print(f"Errors: {len(errors)}, lost client writes: {lost_clients}, lost invoice writes: {lost_invoices}")
+    for error in errors[:10]:
+        print(f"  {error}")
+    db.close()
+    if directory is not None:
+        directory.cleanup()
+    return 1 if errors or lost_clients or lost_invoices else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
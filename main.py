@@ -1,5 +1,15 @@
+import sys
+import logging
 from ui import Animalium
 
 if __name__ == "__main__":
-    app = Animalium()
+    # Log the startup timing report (imports, window, per-tab build times)
+    if "--timing" in sys.argv:
+        logging.basicConfig(level=logging.INFO)
+    # Time every query from the start; the Ctrl+Shift+D panel shows the results
+    # --server http://host:port uses another desk's API server instead of the local database
+    server = sys.argv[sys.argv.index("--server") + 1] if "--server" in sys.argv[:-1] else None
+    # --token TOKEN is the server's API token, ANIMALIUM_API_TOKEN by default
+    token = sys.argv[sys.argv.index("--token") + 1] if "--token" in sys.argv[:-1] else None
+    app = Animalium(profile="--profile" in sys.argv, server=server, token=token)
     app.mainloop()
\ No newline at end of file
@@ -0,0 +1,24 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class MetricsSnapshot:
+    """Dashboard counters as read from the trigger-maintained metrics table."""
+    clients: int = 0
+    products: int = 0
+    services: int = 0
+    invoices: int = 0
+    revenue: float = 0.0
+
+
+def load_metrics(db):
+    """Read every dashboard counter with a single lookup on the metrics table."""
+    values = dict(db.fetch_all(
+        "SELECT key, value FROM metrics WHERE key IN ('clients', 'products', 'services', 'invoices', 'revenue')"))
+    return MetricsSnapshot(
+        clients=int(values.get("clients", 0)),
+        products=int(values.get("products", 0)),
+        services=int(values.get("services", 0)),
+        invoices=int(values.get("invoices", 0)),
+        revenue=float(values.get("revenue", 0.0)),
+    )
@@ -0,0 +1,607 @@
+import sys
+import sqlite3
+import logging
+
+# Ordered schema migrations as (version, description, script). The applied
+# version is stored in the database header (PRAGMA user_version), so each
+# migration runs exactly once per database file. A script is either SQL or a
+# callable taking the open connection.
+MIGRATIONS = [
+    (1, "base schema", '''
+        CREATE TABLE IF NOT EXISTS clients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            phone TEXT,
+            address TEXT
+        );
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            price REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS services (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            price REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS invoices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_id INTEGER NOT NULL REFERENCES clients(id),
+            date TEXT NOT NULL,
+            total_amount REAL NOT NULL
+        );
+    '''),
+    (2, "indexes for invoice date ranges and client lookups", '''
+        CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices(date);
+        -- Also backs the foreign key check when a client is deleted.
+        CREATE INDEX IF NOT EXISTS idx_invoices_client_date ON invoices(client_id, date);
+        -- NOCASE so the default case-insensitive LIKE 'prefix%' can use it.
+        CREATE INDEX IF NOT EXISTS idx_clients_name ON clients(name COLLATE NOCASE);
+    '''),
+    (3, "trigram full-text index over client name, phone and address", '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5(
+            name, phone, address,
+            content='clients', content_rowid='id', tokenize='trigram'
+        );
+        CREATE TRIGGER IF NOT EXISTS clients_fts_insert AFTER INSERT ON clients BEGIN
+            INSERT INTO clients_fts(rowid, name, phone, address)
+            VALUES (new.id, new.name, new.phone, new.address);
+        END;
+        CREATE TRIGGER IF NOT EXISTS clients_fts_delete AFTER DELETE ON clients BEGIN
+            INSERT INTO clients_fts(clients_fts, rowid, name, phone, address)
+            VALUES ('delete', old.id, old.name, old.phone, old.address);
+        END;
+        CREATE TRIGGER IF NOT EXISTS clients_fts_update AFTER UPDATE ON clients BEGIN
+            INSERT INTO clients_fts(clients_fts, rowid, name, phone, address)
+            VALUES ('delete', old.id, old.name, old.phone, old.address);
+            INSERT INTO clients_fts(rowid, name, phone, address)
+            VALUES (new.id, new.name, new.phone, new.address);
+        END;
+        INSERT INTO clients_fts(clients_fts) VALUES ('rebuild');
+    '''),
+    (4, "metrics table with a trigger-maintained client count", '''
+        CREATE TABLE IF NOT EXISTS metrics (
+            key TEXT PRIMARY KEY,
+            value NUMERIC NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+        INSERT OR REPLACE INTO metrics (key, value) SELECT 'clients', COUNT(*) FROM clients;
+        CREATE TRIGGER IF NOT EXISTS metrics_clients_insert AFTER INSERT ON clients BEGIN
+            UPDATE metrics SET value = value + 1 WHERE key = 'clients';
+        END;
+        CREATE TRIGGER IF NOT EXISTS metrics_clients_delete AFTER DELETE ON clients BEGIN
+            UPDATE metrics SET value = value - 1 WHERE key = 'clients';
+        END;
+    '''),
+    (5, "metrics counters for products, services, invoices and revenue", '''
+        INSERT OR REPLACE INTO metrics (key, value) SELECT 'products', COUNT(*) FROM products;
+        INSERT OR REPLACE INTO metrics (key, value) SELECT 'services', COUNT(*) FROM services;
+        INSERT OR REPLACE INTO metrics (key, value) SELECT 'invoices', COUNT(*) FROM invoices;
+        INSERT OR REPLACE INTO metrics (key, value) SELECT 'revenue', COALESCE(SUM(total_amount), 0) FROM invoices;
+        CREATE TRIGGER IF NOT EXISTS metrics_products_insert AFTER INSERT ON products BEGIN
+            UPDATE metrics SET value = value + 1 WHERE key = 'products';
+        END;
+        CREATE TRIGGER IF NOT EXISTS metrics_products_delete AFTER DELETE ON products BEGIN
+            UPDATE metrics SET value = value - 1 WHERE key = 'products';
+        END;
+        CREATE TRIGGER IF NOT EXISTS metrics_services_insert AFTER INSERT ON services BEGIN
+            UPDATE metrics SET value = value + 1 WHERE key = 'services';
+        END;
+        CREATE TRIGGER IF NOT EXISTS metrics_services_delete AFTER DELETE ON services BEGIN
+            UPDATE metrics SET value = value - 1 WHERE key = 'services';
+        END;
+        CREATE TRIGGER IF NOT EXISTS metrics_invoices_insert AFTER INSERT ON invoices BEGIN
+            UPDATE metrics SET value = value + 1 WHERE key = 'invoices';
+            UPDATE metrics SET value = value + new.total_amount WHERE key = 'revenue';
+        END;
+        CREATE TRIGGER IF NOT EXISTS metrics_invoices_delete AFTER DELETE ON invoices BEGIN
+            UPDATE metrics SET value = value - 1 WHERE key = 'invoices';
+            UPDATE metrics SET value = value - old.total_amount WHERE key = 'revenue';
+        END;
+        CREATE TRIGGER IF NOT EXISTS metrics_invoices_update AFTER UPDATE OF total_amount ON invoices BEGIN
+            UPDATE metrics SET value = value - old.total_amount + new.total_amount WHERE key = 'revenue';
+        END;
+    '''),
+    (6, "client creation dates and day/month rollup of invoices and new clients", '''
+        ALTER TABLE clients ADD COLUMN created_at TEXT;
+        CREATE TRIGGER IF NOT EXISTS clients_created_at AFTER INSERT ON clients
+        WHEN new.created_at IS NULL BEGIN
+            UPDATE clients SET created_at = date('now') WHERE id = new.id;
+        END;
+        -- Only searchable columns need re-indexing, not created_at.
+        DROP TRIGGER IF EXISTS clients_fts_update;
+        CREATE TRIGGER clients_fts_update AFTER UPDATE OF name, phone, address ON clients BEGIN
+            INSERT INTO clients_fts(clients_fts, rowid, name, phone, address)
+            VALUES ('delete', old.id, old.name, old.phone, old.address);
+            INSERT INTO clients_fts(rowid, name, phone, address)
+            VALUES (new.id, new.name, new.phone, new.address);
+        END;
+
+        CREATE TABLE IF NOT EXISTS rollup (
+            bucket TEXT NOT NULL,  -- 'day' or 'month'
+            period TEXT NOT NULL,  -- 'YYYY-MM-DD' or 'YYYY-MM'
+            invoices INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            new_clients INTEGER NOT NULL DEFAULT 0,
+            product_units INTEGER NOT NULL DEFAULT 0,
+            service_units INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (bucket, period)
+        ) WITHOUT ROWID;
+        INSERT INTO rollup (bucket, period, invoices, revenue)
+        SELECT 'day', date(date), COUNT(*), SUM(total_amount) FROM invoices GROUP BY date(date);
+        INSERT INTO rollup (bucket, period, invoices, revenue)
+        SELECT 'month', strftime('%Y-%m', date), COUNT(*), SUM(total_amount) FROM invoices GROUP BY strftime('%Y-%m', date);
+
+        CREATE TRIGGER IF NOT EXISTS rollup_invoices_insert AFTER INSERT ON invoices BEGIN
+            INSERT INTO rollup (bucket, period, invoices, revenue)
+            VALUES ('day', date(new.date), 1, new.total_amount),
+                   ('month', strftime('%Y-%m', new.date), 1, new.total_amount)
+            ON CONFLICT (bucket, period) DO UPDATE
+            SET invoices = invoices + excluded.invoices, revenue = revenue + excluded.revenue;
+        END;
+        CREATE TRIGGER IF NOT EXISTS rollup_invoices_delete AFTER DELETE ON invoices BEGIN
+            UPDATE rollup SET invoices = invoices - 1, revenue = revenue - old.total_amount
+            WHERE (bucket = 'day' AND period = date(old.date))
+               OR (bucket = 'month' AND period = strftime('%Y-%m', old.date));
+        END;
+        CREATE TRIGGER IF NOT EXISTS rollup_invoices_update AFTER UPDATE OF date, total_amount ON invoices BEGIN
+            UPDATE rollup SET invoices = invoices - 1, revenue = revenue - old.total_amount
+            WHERE (bucket = 'day' AND period = date(old.date))
+               OR (bucket = 'month' AND period = strftime('%Y-%m', old.date));
+            INSERT INTO rollup (bucket, period, invoices, revenue)
+            VALUES ('day', date(new.date), 1, new.total_amount),
+                   ('month', strftime('%Y-%m', new.date), 1, new.total_amount)
+            ON CONFLICT (bucket, period) DO UPDATE
+            SET invoices = invoices + excluded.invoices, revenue = revenue + excluded.revenue;
+        END;
+        CREATE TRIGGER IF NOT EXISTS rollup_clients_insert AFTER INSERT ON clients BEGIN
+            INSERT INTO rollup (bucket, period, new_clients)
+            VALUES ('day', date(COALESCE(new.created_at, 'now')), 1),
+                   ('month', strftime('%Y-%m', COALESCE(new.created_at, 'now')), 1)
+            ON CONFLICT (bucket, period) DO UPDATE SET new_clients = new_clients + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS rollup_clients_delete AFTER DELETE ON clients
+        WHEN old.created_at IS NOT NULL BEGIN
+            UPDATE rollup SET new_clients = new_clients - 1
+            WHERE (bucket = 'day' AND period = date(old.created_at))
+               OR (bucket = 'month' AND period = strftime('%Y-%m', old.created_at));
+        END;
+    '''),
+    (7, "per-day, per-client income aggregates with a change sequence", '''
+        CREATE TABLE IF NOT EXISTS income_daily (
+            day TEXT NOT NULL,
+            client_id INTEGER NOT NULL,
+            invoices INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            seq INTEGER NOT NULL DEFAULT 0,  -- metrics 'income_seq' at the row's last change
+            PRIMARY KEY (day, client_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_income_daily_seq ON income_daily(seq);
+        INSERT OR REPLACE INTO metrics (key, value) VALUES ('income_seq', 0);
+        INSERT INTO income_daily (day, client_id, invoices, revenue)
+        SELECT date(date), client_id, COUNT(*), SUM(total_amount) FROM invoices GROUP BY date(date), client_id;
+
+        CREATE TRIGGER IF NOT EXISTS income_invoices_insert AFTER INSERT ON invoices BEGIN
+            UPDATE metrics SET value = value + 1 WHERE key = 'income_seq';
+            INSERT INTO income_daily (day, client_id, invoices, revenue, seq)
+            VALUES (date(new.date), new.client_id, 1, new.total_amount,
+                    (SELECT value FROM metrics WHERE key = 'income_seq'))
+            ON CONFLICT (day, client_id) DO UPDATE
+            SET invoices = invoices + 1, revenue = revenue + excluded.revenue, seq = excluded.seq;
+        END;
+        CREATE TRIGGER IF NOT EXISTS income_invoices_delete AFTER DELETE ON invoices BEGIN
+            UPDATE metrics SET value = value + 1 WHERE key = 'income_seq';
+            UPDATE income_daily
+            SET invoices = invoices - 1, revenue = revenue - old.total_amount,
+                seq = (SELECT value FROM metrics WHERE key = 'income_seq')
+            WHERE day = date(old.date) AND client_id = old.client_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS income_invoices_update AFTER UPDATE OF client_id, date, total_amount ON invoices BEGIN
+            UPDATE metrics SET value = value + 1 WHERE key = 'income_seq';
+            UPDATE income_daily
+            SET invoices = invoices - 1, revenue = revenue - old.total_amount,
+                seq = (SELECT value FROM metrics WHERE key = 'income_seq')
+            WHERE day = date(old.date) AND client_id = old.client_id;
+            INSERT INTO income_daily (day, client_id, invoices, revenue, seq)
+            VALUES (date(new.date), new.client_id, 1, new.total_amount,
+                    (SELECT value FROM metrics WHERE key = 'income_seq'))
+            ON CONFLICT (day, client_id) DO UPDATE
+            SET invoices = invoices + 1, revenue = revenue + excluded.revenue, seq = excluded.seq;
+        END;
+    '''),
+    (8, "invoice line items referencing products and services", '''
+        CREATE TABLE IF NOT EXISTS invoice_items (
+            id INTEGER PRIMARY KEY,
+            invoice_id INTEGER NOT NULL REFERENCES invoices(id) ON DELETE CASCADE,
+            product_id INTEGER REFERENCES products(id),
+            service_id INTEGER REFERENCES services(id),
+            quantity INTEGER NOT NULL DEFAULT 1 CHECK (quantity > 0),
+            unit_price REAL NOT NULL,
+            CHECK ((product_id IS NULL) != (service_id IS NULL))
+        );
+        CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice ON invoice_items(invoice_id);
+        -- Back the foreign key checks when a product or service is deleted.
+        CREATE INDEX IF NOT EXISTS idx_invoice_items_product ON invoice_items(product_id);
+        CREATE INDEX IF NOT EXISTS idx_invoice_items_service ON invoice_items(service_id);
+
+        CREATE TRIGGER IF NOT EXISTS rollup_items_insert AFTER INSERT ON invoice_items BEGIN
+            INSERT INTO rollup (bucket, period, product_units, service_units)
+            SELECT bucket, period,
+                   CASE WHEN new.product_id IS NOT NULL THEN new.quantity ELSE 0 END,
+                   CASE WHEN new.service_id IS NOT NULL THEN new.quantity ELSE 0 END
+            FROM (SELECT 'day' AS bucket, date(date) AS period FROM invoices WHERE id = new.invoice_id
+                  UNION ALL
+                  SELECT 'month', strftime('%Y-%m', date) FROM invoices WHERE id = new.invoice_id)
+            WHERE true
+            ON CONFLICT (bucket, period) DO UPDATE
+            SET product_units = product_units + excluded.product_units,
+                service_units = service_units + excluded.service_units;
+        END;
+        -- Lines removed on their own. When the invoice itself is deleted its
+        -- row is already gone here, and rollup_invoice_items_delete has
+        -- accounted for the lines.
+        CREATE TRIGGER IF NOT EXISTS rollup_items_delete AFTER DELETE ON invoice_items BEGIN
+            UPDATE rollup
+            SET product_units = product_units - CASE WHEN old.product_id IS NOT NULL THEN old.quantity ELSE 0 END,
+                service_units = service_units - CASE WHEN old.service_id IS NOT NULL THEN old.quantity ELSE 0 END
+            WHERE (bucket, period) IN (
+                SELECT 'day', date(date) FROM invoices WHERE id = old.invoice_id
+                UNION ALL
+                SELECT 'month', strftime('%Y-%m', date) FROM invoices WHERE id = old.invoice_id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS rollup_invoice_items_delete BEFORE DELETE ON invoices BEGIN
+            UPDATE rollup
+            SET product_units = product_units - (
+                    SELECT COALESCE(SUM(quantity), 0) FROM invoice_items
+                    WHERE invoice_id = old.id AND product_id IS NOT NULL),
+                service_units = service_units - (
+                    SELECT COALESCE(SUM(quantity), 0) FROM invoice_items
+                    WHERE invoice_id = old.id AND service_id IS NOT NULL)
+            WHERE (bucket = 'day' AND period = date(old.date))
+               OR (bucket = 'month' AND period = strftime('%Y-%m', old.date));
+        END;
+    '''),
+    (9, "catalog version stamps bumped on every products and services write", '''
+        INSERT OR IGNORE INTO metrics (key, value) VALUES ('products_version', 0);
+        INSERT OR IGNORE INTO metrics (key, value) VALUES ('services_version', 0);
+        CREATE TRIGGER IF NOT EXISTS products_version_insert AFTER INSERT ON products BEGIN
+            UPDATE metrics SET value = value + 1 WHERE key = 'products_version';
+        END;
+        CREATE TRIGGER IF NOT EXISTS products_version_update AFTER UPDATE ON products BEGIN
+            UPDATE metrics SET value = value + 1 WHERE key = 'products_version';
+        END;
+        CREATE TRIGGER IF NOT EXISTS products_version_delete AFTER DELETE ON products BEGIN
+            UPDATE metrics SET value = value + 1 WHERE key = 'products_version';
+        END;
+        CREATE TRIGGER IF NOT EXISTS services_version_insert AFTER INSERT ON services BEGIN
+            UPDATE metrics SET value = value + 1 WHERE key = 'services_version';
+        END;
+        CREATE TRIGGER IF NOT EXISTS services_version_update AFTER UPDATE ON services BEGIN
+            UPDATE metrics SET value = value + 1 WHERE key = 'services_version';
+        END;
+        CREATE TRIGGER IF NOT EXISTS services_version_delete AFTER DELETE ON services BEGIN
+            UPDATE metrics SET value = value + 1 WHERE key = 'services_version';
+        END;
+    '''),
+    (10, "patients, hematology panels and species reference ranges", '''
+        CREATE TABLE IF NOT EXISTS patients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_id INTEGER REFERENCES clients(id),
+            name TEXT NOT NULL,
+            species TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_patients_client ON patients(client_id);
+        -- One row per complete blood count; analytes not measured are NULL.
+        CREATE TABLE IF NOT EXISTS hematology_panels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id INTEGER NOT NULL REFERENCES patients(id) ON DELETE CASCADE,
+            sampled_at TEXT NOT NULL,
+            rbc REAL, hgb REAL, hct REAL, mcv REAL, mch REAL, mchc REAL,
+            wbc REAL, neutrophils REAL, lymphocytes REAL, monocytes REAL, eosinophils REAL, basophils REAL,
+            plt REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_hematology_panels_sampled ON hematology_panels(sampled_at);
+        CREATE INDEX IF NOT EXISTS idx_hematology_panels_patient ON hematology_panels(patient_id, sampled_at);
+        -- Critical limits are NULL where none applies.
+        CREATE TABLE IF NOT EXISTS reference_ranges (
+            species TEXT NOT NULL,
+            analyte TEXT NOT NULL,
+            low REAL,
+            high REAL,
+            critical_low REAL,
+            critical_high REAL,
+            PRIMARY KEY (species, analyte)
+        ) WITHOUT ROWID;
+        INSERT OR IGNORE INTO reference_ranges (species, analyte, low, high, critical_low, critical_high) VALUES
+            ('canine', 'rbc', 5.5, 8.5, 3, 10),
+            ('canine', 'hgb', 12, 18, 6, 22),
+            ('canine', 'hct', 37, 55, 20, 65),
+            ('canine', 'mcv', 60, 77, NULL, NULL),
+            ('canine', 'mch', 19.5, 24.5, NULL, NULL),
+            ('canine', 'mchc', 32, 36, NULL, NULL),
+            ('canine', 'wbc', 6, 17, 2, 50),
+            ('canine', 'neutrophils', 3, 11.5, 0.5, NULL),
+            ('canine', 'lymphocytes', 1, 4.8, NULL, NULL),
+            ('canine', 'monocytes', 0.15, 1.35, NULL, NULL),
+            ('canine', 'eosinophils', 0.1, 1.25, NULL, NULL),
+            ('canine', 'basophils', 0, 0.1, NULL, NULL),
+            ('canine', 'plt', 200, 500, 50, 1000),
+            ('feline', 'rbc', 5, 10, 3, 12),
+            ('feline', 'hgb', 8, 15, 5, 18),
+            ('feline', 'hct', 24, 45, 15, 55),
+            ('feline', 'mcv', 39, 55, NULL, NULL),
+            ('feline', 'mch', 12.5, 17.5, NULL, NULL),
+            ('feline', 'mchc', 30, 36, NULL, NULL),
+            ('feline', 'wbc', 5.5, 19.5, 2, 50),
+            ('feline', 'neutrophils', 2.5, 12.5, 0.5, NULL),
+            ('feline', 'lymphocytes', 1.5, 7, NULL, NULL),
+            ('feline', 'monocytes', 0, 0.85, NULL, NULL),
+            ('feline', 'eosinophils', 0, 1.5, NULL, NULL),
+            ('feline', 'basophils', 0, 0.2, NULL, NULL),
+            ('feline', 'plt', 300, 800, 50, 1000);
+    '''),
+    (11, "lab_results time series of every analyte by patient and sample time", '''
+        -- Long form of hematology_panels: one row per measured analyte, clustered
+        -- by (patient, analyte, time) so a patient's trend is one index range.
+        CREATE TABLE IF NOT EXISTS lab_results (
+            patient_id INTEGER NOT NULL,
+            analyte TEXT NOT NULL,
+            sampled_at TEXT NOT NULL,
+            value REAL NOT NULL,
+            panel_id INTEGER NOT NULL,
+            PRIMARY KEY (patient_id, analyte, sampled_at)
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER IF NOT EXISTS lab_results_insert AFTER INSERT ON hematology_panels BEGIN
+            INSERT OR REPLACE INTO lab_results (patient_id, analyte, sampled_at, value, panel_id)
+            SELECT new.patient_id, analyte, new.sampled_at, value, new.id FROM (
+                SELECT column1 AS analyte, CASE column1
+                    WHEN 'rbc' THEN new.rbc
+                    WHEN 'hgb' THEN new.hgb
+                    WHEN 'hct' THEN new.hct
+                    WHEN 'mcv' THEN new.mcv
+                    WHEN 'mch' THEN new.mch
+                    WHEN 'mchc' THEN new.mchc
+                    WHEN 'wbc' THEN new.wbc
+                    WHEN 'neutrophils' THEN new.neutrophils
+                    WHEN 'lymphocytes' THEN new.lymphocytes
+                    WHEN 'monocytes' THEN new.monocytes
+                    WHEN 'eosinophils' THEN new.eosinophils
+                    WHEN 'basophils' THEN new.basophils
+                    WHEN 'plt' THEN new.plt
+                END AS value
+                FROM (VALUES ('rbc'), ('hgb'), ('hct'), ('mcv'), ('mch'), ('mchc'), ('wbc'),
+                             ('neutrophils'), ('lymphocytes'), ('monocytes'), ('eosinophils'), ('basophils'), ('plt'))
+            )
+            WHERE value IS NOT NULL;
+        END;
+        CREATE TRIGGER IF NOT EXISTS lab_results_delete AFTER DELETE ON hematology_panels BEGIN
+            DELETE FROM lab_results
+            WHERE patient_id = old.patient_id AND sampled_at = old.sampled_at AND panel_id = old.id
+              AND analyte IN ('rbc', 'hgb', 'hct', 'mcv', 'mch', 'mchc', 'wbc',
+                              'neutrophils', 'lymphocytes', 'monocytes', 'eosinophils', 'basophils', 'plt');
+        END;
+        CREATE TRIGGER IF NOT EXISTS lab_results_update AFTER UPDATE ON hematology_panels BEGIN
+            DELETE FROM lab_results
+            WHERE patient_id = old.patient_id AND sampled_at = old.sampled_at AND panel_id = old.id
+              AND analyte IN ('rbc', 'hgb', 'hct', 'mcv', 'mch', 'mchc', 'wbc',
+                              'neutrophils', 'lymphocytes', 'monocytes', 'eosinophils', 'basophils', 'plt');
+            INSERT OR REPLACE INTO lab_results (patient_id, analyte, sampled_at, value, panel_id)
+            SELECT new.patient_id, analyte, new.sampled_at, value, new.id FROM (
+                SELECT column1 AS analyte, CASE column1
+                    WHEN 'rbc' THEN new.rbc
+                    WHEN 'hgb' THEN new.hgb
+                    WHEN 'hct' THEN new.hct
+                    WHEN 'mcv' THEN new.mcv
+                    WHEN 'mch' THEN new.mch
+                    WHEN 'mchc' THEN new.mchc
+                    WHEN 'wbc' THEN new.wbc
+                    WHEN 'neutrophils' THEN new.neutrophils
+                    WHEN 'lymphocytes' THEN new.lymphocytes
+                    WHEN 'monocytes' THEN new.monocytes
+                    WHEN 'eosinophils' THEN new.eosinophils
+                    WHEN 'basophils' THEN new.basophils
+                    WHEN 'plt' THEN new.plt
+                END AS value
+                FROM (VALUES ('rbc'), ('hgb'), ('hct'), ('mcv'), ('mch'), ('mchc'), ('wbc'),
+                             ('neutrophils'), ('lymphocytes'), ('monocytes'), ('eosinophils'), ('basophils'), ('plt'))
+            )
+            WHERE value IS NOT NULL;
+        END;
+
+        INSERT OR REPLACE INTO lab_results (patient_id, analyte, sampled_at, value, panel_id)
+        SELECT patient_id, analyte, sampled_at, value, id FROM (
+            SELECT p.patient_id, p.sampled_at, p.id, a.column1 AS analyte, CASE a.column1
+                WHEN 'rbc' THEN p.rbc
+                WHEN 'hgb' THEN p.hgb
+                WHEN 'hct' THEN p.hct
+                WHEN 'mcv' THEN p.mcv
+                WHEN 'mch' THEN p.mch
+                WHEN 'mchc' THEN p.mchc
+                WHEN 'wbc' THEN p.wbc
+                WHEN 'neutrophils' THEN p.neutrophils
+                WHEN 'lymphocytes' THEN p.lymphocytes
+                WHEN 'monocytes' THEN p.monocytes
+                WHEN 'eosinophils' THEN p.eosinophils
+                WHEN 'basophils' THEN p.basophils
+                WHEN 'plt' THEN p.plt
+            END AS value
+            FROM hematology_panels AS p
+            CROSS JOIN (VALUES ('rbc'), ('hgb'), ('hct'), ('mcv'), ('mch'), ('mchc'), ('wbc'),
+                               ('neutrophils'), ('lymphocytes'), ('monocytes'), ('eosinophils'), ('basophils'), ('plt')) AS a
+        )
+        WHERE value IS NOT NULL
+        ORDER BY id;
+    '''),
+    (12, "client names version stamp bumped when a client is renamed", '''
+        INSERT OR IGNORE INTO metrics (key, value) VALUES ('client_names_version', 0);
+        CREATE TRIGGER IF NOT EXISTS client_names_version_update AFTER UPDATE OF name ON clients
+        WHEN new.name IS NOT old.name BEGIN
+            UPDATE metrics SET value = value + 1 WHERE key = 'client_names_version';
+        END;
+    '''),
+    (13, "move an invoice's product and service units with it when its date changes", '''
+        CREATE TRIGGER IF NOT EXISTS rollup_items_invoice_date AFTER UPDATE OF date ON invoices
+        WHEN new.date IS NOT old.date BEGIN
+            UPDATE rollup
+            SET product_units = product_units - (
+                    SELECT COALESCE(SUM(quantity), 0) FROM invoice_items
+                    WHERE invoice_id = old.id AND product_id IS NOT NULL),
+                service_units = service_units - (
+                    SELECT COALESCE(SUM(quantity), 0) FROM invoice_items
+                    WHERE invoice_id = old.id AND service_id IS NOT NULL)
+            WHERE (bucket = 'day' AND period = date(old.date))
+               OR (bucket = 'month' AND period = strftime('%Y-%m', old.date));
+            INSERT INTO rollup (bucket, period, product_units, service_units)
+            SELECT bucket, period, products, services
+            FROM (SELECT 'day' AS bucket, date(new.date) AS period
+                  UNION ALL
+                  SELECT 'month', strftime('%Y-%m', new.date))
+            CROSS JOIN (SELECT COALESCE(SUM(CASE WHEN product_id IS NOT NULL THEN quantity END), 0) AS products,
+                               COALESCE(SUM(CASE WHEN service_id IS NOT NULL THEN quantity END), 0) AS services
+                        FROM invoice_items WHERE invoice_id = new.id)
+            WHERE true
+            ON CONFLICT (bucket, period) DO UPDATE
+            SET product_units = product_units + excluded.product_units,
+                service_units = service_units + excluded.service_units;
+        END;
+    '''),
+    (14, "panel id in the lab_results key, so panels sampled at the same minute keep their results", '''
+        -- Rebuilt from hematology_panels: with the old key a second panel at the
+        -- same minute replaced the first one's rows.
+        DROP TRIGGER IF EXISTS lab_results_insert;
+        DROP TRIGGER IF EXISTS lab_results_delete;
+        DROP TRIGGER IF EXISTS lab_results_update;
+        DROP TABLE IF EXISTS lab_results;
+        CREATE TABLE lab_results (
+            patient_id INTEGER NOT NULL,
+            analyte TEXT NOT NULL,
+            sampled_at TEXT NOT NULL,
+            value REAL NOT NULL,
+            panel_id INTEGER NOT NULL,
+            PRIMARY KEY (patient_id, analyte, sampled_at, panel_id)
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER lab_results_insert AFTER INSERT ON hematology_panels BEGIN
+            INSERT INTO lab_results (patient_id, analyte, sampled_at, value, panel_id)
+            SELECT new.patient_id, analyte, new.sampled_at, value, new.id FROM (
+                SELECT column1 AS analyte, CASE column1
+                    WHEN 'rbc' THEN new.rbc
+                    WHEN 'hgb' THEN new.hgb
+                    WHEN 'hct' THEN new.hct
+                    WHEN 'mcv' THEN new.mcv
+                    WHEN 'mch' THEN new.mch
+                    WHEN 'mchc' THEN new.mchc
+                    WHEN 'wbc' THEN new.wbc
+                    WHEN 'neutrophils' THEN new.neutrophils
+                    WHEN 'lymphocytes' THEN new.lymphocytes
+                    WHEN 'monocytes' THEN new.monocytes
+                    WHEN 'eosinophils' THEN new.eosinophils
+                    WHEN 'basophils' THEN new.basophils
+                    WHEN 'plt' THEN new.plt
+                END AS value
+                FROM (VALUES ('rbc'), ('hgb'), ('hct'), ('mcv'), ('mch'), ('mchc'), ('wbc'),
+                             ('neutrophils'), ('lymphocytes'), ('monocytes'), ('eosinophils'), ('basophils'), ('plt'))
+            )
+            WHERE value IS NOT NULL;
+        END;
+        CREATE TRIGGER lab_results_delete AFTER DELETE ON hematology_panels BEGIN
+            DELETE FROM lab_results
+            WHERE patient_id = old.patient_id AND sampled_at = old.sampled_at AND panel_id = old.id
+              AND analyte IN ('rbc', 'hgb', 'hct', 'mcv', 'mch', 'mchc', 'wbc',
+                              'neutrophils', 'lymphocytes', 'monocytes', 'eosinophils', 'basophils', 'plt');
+        END;
+        CREATE TRIGGER lab_results_update AFTER UPDATE ON hematology_panels BEGIN
+            DELETE FROM lab_results
+            WHERE patient_id = old.patient_id AND sampled_at = old.sampled_at AND panel_id = old.id
+              AND analyte IN ('rbc', 'hgb', 'hct', 'mcv', 'mch', 'mchc', 'wbc',
+                              'neutrophils', 'lymphocytes', 'monocytes', 'eosinophils', 'basophils', 'plt');
+            INSERT INTO lab_results (patient_id, analyte, sampled_at, value, panel_id)
+            SELECT new.patient_id, analyte, new.sampled_at, value, new.id FROM (
+                SELECT column1 AS analyte, CASE column1
+                    WHEN 'rbc' THEN new.rbc
+                    WHEN 'hgb' THEN new.hgb
+                    WHEN 'hct' THEN new.hct
+                    WHEN 'mcv' THEN new.mcv
+                    WHEN 'mch' THEN new.mch
+                    WHEN 'mchc' THEN new.mchc
+                    WHEN 'wbc' THEN new.wbc
+                    WHEN 'neutrophils' THEN new.neutrophils
+                    WHEN 'lymphocytes' THEN new.lymphocytes
+                    WHEN 'monocytes' THEN new.monocytes
+                    WHEN 'eosinophils' THEN new.eosinophils
+                    WHEN 'basophils' THEN new.basophils
+                    WHEN 'plt' THEN new.plt
+                END AS value
+                FROM (VALUES ('rbc'), ('hgb'), ('hct'), ('mcv'), ('mch'), ('mchc'), ('wbc'),
+                             ('neutrophils'), ('lymphocytes'), ('monocytes'), ('eosinophils'), ('basophils'), ('plt'))
+            )
+            WHERE value IS NOT NULL;
+        END;
+
+        INSERT INTO lab_results (patient_id, analyte, sampled_at, value, panel_id)
+        SELECT patient_id, analyte, sampled_at, value, id FROM (
+            SELECT p.patient_id, p.sampled_at, p.id, a.column1 AS analyte, CASE a.column1
+                WHEN 'rbc' THEN p.rbc
+                WHEN 'hgb' THEN p.hgb
+                WHEN 'hct' THEN p.hct
+                WHEN 'mcv' THEN p.mcv
+                WHEN 'mch' THEN p.mch
+                WHEN 'mchc' THEN p.mchc
+                WHEN 'wbc' THEN p.wbc
+                WHEN 'neutrophils' THEN p.neutrophils
+                WHEN 'lymphocytes' THEN p.lymphocytes
+                WHEN 'monocytes' THEN p.monocytes
+                WHEN 'eosinophils' THEN p.eosinophils
+                WHEN 'basophils' THEN p.basophils
+                WHEN 'plt' THEN p.plt
+            END AS value
+            FROM hematology_panels AS p
+            CROSS JOIN (VALUES ('rbc'), ('hgb'), ('hct'), ('mcv'), ('mch'), ('mchc'), ('wbc'),
+                               ('neutrophils'), ('lymphocytes'), ('monocytes'), ('eosinophils'), ('basophils'), ('plt')) AS a
+        )
+        WHERE value IS NOT NULL;
+    '''),
+]
+
+def statements(script):
+    """Split an SQL script into complete statements, keeping trigger bodies whole."""
+    buffer = ""
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            if buffer.strip():
+                yield buffer.strip()
+            buffer = ""
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db):
+    """Apply every pending migration inside a single transaction."""
+    with db.transaction() as conn:
+        version = schema_version(conn)
+        for number, description, script in MIGRATIONS:
+            if number <= version:
+                continue
+            logging.info(f"Applying migration {number}: {description}")
+            if callable(script):
+                script(conn)
+            else:
+                for statement in statements(script):
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {number}")
+            version = number
+    return version
+
+
+if __name__ == "__main__":
+    from db import Database, DB_PATH
+
+    db = Database(sys.argv[1] if len(sys.argv) > 1 else DB_PATH)
+    # Opening the database applies any pending migration
+    print(f"Schema version: {schema_version(db.connection())}")
+    db.close()
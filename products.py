@@ -1,10 +1,15 @@
 import ttkbootstrap as ttk
-from tkinter import messagebox
+import logging
+from tkinter import messagebox, filedialog
+from widgets import BoundTreeview
+from importer import import_file, summary, FILE_TYPES
 
 class ProductsTab(ttk.Frame):
-    def __init__(self, parent, db):
+    def __init__(self, parent, repos, executor):
         super().__init__(parent)
-        self.db = db
+        self.repos = repos
+        self.db = repos.db  # None when the data is served by the API server
+        self.executor = executor
         self.create_products_tab()
 
     def create_products_tab(self):
@@ -22,13 +27,18 @@ class ProductsTab(ttk.Frame):
         self.add_product_button = ttk.Button(product_form_frame, text="Add Product", command=self.add_product)
         self.add_product_button.grid(row=2, column=0, columnspan=2)
 
+        self.import_products_button = ttk.Button(product_form_frame, text="Import Products", command=self.import_products,
+                                                 state="normal" if self.db is not None else "disabled")
+        self.import_products_button.grid(row=3, column=0, columnspan=2, pady=5)
+
         product_table_frame = ttk.LabelFrame(self, text="Product List")
         product_table_frame.grid(row=0, column=1, padx=10, pady=10, sticky="nsew")
 
-        self.product_listbox = ttk.Treeview(product_table_frame, columns=("Name", "Price"), show="headings")
+        self.product_listbox = BoundTreeview(product_table_frame, columns=("Name", "Price"))
         self.product_listbox.grid(row=0, column=0)
         self.product_listbox.heading("Name", text="Name")
         self.product_listbox.heading("Price", text="Price")
+        self.product_listbox.bind("<<TreeviewSelect>>", self.on_product_selected)
         self.load_products()
 
         self.edit_product_button = ttk.Button(product_table_frame, text="Edit Product", command=self.edit_product)
@@ -38,11 +48,14 @@ class ProductsTab(ttk.Frame):
         self.delete_product_button.grid(row=2, column=0, sticky="ew")
 
     def load_products(self):
-        for row in self.product_listbox.get_children():
-            self.product_listbox.delete(row)
-        products = self.db.fetch_all("SELECT * FROM products")
-        for product in products:
-            self.product_listbox.insert("", "end", values=(product[1], product[2]))
+        # Served from the shared catalog, re-read only after products changed;
+        # only rows that differ from the list are redrawn
+        self.executor.read(self.repos.products.items, on_done=self.product_listbox.set_rows,
+                           on_error=self.on_db_error, key="products.list")
+
+    def on_db_error(self, error):
+        logging.error(f"Database error: {error}")
+        messagebox.showerror("Error", f"Database operation failed: {error}")
 
     def add_product(self):
         name = self.product_name_entry.get()
@@ -50,28 +63,54 @@ class ProductsTab(ttk.Frame):
         if not name or not price:
             messagebox.showerror("Error", "Product name and price are required.")
             return
-        self.db.execute_query("INSERT INTO products (name, price) VALUES (?, ?)", (name, float(price)))
+        self.executor.write(self.repos.products.add, name, price,
+                            on_done=self.on_product_saved, on_error=self.on_db_error)
+
+    def on_product_saved(self, _):
         self.product_name_entry.delete(0, "end")
         self.product_price_entry.delete(0, "end")
         self.load_products()
 
+    def import_products(self):
+        path = filedialog.askopenfilename(title="Import products", filetypes=FILE_TYPES)
+        if path:
+            # On a reader thread: the file is read there and each chunk is queued as its own write
+            self.executor.read(import_file, self.db, path, "products",
+                               on_done=self.on_products_imported, on_error=self.on_import_error)
+
+    def on_products_imported(self, result):
+        self.load_products()
+        messagebox.showinfo("Import", summary(result))
+
+    def on_import_error(self, error):
+        messagebox.showerror("Error", f"Import failed: {error}")
+
+    def on_product_selected(self, event):
+        product_data = self.product_listbox.selected_values()
+        if product_data:
+            self.product_name_entry.delete(0, "end")
+            self.product_name_entry.insert(0, product_data[0])
+            self.product_price_entry.delete(0, "end")
+            self.product_price_entry.insert(0, product_data[1])
+
     def edit_product(self):
-        selected_item = self.product_listbox.selection()
-        if not selected_item:
+        product_id = self.product_listbox.selected_key()
+        if product_id is None:
             messagebox.showerror("Error", "Select a product to edit.")
             return
-        product_data = self.product_listbox.item(selected_item)['values']
-        self.product_name_entry.delete(0, "end")
-        self.product_name_entry.insert(0, product_data[0])
-        self.product_price_entry.delete(0, "end")
-        self.product_price_entry.insert(0, product_data[1])
-        self.delete_product()  # Remove the old entry after editing
+        name = self.product_name_entry.get()
+        price = self.product_price_entry.get()
+        if not name or not price:
+            messagebox.showerror("Error", "Product name and price are required.")
+            return
+        self.executor.write(self.repos.products.update, product_id, name, price,
+                            on_done=self.on_product_saved, on_error=self.on_db_error)
 
     def delete_product(self):
-        selected_item = self.product_listbox.selection()
-        if not selected_item:
+        product_id = self.product_listbox.selected_key()
+        if product_id is None:
             messagebox.showerror("Error", "Select a product to delete.")
             return
-        product_data = self.product_listbox.item(selected_item)['values']
-        self.db.execute_query("DELETE FROM products WHERE name=? AND price=?", (product_data[0], product_data[1]))
-        self.load_products()
\ No newline at end of file
+        # Refused with an InUseError while the product is billed on invoices
+        self.executor.write(self.repos.products.delete, product_id,
+                            on_done=lambda _: self.load_products(), on_error=self.on_db_error)
@@ -0,0 +1,229 @@
+import os
+import re
+import sys
+import json
+import time
+import bisect
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Upper bounds of the latency histogram buckets, in milliseconds; the last bucket is open.
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+# Statements slower than this are written to the slow-query log with their plan.
+SLOW_MS = 100
+SLOW_LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "slow_queries.log")
+
+# Modules and packages whose frames are plumbing, not callers: the tag names the first frame outside them.
+PLUMBING = {"db", "executor", "profiler", "threading", "concurrent.futures", "contextlib", "pandas"}
+
+_whitespace = re.compile(r"\s+")
+_context = threading.local()
+
+
+def normalize(query):
+    """Collapse whitespace so the same statement is counted once however it is indented."""
+    return _whitespace.sub(" ", query).strip()
+
+
+def is_plumbing(module):
+    return any(module == name or module.startswith(name + ".") for name in PLUMBING)
+
+
+def caller_tag():
+    """'module.Qualified.name' of the first frame outside the database plumbing."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not is_plumbing(module):
+            return f"{module}.{frame.f_code.co_qualname}"
+        frame = frame.f_back
+    return "unknown"
+
+
+def current_caller():
+    """The caller set by calling_from() on this thread, else the caller_tag()."""
+    return getattr(_context, "caller", None) or caller_tag()
+
+
+@contextmanager
+def calling_from(caller):
+    """Attribute the statements run on this thread inside the block to `caller`.
+
+    For work handed to another thread, whose own stack no longer shows who
+    asked for it. None leaves the attribution as it is.
+    """
+    if caller is None:
+        yield
+        return
+    previous = getattr(_context, "caller", None)
+    _context.caller = caller
+    try:
+        yield
+    finally:
+        _context.caller = previous
+
+
+class QueryStats:
+    """Latency histogram, row count and totals of one statement from one caller.
+
+    rows is None when the statement ran through a cursor that was read
+    after the timing stopped, so its row count is not known.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, elapsed_ms, rows):
+        self.calls += 1
+        if rows is None or self.rows is None:
+            self.rows = None
+        else:
+            self.rows += rows
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.buckets[bisect.bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of calls; the max for the open bucket."""
+        wanted = fraction * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= wanted:
+                return BUCKETS_MS[index] if index < len(BUCKETS_MS) else self.max_ms
+        return 0.0
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "rows": self.rows,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": self.buckets,
+        }
+
+
+class QueryProfiler:
+    """Per-statement timings collected by a Database when profiling is on.
+
+    Statements are keyed by their normalised SQL and the tab method or
+    function that issued them, set by calling_from() or found by walking the
+    stack past the plumbing. Any statement slower than `slow_ms` is appended
+    to the slow-query log together with its EXPLAIN QUERY PLAN, taken on the
+    same connection.
+    """
+
+    def __init__(self, slow_ms=SLOW_MS, slow_log_path=SLOW_LOG_PATH):
+        self.slow_ms = slow_ms
+        self.slow_log_path = slow_log_path
+        self.stats = {}  # (query, caller) -> QueryStats
+        self.slow = []  # Slow-log entries of this run, newest last
+        self.started = time.time()
+        self.lock = threading.Lock()  # Statements are recorded from every reader and the writer
+
+    def record(self, conn, query, params, elapsed, rows):
+        elapsed_ms = elapsed * 1000
+        query = normalize(query)
+        caller = current_caller()
+        with self.lock:
+            stats = self.stats.get((query, caller))
+            if stats is None:
+                stats = self.stats[(query, caller)] = QueryStats()
+            stats.add(elapsed_ms, rows)
+        if elapsed_ms >= self.slow_ms:
+            self.log_slow(conn, query, params, elapsed_ms, rows, caller)
+
+    def log_slow(self, conn, query, params, elapsed_ms, rows, caller):
+        entry = {
+            "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "caller": caller,
+            "ms": round(elapsed_ms, 3),
+            "rows": rows,
+            "query": query,
+            "plan": query_plan(conn, query, params),
+        }
+        with self.lock:
+            self.slow.append(entry)
+            try:
+                with open(self.slow_log_path, "a", encoding="utf-8") as log:
+                    log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            except OSError as e:
+                logging.error(f"Failed to write slow query log: {e}")
+        logging.warning(f"Slow query ({elapsed_ms:.1f} ms) from {caller}: {query}")
+
+    def top(self, limit=None, by="total_ms"):
+        """[(query, caller, stats dict)] ordered by `by`, largest first."""
+        with self.lock:
+            rows = [(query, caller, stats.to_dict()) for (query, caller), stats in self.stats.items()]
+        rows.sort(key=lambda row: row[2][by], reverse=True)
+        return rows[:limit]
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+            self.slow.clear()
+            self.started = time.time()
+
+    def to_dict(self):
+        with self.lock:
+            slow = list(self.slow)
+        return {
+            "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+            "seconds": round(time.time() - self.started, 1),
+            "slow_ms": self.slow_ms,
+            "buckets_ms": BUCKETS_MS,
+            "queries": [dict(query=query, caller=caller, **stats) for query, caller, stats in self.top()],
+            "slow": slow,
+        }
+
+    def export_json(self, path):
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump(self.to_dict(), handle, ensure_ascii=False, indent=1)
+        logging.info(f"Exported query stats to {path}")
+
+
+def query_plan(conn, query, params):
+    """The EXPLAIN QUERY PLAN details of a statement, or the error that prevented it."""
+    try:
+        # Through the base class, so the plan query itself is not profiled
+        return [row[3] for row in sqlite3.Connection.execute(conn, f"EXPLAIN QUERY PLAN {query}", params)]
+    except Exception as e:
+        return [f"unavailable: {e}"]
+
+
+def format_rows(rows):
+    """A row count for display; None means the count is unknown."""
+    return "?" if rows is None else str(rows)
+
+
+def compare(before, after, limit=20):
+    """Lines comparing the total time and rows of each (query, caller) in two exported stats files."""
+    def totals(stats):
+        return {(row["caller"], row["query"]): row for row in stats["queries"]}
+
+    old, new = totals(before), totals(after)
+    changes = []
+    for key in old.keys() | new.keys():
+        was, now = old.get(key, {}), new.get(key, {})
+        was_ms, now_ms = was.get("total_ms", 0.0), now.get("total_ms", 0.0)
+        changes.append((now_ms - was_ms, was_ms, now_ms, was.get("rows", 0), now.get("rows", 0), key))
+    changes.sort(key=lambda change: abs(change[0]), reverse=True)
+    return [f"{delta:+10.1f} ms  {was:10.1f} -> {now:10.1f}  "
+            f"{format_rows(was_rows):>8} -> {format_rows(now_rows):<8} rows  {caller}: {query[:80]}"
+            for delta, was, now, was_rows, now_rows, (caller, query) in changes[:limit]]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python profiler.py BEFORE.json AFTER.json")
+    with open(sys.argv[1], encoding="utf-8") as before, open(sys.argv[2], encoding="utf-8") as after:
+        print("\n".join(compare(json.load(before), json.load(after))))
@@ -0,0 +1,122 @@
+import datetime
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+# ISO 8601 week of d.day as 'YYYY-Www'. Weeks start on Monday and belong to
+# the year of their Thursday, so a week crossing New Year stays whole.
+ISO_WEEK = ("strftime('%Y', date(d.day, '-3 days', 'weekday 4')) || '-W' || "
+            "printf('%02d', (strftime('%j', date(d.day, '-3 days', 'weekday 4')) - 1) / 7 + 1)")
+# Period expression and whether rows are split by client, per report grouping.
+GROUPINGS = {
+    "client": (None, True),
+    "week": (ISO_WEEK, False),
+    "month": ("substr(d.day, 1, 7)", False),
+    "client_month": ("substr(d.day, 1, 7)", True),
+    "client_week": (ISO_WEEK, True),
+}
+# Days whose income changed after a given change sequence.
+CHANGED_DAYS_QUERY = "SELECT day FROM income_daily WHERE seq > ?"
+# Reports kept in the cache; the least recently used one goes first.
+CACHE_SIZE = 32
+
+
+@dataclass(frozen=True)
+class IncomeReport:
+    """Income over a date range. Rows are (period, client_id, client_name, invoices, revenue)."""
+    start: str
+    end: str
+    grouping: str
+    rows: tuple
+    total_invoices: int
+    total_revenue: float
+
+
+class IncomeEngine:
+    """Income reports served from the per-day, per-client income_daily table.
+
+    A report reads at most one row per active client per day in the range,
+    whatever the number of invoices. The last CACHE_SIZE reports are cached
+    per (range, grouping) and dropped once an invoice lands on a day inside
+    their range, which is detected through the change sequence the invoices
+    triggers stamp on income_daily rows. Renaming a client drops every
+    report that lists clients.
+    """
+
+    def __init__(self, db, cache_size=CACHE_SIZE):
+        self.db = db
+        self.cache = OrderedDict()  # (start, end, grouping) -> IncomeReport, oldest use first
+        self.cache_size = cache_size
+        self.seq = None  # Change sequence the cache is valid for
+        self.names_version = None  # Client names version the cache is valid for
+        self.lock = threading.Lock()  # Reports are built on reader threads
+
+    def report(self, start, end, grouping="client"):
+        start, end = parse_day(start), parse_day(end)
+        if start > end:
+            raise ValueError("The start date must not be after the end date.")
+        key = (start, end, grouping)
+        with self.lock:
+            self.expire_changed()
+            if key in self.cache:
+                self.cache.move_to_end(key)
+            else:
+                self.cache[key] = self.build(start, end, grouping)
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            return self.cache[key]
+
+    def expire_changed(self):
+        """Drop cached reports made stale since the last check.
+
+        Those are the ones whose range contains a changed day, and after a
+        client rename, the ones listing clients.
+        """
+        stamps = dict(self.db.fetch_all(
+            "SELECT key, value FROM metrics WHERE key IN ('income_seq', 'client_names_version')"))
+        seq, names_version = stamps["income_seq"], stamps["client_names_version"]
+        if self.names_version is not None and names_version != self.names_version:
+            for key in list(self.cache):
+                if GROUPINGS[key[2]][1]:
+                    del self.cache[key]
+        self.names_version = names_version
+        if self.seq is not None and seq != self.seq and self.cache:
+            days = {row[0] for row in self.db.fetch_all(CHANGED_DAYS_QUERY, (self.seq,))}
+            for key in list(self.cache):
+                start, end, _ = key
+                if any(start <= day <= end for day in days):
+                    del self.cache[key]
+        self.seq = seq
+
+    def build(self, start, end, grouping):
+        rows = self.db.fetch_all(report_query(grouping), (start, end))
+        return IncomeReport(
+            start=start,
+            end=end,
+            grouping=grouping,
+            rows=tuple(rows),
+            total_invoices=sum(row[3] for row in rows),
+            total_revenue=sum(row[4] for row in rows),
+        )
+
+
+def report_query(grouping):
+    """SQL for an income report over (start, end) yielding (period, client_id, client_name, invoices, revenue)."""
+    period, by_client = GROUPINGS[grouping]
+    group_by = [expression for expression in (period, "d.client_id" if by_client else None) if expression]
+    return f'''
+        SELECT {period or "NULL"},
+               {"d.client_id, clients.name" if by_client else "NULL, NULL"},
+               SUM(d.invoices), SUM(d.revenue)
+        FROM income_daily AS d
+        {"JOIN clients ON clients.id = d.client_id" if by_client else ""}
+        WHERE d.day BETWEEN ? AND ?
+        GROUP BY {", ".join(group_by)}
+        HAVING SUM(d.invoices) > 0
+        ORDER BY {"1, " if period else ""}5 DESC
+    '''
+
+
+def parse_day(value):
+    """Normalize a typed date to 'YYYY-MM-DD', raising ValueError if it is not a date."""
+    return datetime.date.fromisoformat(value.strip()).isoformat()
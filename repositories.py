@@ -0,0 +1,247 @@
+import sqlite3
+from catalog import catalog_for
+from invoicing import create_invoice, load_catalog, load_lines
+from metrics import load_metrics
+from reports import IncomeEngine
+from rollup import load_monthly_rollup
+from validation import parse_price
+
+CLIENT_COLUMNS = "id, name, phone, address"
+# Keyset orderings for paging. Each key ends with id so it is unique.
+SORT_KEYS = {
+    "id": ("id",),
+    "name": ("name COLLATE NOCASE", "id"),
+}
+# Tables whose client_id references clients and blocks deleting the client.
+CLIENT_REFERENCES = ("invoices", "patients")
+# Maximum number of ranked hits returned by a client search.
+SEARCH_LIMIT = 50
+# The trigram index needs at least three characters to match.
+MIN_FTS_TERM = 3
+# Client search by name prefix, for terms too short for the trigram index.
+SEARCH_PREFIX_QUERY = f"SELECT {CLIENT_COLUMNS} FROM clients WHERE name LIKE ? ORDER BY name COLLATE NOCASE LIMIT ?"
+# Ranked client search through the trigram index.
+SEARCH_FTS_QUERY = '''
+    SELECT clients.id, clients.name, clients.phone, clients.address FROM clients_fts
+    JOIN clients ON clients.id = clients_fts.rowid
+    WHERE clients_fts MATCH ? ORDER BY rank LIMIT ?
+'''
+# How invoice_page_query() picks the invoices of a block, newest first.
+INVOICE_PAGE_SEEKS = {
+    "after": "WHERE id < ? ORDER BY id DESC LIMIT ?",  # (key, limit)
+    "before": "WHERE id > ? ORDER BY id LIMIT ?",  # (key, limit)
+    "offset": "ORDER BY id DESC LIMIT ? OFFSET ?",  # (limit, offset)
+}
+
+
+def page_query(sort_column, after=None, before=None, inclusive=False):
+    """SQL and parameters for a keyset page of clients; the LIMIT is the last parameter, left to the caller."""
+    keys = SORT_KEYS[sort_column]
+    order = ", ".join(keys)
+    bound, descending = (before, True) if before is not None else (after, False)
+    query = f"SELECT {CLIENT_COLUMNS} FROM clients"
+    params = ()
+    if bound is not None:
+        op = "<" if descending else ">"
+        if inclusive:
+            op += "="
+        condition = f"({order}) {op} ({', '.join('?' * len(keys))})"
+        if len(keys) > 1:
+            # Lets SQLite turn the row-value comparison into an index range.
+            condition = f"{keys[0]} {op[0]}= ? AND {condition}"
+            params = (bound[0],)
+        query += f" WHERE {condition}"
+        params += tuple(bound)
+    if descending:
+        order = ", ".join(f"{key} DESC" for key in keys)
+    return query + f" ORDER BY {order} LIMIT ?", params
+
+
+def invoice_page_query(seek):
+    """SQL for a block of the invoice list, found as INVOICE_PAGE_SEEKS[seek] says."""
+    # Page through invoices alone and join only the rows being shown.
+    return f'''
+        SELECT invoices.id, clients.name, invoices.total_amount, invoices.date
+        FROM (SELECT * FROM invoices {INVOICE_PAGE_SEEKS[seek]}) AS invoices
+        JOIN clients ON invoices.client_id = clients.id
+        ORDER BY invoices.id DESC
+    '''
+
+
+def anchor_query(sort_column):
+    """SQL for the sort key of the row at an OFFSET, which a page jump starts after."""
+    keys = SORT_KEYS[sort_column]
+    return f"SELECT {', '.join(key.split()[0] for key in keys)} FROM clients ORDER BY {', '.join(keys)} LIMIT 1 OFFSET ?"
+
+
+class InUseError(ValueError):
+    """A row cannot be deleted because other rows still reference it."""
+
+
+class Repository:
+    """Domain operations on one part of the schema, free of any UI.
+
+    READS and WRITES name the methods that may be called remotely; the API
+    server runs reads on its reader pool and queues writes for the
+    database's writer thread.
+    """
+    READS = ()
+    WRITES = ()
+
+    def __init__(self, db):
+        self.db = db
+
+
+class ClientRepository(Repository):
+    READS = ("page", "page_anchor", "count", "search")
+    WRITES = ("add", "update", "delete")
+
+    def page(self, sort_column="id", after=None, before=None, inclusive=False, limit=5):
+        """Fetch a page of clients by seeking from a sort key instead of using OFFSET.
+
+        Rows come after the `after` key, or just before the `before` key,
+        so any page costs the same as the first one.
+        """
+        query, params = page_query(sort_column, after, before, inclusive)
+        rows = self.db.fetch_all(query, params + (limit,))
+        return rows[::-1] if before is not None else rows
+
+    def page_anchor(self, sort_column, page, per_page):
+        """Return the sort key the given page starts after by seeking the index once."""
+        row = self.db.fetch_one(anchor_query(sort_column), (page * per_page - 1,))
+        return tuple(row) if row is not None else None
+
+    def count(self):
+        """Return the client count kept up to date by the clients triggers."""
+        return self.db.fetch_one("SELECT value FROM metrics WHERE key = 'clients'")[0]
+
+    def search(self, term, limit=SEARCH_LIMIT):
+        """Return up to `limit` clients matching the term, best matches first."""
+        if len(term) < MIN_FTS_TERM:
+            return self.db.fetch_all(SEARCH_PREFIX_QUERY, (term + '%', limit))
+        phrase = '"' + term.replace('"', '""') + '"'
+        return self.db.fetch_all(SEARCH_FTS_QUERY, (phrase, limit))
+
+    def add(self, name, phone, address):
+        return self.db.execute_query(
+            'INSERT INTO clients (name, phone, address) VALUES (?, ?, ?)', (name, phone, address)).lastrowid
+
+    def update(self, client_id, name, phone, address):
+        self.db.execute_query(
+            'UPDATE clients SET name = ?, phone = ?, address = ? WHERE id = ?', (name, phone, address, client_id))
+
+    def delete(self, client_id):
+        try:
+            self.db.execute_query('DELETE FROM clients WHERE id = ?', (client_id,))
+        except sqlite3.IntegrityError:
+            # Say which rows still reference the client
+            holders = [table for table in CLIENT_REFERENCES
+                       if self.db.fetch_one(f"SELECT 1 FROM {table} WHERE client_id = ? LIMIT 1", (client_id,))]
+            raise InUseError(f"This client has {' and '.join(holders) or 'linked records'} and cannot be deleted.")
+
+
+class CatalogRepository(Repository):
+    """Products or services, read through the shared catalog cache."""
+    READS = ("items",)
+    WRITES = ("add", "update", "delete")
+
+    def __init__(self, db, kind, table):
+        super().__init__(db)
+        self.kind = kind
+        self.table = table
+
+    def items(self):
+        """[(id, name, price)] ordered by name."""
+        return [(item.id, item.name, item.price) for item in catalog_for(self.db).items(self.kind)]
+
+    def add(self, name, price):
+        return self.db.execute_query(
+            f"INSERT INTO {self.table} (name, price) VALUES (?, ?)", (name, parse_price(price))).lastrowid
+
+    def update(self, item_id, name, price):
+        self.db.execute_query(f"UPDATE {self.table} SET name=?, price=? WHERE id=?", (name, parse_price(price), item_id))
+
+    def delete(self, item_id):
+        try:
+            self.db.execute_query(f"DELETE FROM {self.table} WHERE id=?", (item_id,))
+        except sqlite3.IntegrityError:
+            raise InUseError(f"This {self.kind} is billed on invoices and cannot be deleted.")
+
+
+class InvoiceRepository(Repository):
+    READS = ("page", "count", "get", "catalog")
+    WRITES = ("create", "delete")
+
+    def page(self, offset, limit, after=None, before=None):
+        """Fetch `limit` invoices, newest first, seeking by id from a neighbouring block.
+
+        Rows come right after the invoice id `after` or right before the id
+        `before`, so scrolling costs the same anywhere in the list. Without
+        either, as on a scrollbar jump, they are found by OFFSET.
+        """
+        if after is not None:
+            return self.db.fetch_all(invoice_page_query("after"), (after, limit))
+        if before is not None:
+            return self.db.fetch_all(invoice_page_query("before"), (before, limit))
+        return self.db.fetch_all(invoice_page_query("offset"), (limit, offset))
+
+    def count(self):
+        return self.db.fetch_one("SELECT value FROM metrics WHERE key = 'invoices'")[0]
+
+    def get(self, invoice_id):
+        """(invoice_id, client_id, lines), client_id being None if the invoice is gone."""
+        client = self.db.fetch_one("SELECT client_id FROM invoices WHERE id = ?", (invoice_id,))
+        return invoice_id, client[0] if client else None, load_lines(self.db, invoice_id)
+
+    def catalog(self):
+        """[(kind, id, name, price)] of everything that can be billed."""
+        return load_catalog(self.db)
+
+    def create(self, client_id, items):
+        return self.db.write(create_invoice, self.db, client_id, [tuple(item) for item in items])
+
+    def delete(self, invoice_id):
+        # Its lines go with it through ON DELETE CASCADE
+        self.db.execute_query("DELETE FROM invoices WHERE id=?", (invoice_id,))
+
+
+class IncomeRepository(Repository):
+    READS = ("report",)
+
+    def __init__(self, db):
+        super().__init__(db)
+        self.engine = IncomeEngine(db)
+
+    def report(self, start, end, grouping="client"):
+        return self.engine.report(start, end, grouping)
+
+
+class DashboardRepository(Repository):
+    READS = ("metrics", "monthly")
+
+    def metrics(self):
+        return load_metrics(self.db)
+
+    def monthly(self, count=12):
+        return load_monthly_rollup(self.db, count)
+
+
+class Repositories:
+    """Every repository over one local Database; what the tabs use for their data.
+
+    `db` is also how tabs reach features that only work against a local
+    database file, such as imports, exports and printing.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.clients = ClientRepository(db)
+        self.products = CatalogRepository(db, "product", "products")
+        self.services = CatalogRepository(db, "service", "services")
+        self.invoices = InvoiceRepository(db)
+        self.income = IncomeRepository(db)
+        self.dashboard = DashboardRepository(db)
+
+    def repositories(self):
+        """{name: repository} of everything the API server exposes."""
+        return {name: repository for name, repository in vars(self).items() if isinstance(repository, Repository)}
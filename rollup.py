@@ -0,0 +1,95 @@
+import datetime
+
+ROLLUP_COLUMNS = ("invoices", "revenue", "new_clients", "product_units", "service_units")
+
+
+def last_months(count=12, today=None):
+    """Return the last `count` months as 'YYYY-MM', oldest first, ending with the current one."""
+    today = today or datetime.date.today()
+    year, month = today.year, today.month
+    months = []
+    for _ in range(count):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return months[::-1]
+
+
+def monthly_series(months, by_period):
+    empty = (0,) * len(ROLLUP_COLUMNS)
+    series = {"months": months}
+    for index, column in enumerate(ROLLUP_COLUMNS):
+        series[column] = [by_period.get(month, empty)[index] for month in months]
+    return series
+
+
+def empty_monthly_rollup(count=12):
+    return monthly_series(last_months(count), {})
+
+
+def load_monthly_rollup(db, count=12):
+    """Return {"months": [...], column: [value per month]} for the last `count` months, zero-filled."""
+    months = last_months(count)
+    rows = db.fetch_all(f'''
+        SELECT period, {", ".join(ROLLUP_COLUMNS)} FROM rollup
+        WHERE bucket = 'month' AND period BETWEEN ? AND ?
+    ''', (months[0], months[-1]))
+    return monthly_series(months, {row[0]: row[1:] for row in rows})
+
+
+def rebuild_rollup(db):
+    """Recompute the whole rollup table from the source tables in one vectorized pass."""
+    return db.write(replace_rollup, db)
+
+
+def replace_rollup(db):
+    # Read and rewrite in one writer transaction, so no invoice lands in between
+    with db.transaction() as conn:
+        rows = rollup_rows(conn)
+        conn.execute("DELETE FROM rollup")
+        conn.executemany(f'''
+            INSERT INTO rollup (bucket, period, {", ".join(ROLLUP_COLUMNS)})
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+    return len(rows)
+
+
+def rollup_rows(conn):
+    """[(bucket, period, *ROLLUP_COLUMNS)] computed from the source tables."""
+    import pandas as pd
+
+    invoices = pd.read_sql_query("SELECT date, total_amount FROM invoices", conn)
+    clients = pd.read_sql_query("SELECT created_at FROM clients WHERE created_at IS NOT NULL", conn)
+    items = pd.read_sql_query('''
+        SELECT invoices.date,
+               CASE WHEN invoice_items.product_id IS NOT NULL THEN invoice_items.quantity ELSE 0 END AS product_units,
+               CASE WHEN invoice_items.service_id IS NOT NULL THEN invoice_items.quantity ELSE 0 END AS service_units
+        FROM invoice_items JOIN invoices ON invoices.id = invoice_items.invoice_id
+    ''', conn)
+
+    invoices["day"] = pd.to_datetime(invoices["date"]).dt.strftime("%Y-%m-%d")
+    clients["day"] = pd.to_datetime(clients["created_at"]).dt.strftime("%Y-%m-%d")
+    items["day"] = pd.to_datetime(items["date"]).dt.strftime("%Y-%m-%d")
+    daily = pd.concat([
+        invoices.groupby("day")["total_amount"].agg(invoices="size", revenue="sum"),
+        clients.groupby("day").size().rename("new_clients"),
+        items.groupby("day")[["product_units", "service_units"]].sum(),
+    ], axis=1).fillna(0)
+    for column in ROLLUP_COLUMNS:
+        if column not in daily:
+            daily[column] = 0
+    daily = daily[list(ROLLUP_COLUMNS)]
+    monthly = daily.groupby(daily.index.str[:7]).sum()
+
+    rows = [("day", period, *values) for period, values in zip(daily.index, daily.itertuples(index=False))]
+    rows += [("month", period, *values) for period, values in zip(monthly.index, monthly.itertuples(index=False))]
+    return [(bucket, period, int(n), float(revenue), int(new), int(products), int(services))
+            for bucket, period, n, revenue, new, products, services in rows]
+
+
+if __name__ == "__main__":
+    import sys
+    from db import Database, DB_PATH
+
+    db = Database(sys.argv[1] if len(sys.argv) > 1 else DB_PATH)
+    print(f"Rebuilt {rebuild_rollup(db)} rollup rows")
+    db.close()
@@ -1,10 +1,15 @@
 import ttkbootstrap as ttk
-from tkinter import messagebox
+import logging
+from tkinter import messagebox, filedialog
+from widgets import BoundTreeview
+from importer import import_file, summary, FILE_TYPES
 
 class ServicesTab(ttk.Frame):
-    def __init__(self, parent, db):
+    def __init__(self, parent, repos, executor):
         super().__init__(parent)
-        self.db = db
+        self.repos = repos
+        self.db = repos.db  # None when the data is served by the API server
+        self.executor = executor
         self.create_services_tab()
 
     def create_services_tab(self):
@@ -22,13 +27,18 @@ class ServicesTab(ttk.Frame):
         self.add_service_button = ttk.Button(service_form_frame, text="Add Service", command=self.add_service)
         self.add_service_button.grid(row=2, column=0, columnspan=2)
 
+        self.import_services_button = ttk.Button(service_form_frame, text="Import Services", command=self.import_services,
+                                                 state="normal" if self.db is not None else "disabled")
+        self.import_services_button.grid(row=3, column=0, columnspan=2, pady=5)
+
         service_table_frame = ttk.LabelFrame(self, text="Service List")
         service_table_frame.grid(row=0, column=1, padx=10, pady=10, sticky="nsew")
 
-        self.service_listbox = ttk.Treeview(service_table_frame, columns=("Name", "Price"), show="headings")
+        self.service_listbox = BoundTreeview(service_table_frame, columns=("Name", "Price"))
         self.service_listbox.grid(row=0, column=0)
         self.service_listbox.heading("Name", text="Name")
         self.service_listbox.heading("Price", text="Price")
+        self.service_listbox.bind("<<TreeviewSelect>>", self.on_service_selected)
         self.load_services()
 
         self.edit_service_button = ttk.Button(service_table_frame, text="Edit Service", command=self.edit_service)
@@ -38,11 +48,14 @@ class ServicesTab(ttk.Frame):
         self.delete_service_button.grid(row=2, column=0, sticky="ew")
 
     def load_services(self):
-        for row in self.service_listbox.get_children():
-            self.service_listbox.delete(row)
-        services = self.db.fetch_all("SELECT * FROM services")
-        for service in services:
-            self.service_listbox.insert("", "end", values=(service[1], service[2]))
+        # Served from the shared catalog, re-read only after services changed;
+        # only rows that differ from the list are redrawn
+        self.executor.read(self.repos.services.items, on_done=self.service_listbox.set_rows,
+                           on_error=self.on_db_error, key="services.list")
+
+    def on_db_error(self, error):
+        logging.error(f"Database error: {error}")
+        messagebox.showerror("Error", f"Database operation failed: {error}")
 
     def add_service(self):
         name = self.service_name_entry.get()
@@ -50,28 +63,54 @@ class ServicesTab(ttk.Frame):
         if not name or not price:
             messagebox.showerror("Error", "Service name and price are required.")
             return
-        self.db.execute_query("INSERT INTO services (name, price) VALUES (?, ?)", (name, float(price)))
+        self.executor.write(self.repos.services.add, name, price,
+                            on_done=self.on_service_saved, on_error=self.on_db_error)
+
+    def on_service_saved(self, _):
         self.service_name_entry.delete(0, "end")
         self.service_price_entry.delete(0, "end")
         self.load_services()
 
+    def import_services(self):
+        path = filedialog.askopenfilename(title="Import services", filetypes=FILE_TYPES)
+        if path:
+            # On a reader thread: the file is read there and each chunk is queued as its own write
+            self.executor.read(import_file, self.db, path, "services",
+                               on_done=self.on_services_imported, on_error=self.on_import_error)
+
+    def on_services_imported(self, result):
+        self.load_services()
+        messagebox.showinfo("Import", summary(result))
+
+    def on_import_error(self, error):
+        messagebox.showerror("Error", f"Import failed: {error}")
+
+    def on_service_selected(self, event):
+        service_data = self.service_listbox.selected_values()
+        if service_data:
+            self.service_name_entry.delete(0, "end")
+            self.service_name_entry.insert(0, service_data[0])
+            self.service_price_entry.delete(0, "end")
+            self.service_price_entry.insert(0, service_data[1])
+
     def edit_service(self):
-        selected_item = self.service_listbox.selection()
-        if not selected_item:
+        service_id = self.service_listbox.selected_key()
+        if service_id is None:
             messagebox.showerror("Error", "Select a service to edit.")
             return
-        service_data = self.service_listbox.item(selected_item)['values']
-        self.service_name_entry.delete(0, "end")
-        self.service_name_entry.insert(0, service_data[0])
-        self.service_price_entry.delete(0, "end")
-        self.service_price_entry.insert(0, service_data[1])
-        self.delete_service()  # Remove the old entry after editing
+        name = self.service_name_entry.get()
+        price = self.service_price_entry.get()
+        if not name or not price:
+            messagebox.showerror("Error", "Service name and price are required.")
+            return
+        self.executor.write(self.repos.services.update, service_id, name, price,
+                            on_done=self.on_service_saved, on_error=self.on_db_error)
 
     def delete_service(self):
-        selected_item = self.service_listbox.selection()
-        if not selected_item:
+        service_id = self.service_listbox.selected_key()
+        if service_id is None:
             messagebox.showerror("Error", "Select a service to delete.")
             return
-        service_data = self.service_listbox.item(selected_item)['values']
-        self.db.execute_query("DELETE FROM services WHERE name=? AND price=?", (service_data[0], service_data[1]))
-        self.load_services()
\ No newline at end of file
+        # Refused with an InUseError while the service is billed on invoices
+        self.executor.write(self.repos.services.delete, service_id,
+                            on_done=lambda _: self.load_services(), on_error=self.on_db_error)
@@ -0,0 +1,110 @@
+"""Soak test of the dashboard: many refreshes with changing data must not grow memory.
+
+    python soak_dashboard.py [--refreshes N] [--warmup N]
+
+Builds the real DashboardTab in a window over a fresh temporary database,
+then adds a client and an invoice before every refresh so each one redraws.
+After the warmup, the Tk widget count and the matplotlib artist count must
+not change, and traced Python memory must stay within MAX_GROWTH_MB.
+Needs a display.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import resource
+import tracemalloc
+import ttkbootstrap as ttk
+from db import Database
+from repositories import Repositories
+from executor import QueryExecutor
+from dashboard import DashboardTab
+
+REFRESHES = 2000
+WARMUP = 100
+# Traced memory allowed to grow between the end of the warmup and the last refresh.
+MAX_GROWTH_MB = 1.0
+
+
+def widget_count(widget):
+    return 1 + sum(widget_count(child) for child in widget.winfo_children())
+
+
+def artist_count(tab):
+    canvases = (tab.service_bar_canvas, tab.service_line_canvas, tab.product_bar_canvas, tab.product_line_canvas)
+    count = 0
+    for canvas in canvases:
+        for axes in canvas.figure.axes:
+            count += len(axes.get_children())
+        count += len(canvas.figure.get_children())
+    return count
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def refresh(root, tab, repos, index, product_id):
+    client_id = repos.clients.add(f"Soak client {index}", "555", "Soak street")
+    repos.invoices.create(client_id, [("product", product_id, 1 + index % 3)])
+    tab.show_dashboard_metrics(tab.fetch_dashboard_data(), tab.update_charts)
+    root.update()  # Runs the idle redraws
+
+
+def sample(root, tab):
+    return widget_count(root), artist_count(tab), tracemalloc.get_traced_memory()[0] / 1024 / 1024, peak_rss_mb()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the dashboard many times and check memory stays flat.")
+    parser.add_argument("--refreshes", type=int, default=REFRESHES)
+    parser.add_argument("--warmup", type=int, default=WARMUP)
+    args = parser.parse_args(argv)
+
+    directory = tempfile.TemporaryDirectory()
+    db = Database(os.path.join(directory.name, "soak.db"))
+    repos = Repositories(db)
+    product_id = repos.products.add("Soak product", 10)
+
+    root = ttk.Window(themename="litera")
+    executor = QueryExecutor(root, db)
+    tab = DashboardTab(root, repos, executor)
+    tab.pack(expand=1, fill="both")
+    root.update()
+
+    started = time.perf_counter()
+    for index in range(args.warmup):
+        refresh(root, tab, repos, index, product_id)
+    tracemalloc.start()
+    before = sample(root, tab)
+    for index in range(args.warmup, args.warmup + args.refreshes):
+        refresh(root, tab, repos, index, product_id)
+    after = sample(root, tab)
+    elapsed = time.perf_counter() - started
+
+    print(f"{args.refreshes} refreshes after {args.warmup} warmup ones in {elapsed:.1f} s")
+    print(f"{'':<16} {'warm':>10} {'end':>10}")
+    for name, first, last in zip(("widgets", "artists", "traced MB", "peak RSS MB"), before, after):
+        print(f"{name:<16} {first:10.1f} {last:10.1f}")
+    failures = []
+    if after[0] != before[0]:
+        failures.append(f"widget count grew from {before[0]} to {after[0]}")
+    if after[1] != before[1]:
+        failures.append(f"artist count grew from {before[1]} to {after[1]}")
+    if after[2] - before[2] > MAX_GROWTH_MB:
+        failures.append(f"traced memory grew by {after[2] - before[2]:.1f} MB")
+    for failure in failures:
+        print(f"FAIL {failure}")
+
+    executor.shutdown()
+    root.destroy()
+    db.close()
+    directory.cleanup()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
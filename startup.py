@@ -0,0 +1,42 @@
+import time
+import logging
+import importlib
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """Collects how long each startup step takes, relative to process start."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.steps = []  # (label, duration in ms)
+
+    @contextmanager
+    def measure(self, label):
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(label, (time.perf_counter() - began) * 1000)
+
+    def record(self, label, duration_ms):
+        self.steps.append((label, duration_ms))
+        logging.info(f"startup: {label} took {duration_ms:.1f} ms")
+
+    def import_module(self, name):
+        """Import a module, timing it the first time it is loaded."""
+        with self.measure(f"import {name}"):
+            return importlib.import_module(name)
+
+    def elapsed(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def report(self, title):
+        lines = [f"{title} after {self.elapsed():.1f} ms"]
+        lines += [f"  {label:<30} {duration:8.1f} ms" for label, duration in self.steps]
+        logging.info("\n".join(lines))
+        return lines
+
+
+# Created on first import of this module, i.e. as early as ui.py can manage.
+timer = StartupTimer()
@@ -0,0 +1,132 @@
+"""Multi-writer stress test of the database write path.
+
+    python stress_writes.py [--processes N] [--threads N] [--writes N] [DATABASE]
+
+Several processes, standing in for app windows and background jobs, each
+run writer threads through execute_query() and a bulk job through
+write() on DATABASE, a fresh temporary database by default, while
+reader threads keep querying. Afterwards every write must be in the
+database and no call may have failed.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from db import Database
+
+PROCESSES = 3
+THREADS = 8
+WRITES = 200
+READERS = 2
+# Rows per transaction of the bulk job, like an import chunk.
+BULK_ROWS = 500
+BULK_BATCHES = 5
+
+
+def insert_batch(db, rows):
+    with db.transaction() as conn:
+        conn.executemany("INSERT INTO clients (name, phone, address) VALUES (?, ?, ?)", rows)
+
+
+def run_process(path, number, threads, writes):
+    """Hammer the database from one process; returns (writes done, errors, batches, queued writes)."""
+    db = Database(path)
+    errors = []
+    done = [0]
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def writer(thread):
+        for index in range(writes):
+            try:
+                db.execute_query("INSERT INTO clients (name, phone, address) VALUES (?, ?, ?)",
+                                 (f"stress {number}-{thread}-{index}", "555", "stress"))
+            except Exception as e:
+                errors.append(f"process {number} writer {thread}: {e}")
+                continue
+            with lock:
+                done[0] += 1
+
+    def bulk_job():
+        for batch in range(BULK_BATCHES):
+            rows = [(f"bulk {number}-{batch}-{index}", "555", "stress") for index in range(BULK_ROWS)]
+            try:
+                db.write(insert_batch, db, rows)
+            except Exception as e:
+                errors.append(f"process {number} bulk job: {e}")
+                continue
+            with lock:
+                done[0] += len(rows)
+
+    def reader():
+        while not stop.is_set():
+            try:
+                db.fetch_all("SELECT id, name FROM clients ORDER BY id DESC LIMIT 20")
+                db.fetch_one("SELECT value FROM metrics WHERE key = 'clients'")
+            except Exception as e:
+                errors.append(f"process {number} reader: {e}")
+
+    writers = [threading.Thread(target=writer, args=(thread,)) for thread in range(threads)]
+    writers.append(threading.Thread(target=bulk_job))
+    readers = [threading.Thread(target=reader) for _ in range(READERS)]
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    stop.set()
+    for thread in readers:
+        thread.join()
+    batches, queued = db.writes.batches, db.writes.writes
+    db.close()
+    return done[0], errors, batches, queued
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stress the database with concurrent writers.")
+    parser.add_argument("database", nargs="?")
+    parser.add_argument("--processes", type=int, default=PROCESSES)
+    parser.add_argument("--threads", type=int, default=THREADS, help="writer threads per process")
+    parser.add_argument("--writes", type=int, default=WRITES, help="per writer thread")
+    args = parser.parse_args(argv)
+
+    directory = None
+    path = args.database
+    if path is None:
+        directory = tempfile.TemporaryDirectory()
+        path = os.path.join(directory.name, "stress.db")
+    db = Database(path)  # Creates the schema before the processes start
+    count = "SELECT COUNT(*) FROM clients WHERE address = 'stress'"
+    before = db.fetch_one(count)[0]
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(args.processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(run_process, path, number, args.threads, args.writes)
+                   for number in range(args.processes)]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+
+    done = sum(result[0] for result in results)
+    errors = [error for result in results for error in result[1]]
+    batches = sum(result[2] for result in results)
+    queued = sum(result[3] for result in results)
+    expected = args.processes * (args.threads * args.writes + BULK_ROWS * BULK_BATCHES)
+    stored = db.fetch_one(count)[0] - before
+    print(f"{args.processes} processes x {args.threads} writers: {done} of {expected} writes "
+          f"in {elapsed:.1f} s ({done / elapsed:.0f}/s)")
+    print(f"{queued} queued writes committed in {batches} transactions "
+          f"({queued / max(batches, 1):.1f} per transaction)")
+    print(f"Stored: {stored}, lost writes: {expected - stored}, errors: {len(errors)}")
+    for error in errors[:10]:
+        print(f"  {error}")
+    db.close()
+    if directory is not None:
+        directory.cleanup()
+    return 1 if errors or stored != expected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""EXPLAIN QUERY PLAN checks: the hot queries the app runs must use their indexes.
+
+    python -m pytest test_query_plans.py
+"""
+import re
+import pytest
+from db import Database
+from hematology import PANELS_QUERY, SERIES_QUERY, PATIENT_SERIES_QUERY
+from invoicing import LINES_QUERY
+from reports import CHANGED_DAYS_QUERY, report_query
+from repositories import SEARCH_PREFIX_QUERY, SEARCH_FTS_QUERY, invoice_page_query, page_query, anchor_query
+
+
+def page_check(caller, sort_column, expected_steps, **bound):
+    query, params = page_query(sort_column, **bound)
+    return caller, query, params + (6,), expected_steps
+
+
+# (caller, query, params, plan steps the query must contain)
+CHECKS = [
+    ("ClientRepository.search (short term)", SEARCH_PREFIX_QUERY, ("an%", 50),
+     ("USING INDEX idx_clients_name",)),
+    ("ClientRepository.search", SEARCH_FTS_QUERY, ('"gomez"', 50),
+     ("clients_fts VIRTUAL TABLE", "clients USING INTEGER PRIMARY KEY")),
+    page_check("ClientRepository.page (by name)", "name", ("SEARCH clients USING INDEX idx_clients_name",),
+               after=("gomez", 10)),
+    page_check("ClientRepository.page (by name, back)", "name", ("SEARCH clients USING INDEX idx_clients_name",),
+               before=("gomez", 10)),
+    page_check("ClientRepository.page (by id)", "id", ("SEARCH clients USING INTEGER PRIMARY KEY",), after=(10,)),
+    ("ClientRepository.page_anchor (by name)", anchor_query("name"), (100,),
+     ("SCAN clients USING COVERING INDEX idx_clients_name",)),
+    ("InvoiceRepository.page (after)", invoice_page_query("after"), (500, 100),
+     ("SEARCH invoices USING INTEGER PRIMARY KEY (rowid<?)", "clients USING INTEGER PRIMARY KEY")),
+    ("InvoiceRepository.page (before)", invoice_page_query("before"), (500, 100),
+     ("SEARCH invoices USING INTEGER PRIMARY KEY (rowid>?)", "clients USING INTEGER PRIMARY KEY")),
+    ("InvoiceRepository.page (offset)", invoice_page_query("offset"), (100, 0), ("clients USING INTEGER PRIMARY KEY",)),
+    ("IncomeEngine.report (by client)", report_query("client"), ("2024-01-01", "2024-12-31"),
+     ("SEARCH d USING PRIMARY KEY (day>? AND day<?)", "clients USING INTEGER PRIMARY KEY")),
+    ("IncomeEngine.report (by month)", report_query("month"), ("2024-01-01", "2024-12-31"),
+     ("SEARCH d USING PRIMARY KEY (day>? AND day<?)",)),
+    ("IncomeEngine.report (by week)", report_query("week"), ("2024-01-01", "2024-12-31"),
+     ("SEARCH d USING PRIMARY KEY (day>? AND day<?)",)),
+    ("IncomeEngine.expire_changed", CHANGED_DAYS_QUERY, (0,), ("USING COVERING INDEX idx_income_daily_seq",)),
+    ("invoicing.load_lines", LINES_QUERY, (1,), ("USING INDEX idx_invoice_items_invoice",)),
+    ("hematology.load_panels", PANELS_QUERY, ("2024-01-01", "2024-01-02"),
+     ("SEARCH p USING INDEX idx_hematology_panels_sampled",)),
+    ("hematology.load_patient_series", PATIENT_SERIES_QUERY, (1,),
+     ("SEARCH lab_results USING PRIMARY KEY (patient_id=?)",)),
+    ("hematology.load_series", SERIES_QUERY, (1, "hct", "2020-01-01", "2030-01-01"),
+     ("SEARCH lab_results USING PRIMARY KEY (patient_id=? AND analyte=? AND sampled_at>? AND sampled_at<?)",)),
+]
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "plans.db"))
+    yield database
+    database.close()
+
+
+def query_plan(db, query, params=()):
+    return [row[3] for row in db.fetch_all("EXPLAIN QUERY PLAN " + query, params)]
+
+
+def trigger_statement(db, name):
+    """The statement in a trigger's body, with old.column references as parameters."""
+    sql = db.fetch_one("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,))[0]
+    body = sql.split("BEGIN", 1)[1].rsplit("END", 1)[0].strip().rstrip(";")
+    return re.sub(r"\bold\.\w+", "?", body)
+
+
+@pytest.mark.parametrize("caller, query, params, expected_steps", CHECKS, ids=[check[0] for check in CHECKS])
+def test_hot_query_uses_index(db, caller, query, params, expected_steps):
+    plan = query_plan(db, query, params)
+    for expected in expected_steps:
+        assert any(expected in step for step in plan), f"{caller}: expected '{expected}', got {plan}"
+
+
+def test_lab_results_delete_trigger_seeks_primary_key(db):
+    query = trigger_statement(db, "lab_results_delete")
+    plan = query_plan(db, query, (1, "2024-01-01", 1))
+    expected = "SEARCH lab_results USING PRIMARY KEY (patient_id=? AND analyte=? AND sampled_at=? AND panel_id=?)"
+    assert any(expected in step for step in plan), plan
+
+
+def test_foreign_keys_are_indexed(db):
+    # Deleting a parent row looks its children up by the child key; without an index that is a full scan
+    tables = [row[0] for row in db.fetch_all(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND sql NOT LIKE 'CREATE VIRTUAL%'")]
+    missing = []
+    for table in tables:
+        leading = {db.fetch_all(f"PRAGMA index_info('{index[1]}')")[0][2]
+                   for index in db.fetch_all(f"PRAGMA index_list('{table}')")}
+        leading |= {column[1] for column in db.fetch_all(f"PRAGMA table_info('{table}')") if column[5] == 1}
+        for foreign_key in db.fetch_all(f"PRAGMA foreign_key_list('{table}')"):
+            if foreign_key[3] not in leading:
+                missing.append(f"{table}.{foreign_key[3]}")
+    assert not missing, f"Foreign keys without an index: {missing}"
@@ -1,51 +1,149 @@
 import os
-import ttkbootstrap as ttk
-from ttkbootstrap.constants import *
-from db import Database
-from dashboard import DashboardTab
-from clients import ClientsTab
-from products import ProductsTab
-from services import ServicesTab
-from invoices import InvoicesTab
-from income import IncomeTab
-from hematology_report import HematReportTab
+from startup import timer
+with timer.measure("import ttkbootstrap"):
+    import ttkbootstrap as ttk
+    from ttkbootstrap.constants import *
+    from ttkbootstrap.toast import ToastNotification
+    from tkinter import messagebox
+with timer.measure("import db, executor"):
+    from db import Database
+    from executor import QueryExecutor
+    from profiler import QueryProfiler
+    from repositories import Repositories
+    from backup import BackupScheduler
+
+# (attribute, module, class, title) of each notebook tab. Tabs are imported and
+# built the first time they are selected.
+TABS = [
+    ("dashboard_tab", "dashboard", "DashboardTab", "Dashboard"),
+    ("clients_tab", "clients", "ClientsTab", "Clientes"),
+    ("products_tab", "products", "ProductsTab", "Productos"),
+    ("services_tab", "services", "ServicesTab", "Servicios"),
+    ("invoices_tab", "invoices", "InvoicesTab", "Facturas"),
+    ("income_tab", "income", "IncomeTab", "Ingresos"),
+    ("hematology_tab", "hematology_report", "HematReportTab", "Informe Hematológico"),
+]
+# Tabs that need the database file itself, left out when the data comes from an API server.
+LOCAL_ONLY_TABS = {"hematology_tab"}
+
+# Delay before building the selected tab, so the window is drawn first.
+BUILD_DELAY_MS = 10
 
 class Animalium(ttk.Window):
-    def __init__(self):
-        super().__init__(themename="litera")
+    def __init__(self, profile=False, server=None, token=None):
+        with timer.measure("create window"):
+            super().__init__(themename="litera")
         self.title("Animalium - Consultorio Veterinario")
         self.state('zoomed')
         logo_path = os.path.join(os.path.dirname(__file__), 'img', 'logo.ico')
         self.iconbitmap(logo_path)
 
-        # Initialize the database
+        # Initialize the database, or connect to the desk that hosts it
+        self.db = None
         try:
-            self.db = Database()
+            with timer.measure("open database"):
+                if server:
+                    from api_client import RemoteRepositories
+                    self.repos = RemoteRepositories(server, token=token)
+                else:
+                    self.db = Database(profiler=QueryProfiler() if profile else None)
+                    self.repos = Repositories(self.db)
         except Exception as e:
             print(f"Error initializing database: {e}")
+            messagebox.showerror("Error", f"Could not open the database: {e}")
             self.destroy()  # Close the application if the database fails to initialize
+            return
+
+        # Run database work off the Tk thread
+        self.executor = QueryExecutor(self, self.db)
 
+        # Daily online backups of the local database, copied alongside normal use
+        self.backups = None
+        if self.db is not None:
+            self.backups = BackupScheduler(self.db.db_path, on_done=self.on_backup_done)
+            self.backups.start()
 
-        # Create tabs
+        # Create an empty page per tab; the real tab is built on first selection
         self.tab_control = ttk.Notebook(self)
-        self.dashboard_tab = DashboardTab(self.tab_control, self.db)
-        self.clients_tab = ClientsTab(self.tab_control, self.db)
-        self.products_tab = ProductsTab(self.tab_control, self.db)
-        self.services_tab = ServicesTab(self.tab_control, self.db)
-        self.invoices_tab = InvoicesTab(self.tab_control, self.db)
-        self.income_tab = IncomeTab(self.tab_control, self.db)
-        self.ih_tab = HematReportTab(self.tab_control, self.db)
-
-        self.tab_control.add(self.dashboard_tab, text="Dashboard")
-        self.tab_control.add(self.clients_tab, text="Clientes")
-        self.tab_control.add(self.products_tab, text="Productos")
-        self.tab_control.add(self.services_tab, text="Servicios")
-        self.tab_control.add(self.invoices_tab, text="Facturas")
-        self.tab_control.add(self.income_tab, text="Ingresos")
-        self.tab_control.add(self.income_tab, text="Informe Hematológico")
+        self.tab_pages = {}  # Page widget name -> tab spec
+        for spec in TABS:
+            attribute, _, _, title = spec
+            if self.db is None and attribute in LOCAL_ONLY_TABS:
+                continue
+            setattr(self, attribute, None)
+            page = ttk.Frame(self.tab_control)
+            self.tab_control.add(page, text=title)
+            self.tab_pages[str(page)] = (page, spec)
 
         self.tab_control.pack(expand=1, fill=BOTH)
+        self.tab_control.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.bind("<Map>", self.on_first_map)
+        # Hidden query profiler panel
+        self.bind("<Control-D>", self.open_diagnostics)
+        self.diagnostics = None
+        # Back up now without waiting for the schedule
+        self.bind("<Control-B>", self.backup_now)
+        self.backup_requested = False
+
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_first_map(self, event):
+        if event.widget is self:
+            self.unbind("<Map>")
+            self.after_idle(lambda: timer.report("Main window interactive"))
+
+    def on_tab_changed(self, event):
+        page, (attribute, module, class_name, title) = self.tab_pages[self.tab_control.select()]
+        tab = getattr(self, attribute)
+        if tab is None:
+            self.after(BUILD_DELAY_MS, lambda: self.build_tab(page, attribute, module, class_name, title))
+        elif hasattr(tab, "on_show"):
+            tab.on_show()
+
+    def build_tab(self, page, attribute, module, class_name, title):
+        if getattr(self, attribute) is not None:
+            return
+        tab_class = getattr(timer.import_module(module), class_name)
+        with timer.measure(f"build {title} tab"):
+            tab = tab_class(page, self.repos, self.executor)
+            tab.pack(expand=1, fill=BOTH)
+        setattr(self, attribute, tab)
+        if hasattr(tab, "on_show"):
+            tab.on_show()
+
+    def open_diagnostics(self, event=None):
+        if self.db is None:
+            return  # Queries run on the server
+        if self.diagnostics is not None and self.diagnostics.winfo_exists():
+            self.diagnostics.lift()
+            return
+        from diagnostics import DiagnosticsWindow
+        self.diagnostics = DiagnosticsWindow(self, self.db)
+
+    def backup_now(self, event=None):
+        if self.backups is not None and not self.backups.running:
+            self.backup_requested = True
+            self.backups.backup_now()
+
+    def on_backup_done(self, path, error):
+        # Called on the backup thread
+        self.executor.post(self.report_backup, path, error)
+
+    def report_backup(self, path, error):
+        requested, self.backup_requested = self.backup_requested, False
+        if error is not None:
+            messagebox.showerror("Error", f"Database backup failed: {error}")
+        elif requested:
+            ToastNotification(title="Animalium", message=f"Backup saved to {path}", duration=3000).show_toast()
+
+    def on_close(self):
+        if self.backups is not None:
+            self.backups.stop()
+        self.executor.shutdown()
+        if self.db is not None:
+            self.db.close()
+        self.destroy()
 
 if __name__ == "__main__":
     app = Animalium()
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
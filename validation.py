@@ -0,0 +1,12 @@
+import math
+
+# Characters allowed in client form fields; also applied to imported rows.
+TEXT_PATTERN = r'^[a-zA-Z0-9_ ]*$'
+
+
+def parse_price(value):
+    """Return a finite, non-negative price, raising ValueError for anything else."""
+    price = float(value)
+    if not (price >= 0 and math.isfinite(price)):  # Also rejects NaN
+        raise ValueError(f"Invalid price: {value}")
+    return price
@@ -0,0 +1,267 @@
+import bisect
+import ttkbootstrap as ttk
+
+
+class VirtualTreeview(ttk.Frame):
+    """Treeview that only holds the rows currently on screen.
+
+    Rows are read through `fetch_rows(offset, limit, after, before)` in
+    blocks of `prefetch` rows around the visible window, and drawn into a
+    fixed pool of `height` Treeview items. The first value of each fetched
+    row is its key and is not displayed; `count_rows()` gives the true row
+    count for the scrollbar. When the block above or below is loaded,
+    `after` is the key of its last row or `before` the key of its first one,
+    so fetch_rows can seek from it; otherwise both are None and it goes by
+    offset.
+    With an `executor`, both run on a reader thread and rows still loading
+    are drawn blank until their block arrives.
+    """
+
+    def __init__(self, parent, columns, fetch_rows, count_rows, height=20, prefetch=100,
+                 executor=None, indicator=None):
+        super().__init__(parent)
+        self.fetch_rows = fetch_rows
+        self.count_rows = count_rows
+        self.height = height
+        self.prefetch = prefetch
+        self.executor = executor
+        self.indicator = indicator
+        self.generation = 0  # Bumped by refresh() so late blocks are discarded
+        self.loading = set()  # Block start offsets being fetched
+        self.total = 0
+        self.top = 0  # Index of the first visible row
+        self.blocks = {}  # Block start offset -> rows
+        self.keys = {}  # Pool item -> key of the row it shows
+        self.selected = None  # Key of the selected row, kept while scrolling
+
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", height=height)
+        for column in columns:
+            self.tree.heading(column, text=column)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.on_scrollbar)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.pool = [self.tree.insert("", "end", iid=f"row{i}") for i in range(height)]
+
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll_to(self.top - 3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll_to(self.top + 3))
+        self.tree.bind("<Prior>", lambda event: self.scroll_to(self.top - self.height))
+        self.tree.bind("<Next>", lambda event: self.scroll_to(self.top + self.height))
+
+    def refresh(self):
+        """Drop cached rows and re-read the row count, e.g. after a write."""
+        self.generation += 1
+        self.blocks.clear()
+        self.loading.clear()
+        if self.executor is None:
+            self.on_count_loaded(self.count_rows())
+        else:
+            self.executor.read(self.count_rows, on_done=self.on_count_loaded,
+                               key=(id(self), "count"), indicator=self.indicator)
+
+    def on_count_loaded(self, total):
+        self.total = total
+        self.scroll_to(self.top)
+
+    def scroll_to(self, top):
+        self.top = max(0, min(top, self.total - self.height))
+        self.render()
+        return "break"
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.total))
+        elif unit == "pages":
+            self.scroll_to(self.top + int(amount) * self.height)
+        else:
+            self.scroll_to(self.top + int(amount))
+
+    def on_mousewheel(self, event):
+        return self.scroll_to(self.top + (-3 if event.delta > 0 else 3))
+
+    def on_select(self, event):
+        selection = self.tree.selection()
+        if selection:
+            self.selected = self.keys.get(selection[0])
+
+    def neighbour_keys(self, block):
+        """(after, before): the keys a block can be fetched from by seeking, or None."""
+        above = self.blocks.get(block - self.prefetch)
+        if above and len(above) == self.prefetch:
+            return above[-1][0], None
+        below = self.blocks.get(block + self.prefetch)
+        if below:
+            return None, below[0][0]
+        return None, None
+
+    def load_block(self, block):
+        after, before = self.neighbour_keys(block)
+        if self.executor is None:
+            self.blocks[block] = self.fetch_rows(block, self.prefetch, after, before)
+            return
+        if block in self.loading:
+            return
+        self.loading.add(block)
+        generation = self.generation
+        self.executor.read(self.fetch_rows, block, self.prefetch, after, before,
+                           on_done=lambda rows: self.on_block_loaded(generation, block, rows),
+                           indicator=self.indicator)
+
+    def on_block_loaded(self, generation, block, rows):
+        if generation != self.generation:
+            return
+        self.loading.discard(block)
+        self.blocks[block] = rows
+        self.render()
+
+    def rows(self, start, stop):
+        """Return rows[start:stop]; rows of blocks still loading are None."""
+        first_block = start // self.prefetch * self.prefetch
+        rows = []
+        for block in range(first_block, stop, self.prefetch):
+            if block not in self.blocks:
+                self.load_block(block)
+            if block in self.blocks:
+                rows.extend(self.blocks[block])
+            else:
+                rows.extend([None] * max(0, min(self.prefetch, self.total - block)))
+        # Keep only the blocks next to the visible window.
+        for block in [b for b in self.blocks if abs(b - first_block) > 2 * self.prefetch]:
+            del self.blocks[block]
+        return rows[start - first_block:stop - first_block]
+
+    def render(self):
+        visible = self.rows(self.top, self.top + self.height)
+        self.keys.clear()
+        for index, item in enumerate(self.pool):
+            if index < len(visible):
+                row = visible[index]
+                self.keys[item] = row[0] if row is not None else None
+                self.tree.item(item, values=row[1:] if row is not None else ())
+                self.tree.move(item, "", index)
+            else:
+                self.tree.detach(item)
+        self.tree.selection_set([item for item, key in self.keys.items() if key == self.selected])
+        if self.total:
+            self.scrollbar.set(self.top / self.total, min(1.0, (self.top + self.height) / self.total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def selected_key(self):
+        """Return the key of the selected row, or None."""
+        selection = self.tree.selection()
+        return self.selected if selection else None
+
+    def selected_values(self):
+        """Return the displayed values of the selected row, or None."""
+        selection = self.tree.selection()
+        if not selection or selection[0] not in self.keys:
+            return None
+        return self.tree.item(selection[0])["values"]
+
+
+class BoundTreeview(ttk.Treeview):
+    """Treeview whose items are keyed by the primary key of the rows they show.
+
+    Rows are (key, *values) and the key becomes the item iid. set_rows()
+    compares the new rows with what is displayed and only inserts, updates,
+    moves or deletes the items that differ, so selection and scroll position
+    survive a refresh and a single-row change costs a single item update.
+    With `stripes`, rows alternate between those tags by position.
+    """
+
+    def __init__(self, parent, columns, stripes=None, **kwargs):
+        super().__init__(parent, columns=columns, show="headings", **kwargs)
+        self.stripes = stripes
+        self.shown = {}  # iid -> (values, tags) as displayed
+        self.order = []  # iids in display order
+
+    def row_tags(self, index):
+        return (self.stripes[index % len(self.stripes)],) if self.stripes else ()
+
+    def set_rows(self, rows, tags=None):
+        """Display exactly `rows`, in order, by applying the difference to the current items.
+
+        `tags`, if given, holds a tag tuple per row instead of the stripes.
+        """
+        rows = [(str(row[0]), tuple(row[1:])) for row in rows]
+        wanted = {iid for iid, _ in rows}
+        removed = [iid for iid in self.order if iid not in wanted]
+        if removed:
+            self.delete(*removed)
+            for iid in removed:
+                del self.shown[iid]
+        current = [iid for iid in self.order if iid in wanted]
+        # Rows already in the right relative order stay put; only the others move.
+        stable = stable_keys([iid for iid, _ in rows if iid in self.shown], current)
+        previous = None
+        for index, (iid, values) in enumerate(rows):
+            row_tags = tuple(tags[index]) if tags is not None else self.row_tags(index)
+            if iid not in stable:
+                # Right after the previous row; ttk counts a moved item at its old place.
+                position = current.index(previous) + 1 if previous is not None else 0
+                if iid in self.shown:
+                    self.move(iid, "", position)
+                    current.remove(iid)
+                    position = current.index(previous) + 1 if previous is not None else 0
+                else:
+                    self.insert("", position, iid=iid, values=values, tags=row_tags)
+                current.insert(position, iid)
+            if self.shown.get(iid, (values, row_tags)) != (values, row_tags):
+                self.item(iid, values=values, tags=row_tags)
+            self.shown[iid] = (values, row_tags)
+            previous = iid
+        self.order = current
+
+    def selected_key(self):
+        """Return the key of the selected row as a string, or None."""
+        selection = self.selection()
+        return selection[0] if selection else None
+
+    def selected_values(self):
+        """Return the displayed values of the selected row, or None."""
+        key = self.selected_key()
+        return self.shown[key][0] if key in self.shown else None
+
+
+def stable_keys(keys, order):
+    """Return the largest set of `keys` whose relative order is the same in `order`."""
+    position = {key: index for index, key in enumerate(order)}
+    tails, tail_keys, parents = [], [], {}
+    for key in keys:
+        index = bisect.bisect_left(tails, position[key])
+        parents[key] = tail_keys[index - 1] if index else None
+        if index == len(tails):
+            tails.append(position[key])
+            tail_keys.append(key)
+        else:
+            tails[index] = position[key]
+            tail_keys[index] = key
+    stable = set()
+    key = tail_keys[-1] if tail_keys else None
+    while key is not None:
+        stable.add(key)
+        key = parents[key]
+    return stable
+
+
+class LoadingIndicator(ttk.Progressbar):
+    """Indeterminate progress bar that runs while a tab has background work pending."""
+
+    def __init__(self, parent, **kwargs):
+        super().__init__(parent, mode="indeterminate", length=80, **kwargs)
+        self.pending = 0
+
+    def start(self, interval=10):
+        self.pending += 1
+        if self.pending == 1:
+            super().start(interval)
+
+    def stop(self):
+        self.pending = max(0, self.pending - 1)
+        if not self.pending:
+            super().stop()